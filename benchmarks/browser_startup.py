@@ -0,0 +1,66 @@
+"""
+Measure how long `make_browser` takes to start a browser from an empty profile and from a profile template.
+
+Run from the repository root with `PYTHONPATH=. python benchmarks/browser_startup.py`.
+Requires Chrome and Xvfb. The template is built once before its timed runs and isn't counted.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from typing import Optional
+
+import mediamirror.services.browser as browser
+import mediamirror.services.browser_profiles as browser_profiles
+
+
+async def time_startups(runs: int, headless: bool, width: int, height: int,
+                        profile_store: Optional[browser_profiles.ProfileStore]) -> list[float]:
+    """
+    Start and close browsers one at a time, timing until each is ready to navigate.
+
+    :param runs: Number of browsers to start
+    :param headless: If browsers start in headless mode
+    :param width: Virtual display width
+    :param height: Virtual display height
+    :param profile_store: Profile store to start browsers from, None for empty profiles
+    :return: Startup times in seconds
+    """
+    browser_profiles.profile_store = profile_store
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        web_browser = await browser.make_browser(width, height, headless)
+        await web_browser.browser.main_tab.get("about:blank")
+        timings.append(time.perf_counter() - start)
+        await web_browser.close()
+    return timings
+
+
+async def run(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as profiles_dir:
+        cases = {
+            "empty": None,
+            "template": browser_profiles.ProfileStore(profiles_dir)
+        }
+        await cases["template"].ensure_template()
+        print(f"{'profile':<10} {'min s':>8} {'median s':>9} {'mean s':>8}")
+        for name, profile_store in cases.items():
+            timings = await time_startups(args.runs, args.headless, args.width, args.height, profile_store)
+            print(f"{name:<10} {min(timings):>8.2f} {statistics.median(timings):>9.2f} "
+                  f"{statistics.mean(timings):>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="Browsers started per case")
+    parser.add_argument("--headless", action="store_true", help="Start browsers in headless mode")
+    parser.add_argument("--width", type=int, default=browser.DEFAULT_BROWSER_WIDTH, help="Virtual display width")
+    parser.add_argument("--height", type=int, default=browser.DEFAULT_BROWSER_HEIGHT, help="Virtual display height")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compare zstd compression of JSON logs with and without a trained dictionary.
+
+Run from the repository root with `PYTHONPATH=. python benchmarks/log_compression.py [LOG_FILE]`.
+Without a log file, synthetic records are generated with JsonLogFormatter.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import zstandard as zstd
+
+from mediamirror.services.compression import (
+    DEFAULT_DICTIONARY_SIZE,
+    train_dictionary
+)
+from mediamirror.services.logs import JsonLogFormatter
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LOGGER_NAMES = [
+    "mediamirror.services.accounts",
+    "mediamirror.services.auth",
+    "mediamirror.services.database_manager",
+    "mediamirror.api",
+    "hypercorn.access"
+]
+
+
+def write_synthetic_log(log_path: str, count: int) -> None:
+    """
+    Write synthetic JSON log records resembling those emitted by the app.
+
+    :param log_path: Path to write the log to
+    :param count: Number of records to write
+    """
+    formatter = JsonLogFormatter(ROOT_PATH)
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        for n in range(count):
+            record = logging.LogRecord(
+                name=LOGGER_NAMES[n % len(LOGGER_NAMES)],
+                level=[logging.DEBUG, logging.INFO, logging.WARNING][n % 3],
+                pathname=os.path.join(ROOT_PATH, "mediamirror", "services", "accounts.py"),
+                lineno=100 + n % 40,
+                msg="Request %s for '%s' took %dms",
+                args=(n, f"/api/accounts/example{n % 200}.com/user{n % 17}", n % 900),
+                exc_info=None
+            )
+            log_file.write(formatter.format(record) + "\n")
+
+
+def measure(lines: list[bytes], frame_size: int, dictionary=None) -> tuple[int, float, float]:
+    """
+    Compress lines into independent frames and decompress them again.
+
+    :param lines: Log lines to compress
+    :param frame_size: Uncompressed bytes per frame
+    :param dictionary: Optional trained dictionary
+    :return: Compressed size, compression MB/s, decompression MB/s
+    """
+    frames = []
+    current = []
+    current_size = 0
+    for line in lines:
+        current.append(line)
+        current_size += len(line)
+        if current_size >= frame_size:
+            frames.append(b"".join(current))
+            current, current_size = [], 0
+    if current:
+        frames.append(b"".join(current))
+    total = sum(len(frame) for frame in frames)
+
+    cctx = zstd.ZstdCompressor(dict_data=dictionary)
+    start = time.perf_counter()
+    compressed = [cctx.compress(frame) for frame in frames]
+    compress_time = time.perf_counter() - start
+
+    dctx = zstd.ZstdDecompressor(dict_data=dictionary)
+    start = time.perf_counter()
+    for frame in compressed:
+        dctx.decompress(frame)
+    decompress_time = time.perf_counter() - start
+    return sum(len(frame) for frame in compressed), total / compress_time / 1e6, total / decompress_time / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("log_file", nargs="?", help="JSON log to benchmark with")
+    parser.add_argument("--records", type=int, default=200000, help="Synthetic records when no log is given")
+    parser.add_argument("--dict-size", type=int, default=DEFAULT_DICTIONARY_SIZE, help="Dictionary size in bytes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_path = args.log_file
+        if not log_path:
+            log_path = os.path.join(temp_dir, "synthetic.log")
+            write_synthetic_log(log_path, args.records)
+        with open(log_path, "rb") as log_file:
+            lines = log_file.readlines()
+        # Train on the first half and measure on the second, like training on yesterday's log
+        train_path = os.path.join(temp_dir, "train.log")
+        with open(train_path, "wb") as train_file:
+            train_file.writelines(lines[:len(lines) // 2])
+        start = time.perf_counter()
+        dictionary = train_dictionary(train_path, os.path.join(temp_dir, "dictionaries"), args.dict_size)
+        train_time = time.perf_counter() - start
+        test_lines = lines[len(lines) // 2:]
+        total = sum(len(line) for line in test_lines)
+
+        print(f"{total / 1e6:.1f} MB of log lines, dictionary trained in {train_time:.2f}s")
+        print(f"{'frame':<10} {'mode':<11} {'ratio':>7} {'comp MB/s':>10} {'decomp MB/s':>12}")
+        for frame_size in [16384, 1048576, 16777216]:
+            for mode, frame_dictionary in [("default", None), ("dictionary", dictionary)]:
+                size, compress_rate, decompress_rate = measure(test_lines, frame_size, frame_dictionary)
+                print(f"{frame_size // 1024:>7}KiB {mode:<11} {total / size:>7.2f} "
+                      f"{compress_rate:>10.1f} {decompress_rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Measure formatting throughput of the console and JSON log formatters.
+
+Run from the repository root with `PYTHONPATH=. python benchmarks/log_formatters.py`.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from mediamirror.services.logs import (
+    ConsoleLogFormatter,
+    JsonLogFormatter
+)
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def make_records(count: int, with_exception: bool) -> list[logging.LogRecord]:
+    """
+    Build log records resembling those emitted by the app.
+
+    :param count: Number of records to build
+    :param with_exception: Whether each record carries exception info
+    :return: List of log records
+    """
+    exc_info = None
+    if with_exception:
+        try:
+            raise ValueError("Benchmark exception")
+        except ValueError:
+            exc_info = sys.exc_info()
+    return [
+        logging.LogRecord(
+            name="mediamirror.services.accounts",
+            level=logging.ERROR if with_exception else logging.INFO,
+            pathname=os.path.join(ROOT_PATH, "mediamirror", "services", "accounts.py"),
+            lineno=120,
+            msg="Fetching favicon from '%s'",
+            args=(f"https://example{n % 50}.com/favicon.ico",),
+            exc_info=exc_info
+        )
+        for n in range(count)
+    ]
+
+
+def records_per_second(formatter: logging.Formatter, count: int, with_exception: bool, repeats: int) -> float:
+    """
+    Time formatting a batch of fresh records, keeping the best of several runs.
+
+    :param formatter: Formatter under test
+    :param count: Number of records per run
+    :param with_exception: Whether each record carries exception info
+    :param repeats: Number of timed runs
+    :return: Records formatted per second
+    """
+    best = None
+    for _ in range(repeats):
+        records = make_records(count, with_exception)
+        start = time.perf_counter()
+        for record in records:
+            formatter.format(record)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=50000, help="Records per run")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per case, best is reported")
+    args = parser.parse_args()
+
+    formatters = {
+        "console": ConsoleLogFormatter(ROOT_PATH),
+        "json": JsonLogFormatter(ROOT_PATH)
+    }
+    print(f"{'formatter':<10} {'exceptions':<11} {'records/s':>12}")
+    for with_exception in [False, True]:
+        # Exception formatting is far slower, keep those runs short
+        count = args.records // 10 if with_exception else args.records
+        for name, formatter in formatters.items():
+            rate = records_per_second(formatter, count, with_exception, args.repeats)
+            print(f"{name:<10} {str(with_exception).lower():<11} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
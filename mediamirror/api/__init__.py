@@ -60,6 +60,25 @@ class FileSchema(DirectoryOrFileSchema):
     )
 
 
+class LogRecordSchema(Schema):
+    created = fields.DateTime(required=True)
+    name = fields.Str(
+        required=True,
+        metadata={"example": "Accounts"}
+    )
+    levelname = fields.Str(
+        required=True,
+        metadata={"example": "ERROR"}
+    )
+    pathname = fields.Str(metadata={"example": "./mediamirror/services/accounts.py"})
+    lineno = fields.Integer()
+    func_name = fields.Str()
+    process = fields.Integer()
+    thread_name = fields.Str()
+    message = fields.Str(required=True)
+    exc_text = fields.Str(allow_none=True)
+
+
 class PermissionSchema(Schema):
     key = fields.Str(
         required=True,
@@ -1,25 +1,45 @@
+import asyncio
+from datetime import datetime
 from quart import (
     Blueprint,
     jsonify,
     request,
-    Response
+    Response,
+    send_file
 )
 import json
 import os
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 
 from uuid import uuid4
 
 from mediamirror.api import (
     api_wrapper,
+    LogRecordSchema,
     permissions_required,
     PermissionSchema,
     UserDetailSchema,
     UserSchema
 )
 from mediamirror.services import auth
-from mediamirror.services.logs import app_log_manager
+from mediamirror.services.compression import read_frame_dictionary_id
+import mediamirror.services.fetcher as fetcher
+from mediamirror.services.log_database import query_log_records
+from mediamirror.services.log_export import export_logs
+from mediamirror.services.log_lines import LineFilter
+from mediamirror.services.log_tail import tail_log_events
+from mediamirror.services.logs import (
+    app_log_manager,
+    InvalidLoggerException
+)
+from mediamirror.services.subprocesses import (
+    get_process,
+    list_processes
+)
 
 
+LOG_DOWNLOAD_BUFFER_SIZE = 1048576
+
 manage_api = Blueprint("manage_api", __name__, url_prefix="/api/manage")
 
 
@@ -514,6 +534,411 @@ async def get_log_tree() -> Response:
     return Response(json.dumps(log_tree, indent=2, sort_keys=False), mimetype="application/json")
 
 
+@manage_api.route("/logs/stats", methods=["GET"])
+@api_wrapper
+@permissions_required(["view-logs"])
+async def get_log_stats() -> Response:
+    """
+    Log record counts over time.
+    ---
+    get:
+        tags:
+          - Logs
+        description: Retrieve a histogram of log record counts per level and the error rate over a time range.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: start_time
+            description: Start of the range as an ISO 8601 datetime, defaults to 24 hours before `end_time`.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: end_time
+            description: End of the range as an ISO 8601 datetime, defaults to now.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: interval
+            description: Histogram bucket size in seconds, rounded up to whole minutes.
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 60
+                default: 3600
+          - name: logger
+            description: Only count records from this component, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "Accounts"
+        responses:
+            200:
+                description: Histogram buckets in ascending time order.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                interval:
+                                    type: integer
+                                buckets:
+                                    type: array
+                                    items:
+                                        type: object
+                                        properties:
+                                            time:
+                                                type: string
+                                                format: date-time
+                                            counts:
+                                                type: object
+                                                additionalProperties:
+                                                    type: integer
+                                            total:
+                                                type: integer
+                                            error_rate:
+                                                type: number
+            400:
+                description: Invalid query parameters
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Parameter 'interval' must be at least 60"
+    """
+    interval = request.args.get("interval", 3600, type=int)
+    loggers = request.args.getlist("logger")
+    time_range = {}
+    for time_arg in ["start_time", "end_time"]:
+        time_value = request.args.get(time_arg, type=str)
+        if time_value:
+            try:
+                time_range[time_arg] = datetime.fromisoformat(time_value).timestamp()
+            except ValueError:
+                return jsonify({"error": f"Parameter '{time_arg}' must be an ISO 8601 datetime"}), 400
+    end_time = time_range.get("end_time", datetime.now().timestamp())
+    start_time = time_range.get("start_time", end_time - 86400)
+
+    if interval < 60:
+        return jsonify({"error": "Parameter 'interval' must be at least 60"}), 400
+    elif start_time > end_time:
+        return jsonify({"error": "Parameter 'start_time' must be before 'end_time'"}), 400
+    buckets = await asyncio.to_thread(app_log_manager.stats_store.histogram, start_time, end_time, interval, loggers)
+    return jsonify({"interval": interval, "buckets": buckets})
+
+
+@manage_api.route("/logs/export", methods=["GET"])
+@api_wrapper
+@permissions_required(["view-logs"])
+async def export_log_bundle() -> Response:
+    """
+    Export logs as a compressed archive.
+    ---
+    get:
+        tags:
+          - Logs
+        description: >
+            Stream a `tar.zst` archive of the log records in a time range, with one decompressed
+            file per log, optionally limited to some components.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: start_time
+            description: Start of the range as an ISO 8601 datetime, defaults to 24 hours before `end_time`.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: end_time
+            description: End of the range as an ISO 8601 datetime, defaults to now.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: logger
+            description: Only include records from this component, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "Accounts"
+          - name: threads
+            description: Number of threads to compress the archive with, `0` compresses in a single thread.
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 0
+                default: 0
+        responses:
+            200:
+                description: The log archive.
+                content:
+                    application/zstd:
+                        schema:
+                            type: string
+                            format: binary
+            400:
+                description: Invalid query parameters
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Parameter 'start_time' must be before 'end_time'"
+    """
+    threads = request.args.get("threads", 0, type=int)
+    loggers = request.args.getlist("logger")
+    time_range = {}
+    for time_arg in ["start_time", "end_time"]:
+        time_value = request.args.get(time_arg, type=str)
+        if time_value:
+            try:
+                time_range[time_arg] = datetime.fromisoformat(time_value).timestamp()
+            except ValueError:
+                return jsonify({"error": f"Parameter '{time_arg}' must be an ISO 8601 datetime"}), 400
+    end_time = time_range.get("end_time", datetime.now().timestamp())
+    start_time = time_range.get("start_time", end_time - 86400)
+
+    if threads < 0:
+        return jsonify({"error": "Parameter 'threads' must not be negative"}), 400
+    elif start_time > end_time:
+        return jsonify({"error": "Parameter 'start_time' must be before 'end_time'"}), 400
+    threads = min(threads, os.cpu_count() or 1)
+    bundle_name = (f"logs_{datetime.fromtimestamp(start_time).strftime('%Y%m%dT%H%M%S')}"
+                   f"_{datetime.fromtimestamp(end_time).strftime('%Y%m%dT%H%M%S')}.tar.zst")
+    response = Response(export_logs(app_log_manager, start_time, end_time, loggers, threads),
+                        mimetype="application/zstd")
+    response.headers["Content-Disposition"] = f"attachment; filename={bundle_name}"
+    response.cache_control.private = True
+    # Large ranges can take a while to compress
+    response.timeout = None
+    return response
+
+
+@manage_api.route("/logs/levels", methods=["GET", "PUT"])
+@api_wrapper
+@permissions_required(["admin"])
+async def log_levels() -> Response:
+    """
+    View and change logger levels.
+    ---
+    get:
+        tags:
+          - Logs
+        description: Retrieve the level of each configured logger.
+        security:
+          - ApiKeyAuth: []
+        responses:
+            200:
+                description: Levels by logger name.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                levels:
+                                    type: object
+                                    additionalProperties:
+                                        type: string
+                                        example: "WARN"
+    put:
+        tags:
+          - Logs
+        description: Change logger levels in every worker without restarting.
+        security:
+          - ApiKeyAuth: []
+        requestBody:
+            required: true
+            content:
+                application/json:
+                    schema:
+                        type: object
+                        properties:
+                            levels:
+                                type: object
+                                additionalProperties:
+                                    type: string
+                                    example: "DEBUG"
+        responses:
+            204:
+                description: Successfully changed levels.
+            400:
+                description: Failed to change levels.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Logger 'example' is not configured"
+    """
+    match request.method:
+        case "GET":
+            levels = {
+                module: logger_config.get("level")
+                for module, logger_config in app_log_manager.dict_config["loggers"].items()
+                if isinstance(logger_config, dict)
+            }
+            return jsonify({"levels": levels})
+        case "PUT":
+            data = await request.get_json()
+            if not isinstance(data, dict) or not isinstance(data.get("levels"), dict):
+                return jsonify({"error": "Missing 'levels' object"}), 400
+            try:
+                await app_log_manager.set_logger_levels(data["levels"])
+            except InvalidLoggerException as e:
+                return jsonify({"error": str(e)}), 400
+            return "", 204
+
+
+@manage_api.route("/logs/records", methods=["GET"])
+@api_wrapper
+@permissions_required(["view-logs"])
+async def get_log_records() -> Response:
+    """
+    Query log records stored in the database.
+    ---
+    get:
+        tags:
+          - Logs
+        description: Retrieve log records newest first, when database logging is enabled.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: start_time
+            description: Only include records created at or after this ISO 8601 datetime.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: end_time
+            description: Only include records created at or before this ISO 8601 datetime.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: level
+            description: Only include records with this level, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "ERROR"
+          - name: logger
+            description: Only include records from this component, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "Accounts"
+          - name: page
+            description: Page offset to return.
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 1
+                default: 1
+          - name: page_size
+            description: Number of records to return per page.
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 1
+                maximum: 1000
+                default: 100
+        responses:
+            200:
+                description: Return a paginated list of log records.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                page:
+                                    type: integer
+                                    description: Current page number.
+                                next_page:
+                                    type: boolean
+                                    description: Whether there are more results to fetch.
+                                records:
+                                    type: array
+                                    items:
+                                        $ref: "#/components/schemas/LogRecordSchema"
+            400:
+                description: Invalid query parameters
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Parameter 'page_size' must be between 1 and 1000"
+            404:
+                description: Database logging is not enabled.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Database logging is not enabled"
+    """
+    if not app_log_manager.database_handler:
+        return jsonify({"error": "Database logging is not enabled"}), 404
+    page = request.args.get("page", 1, type=int)
+    page_size = request.args.get("page_size", 100, type=int)
+    levels = [level.upper() for level in request.args.getlist("level")]
+    loggers = request.args.getlist("logger")
+    time_range = {}
+    for time_arg in ["start_time", "end_time"]:
+        time_value = request.args.get(time_arg, type=str)
+        if time_value:
+            try:
+                time_range[time_arg] = datetime.fromisoformat(time_value).timestamp()
+            except ValueError:
+                return jsonify({"error": f"Parameter '{time_arg}' must be an ISO 8601 datetime"}), 400
+
+    if page_size < 1 or page_size > 1000:
+        return jsonify({"error": "Parameter 'page_size' must be between 1 and 1000"}), 400
+    elif page < 1:
+        return jsonify({"error": "Parameter 'page' must be at least 1"}), 400
+    records, has_next_page = await query_log_records(levels=levels, loggers=loggers, page_size=page_size,
+                                                     page=page, **time_range)
+    return jsonify({
+        "page": page,
+        "next_page": has_next_page,
+        "records": LogRecordSchema(many=True).dump(records)
+    })
+
+
 @manage_api.route("/logs/<path:log_path>", methods=["GET"])
 @api_wrapper
 @permissions_required(["view-logs"])
@@ -534,6 +959,34 @@ async def get_log_contents(log_path: str) -> Response:
             required: true
             schema:
                 type: string
+          - name: start_time
+            description: Only return records created at or after this ISO 8601 datetime.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: end_time
+            description: Only return records created at or before this ISO 8601 datetime.
+            in: query
+            required: false
+            schema:
+                type: string
+                format: date-time
+          - name: start_line
+            description: First line to return (zero-based).
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 0
+          - name: end_line
+            description: Line to stop before (exclusive).
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 0
         responses:
             200:
                 description: The log file contents as a JSONL stream.
@@ -564,9 +1017,527 @@ async def get_log_contents(log_path: str) -> Response:
                                     example: "Log file not found"
     """
     abs_log_path = os.path.abspath(os.path.join(app_log_manager.log_dir, log_path))
+    start_line = request.args.get("start_line", type=int)
+    end_line = request.args.get("end_line", type=int)
+    time_range = {}
+    for time_arg in ["start_time", "end_time"]:
+        time_value = request.args.get(time_arg, type=str)
+        if time_value:
+            try:
+                time_range[time_arg] = datetime.fromisoformat(time_value).timestamp()
+            except ValueError:
+                return jsonify({"error": f"Parameter '{time_arg}' must be an ISO 8601 datetime"}), 400
 
     if not abs_log_path.startswith(app_log_manager.log_dir):
         return jsonify({"error": "Invalid log path"}), 400
     elif not os.path.exists(abs_log_path) or not os.path.isfile(abs_log_path):
         return jsonify({"error": "Log file not found"}), 404
-    return Response(app_log_manager.read_log(abs_log_path), mimetype="application/x-ndjson")
+    elif start_line is not None and start_line < 0:
+        return jsonify({"error": "Parameter 'start_line' must be at least 0"}), 400
+    elif end_line is not None and end_line < 0:
+        return jsonify({"error": "Parameter 'end_line' must be at least 0"}), 400
+    return Response(app_log_manager.read_log(abs_log_path, start_line=start_line, end_line=end_line, **time_range),
+                    mimetype="application/x-ndjson")
+
+
+@manage_api.route("/logs/<path:log_path>/lines", methods=["GET"])
+@api_wrapper
+@permissions_required(["view-logs"])
+async def get_log_lines(log_path: str) -> Response:
+    """
+    Window of log file lines.
+    ---
+    get:
+        tags:
+          - Logs
+        description: >
+            Retrieve lines `[start, end)` of a log file along with the total number of lines.
+            With filters, line numbers and the total only count the matching records.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: log_path
+            description: The path to the log file, as returned from the `/api/manage/logs` API.
+            in: path
+            required: true
+            schema:
+                type: string
+          - name: start
+            description: First line to return (zero-based).
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 0
+                default: 0
+          - name: end
+            description: Line to stop before (exclusive), at most 1000 lines after `start`.
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 0
+          - name: level
+            description: Only include records with this level, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "ERROR"
+          - name: component
+            description: Only include records from this component, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "Accounts"
+          - name: search
+            description: Only include records whose message contains this text, ignoring case.
+            in: query
+            required: false
+            schema:
+                type: string
+        responses:
+            200:
+                description: The requested window of log records.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                start:
+                                    type: integer
+                                    example: 0
+                                end:
+                                    type: integer
+                                    example: 100
+                                total:
+                                    type: integer
+                                    example: 200000
+                                records:
+                                    type: array
+                                    items:
+                                        type: object
+                                        description: JSON log entry.
+            400:
+                description: Invalid log path or window.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Invalid log path"
+            404:
+                description: Log file not found.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Log file not found"
+    """
+    abs_log_path = os.path.abspath(os.path.join(app_log_manager.log_dir, log_path))
+    start = request.args.get("start", 0, type=int)
+    end = request.args.get("end", type=int)
+
+    if not abs_log_path.startswith(app_log_manager.log_dir) or not abs_log_path.endswith((".log", ".zst")):
+        return jsonify({"error": "Invalid log path"}), 400
+    elif not os.path.exists(abs_log_path) or not os.path.isfile(abs_log_path):
+        return jsonify({"error": "Log file not found"}), 404
+    elif start < 0:
+        return jsonify({"error": "Parameter 'start' must be at least 0"}), 400
+    elif end is not None and end < start:
+        return jsonify({"error": "Parameter 'end' must be at least 'start'"}), 400
+    line_filter = LineFilter([level.upper() for level in request.args.getlist("level")],
+                             request.args.getlist("component"), request.args.get("search", type=str))
+    lines, total = await asyncio.to_thread(app_log_manager.read_log_window, abs_log_path, start, end, line_filter)
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            records.append({"error": "Unreadable log line"})
+    start = min(start, total)
+    return jsonify({
+        "start": start,
+        "end": start + len(records),
+        "total": total,
+        "records": records
+    })
+
+
+@manage_api.route("/logs/<path:log_path>/tail", methods=["GET"])
+@api_wrapper
+@permissions_required(["view-logs"])
+async def tail_log(log_path: str) -> Response:
+    """
+    Follow new records in the active log.
+    ---
+    get:
+        tags:
+          - Logs
+        description: Stream new records appended to a log file as Server-Sent Events, following log rotation.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: log_path
+            description: The path to the active log file, as returned from the `/api/manage/logs` API.
+            in: path
+            required: true
+            schema:
+                type: string
+          - name: level
+            description: Only include records with this level, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "ERROR"
+          - name: component
+            description: Only include records from this component, can be repeated.
+            in: query
+            required: false
+            schema:
+                type: array
+                items:
+                    type: string
+                    example: "Accounts"
+        responses:
+            200:
+                description: Event stream where each event's data is a JSON log entry.
+                content:
+                    text/event-stream:
+                        schema:
+                            type: string
+            400:
+                description: Invalid log path.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Invalid log path"
+            404:
+                description: Log file not found.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Log file not found"
+    """
+    abs_log_path = os.path.abspath(os.path.join(app_log_manager.log_dir, log_path))
+
+    if not abs_log_path.startswith(app_log_manager.log_dir) or not abs_log_path.endswith(".log"):
+        return jsonify({"error": "Invalid log path"}), 400
+    elif not os.path.exists(abs_log_path) or not os.path.isfile(abs_log_path):
+        return jsonify({"error": "Log file not found"}), 404
+    levels = [level.upper() for level in request.args.getlist("level")]
+    components = request.args.getlist("component")
+    response = Response(tail_log_events(abs_log_path, levels, components), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    # Stream stays open until the client disconnects
+    response.timeout = None
+    return response
+
+
+@manage_api.route("/logs/<path:log_path>/download", methods=["GET"])
+@api_wrapper
+@permissions_required(["view-logs"])
+async def download_log(log_path: str) -> Response:
+    """
+    Download a log file.
+    ---
+    get:
+        tags:
+          - Logs
+        description: >
+            Download a log file as stored on disk, with support for `Range` requests.
+            Compressed logs are passed through with `Content-Encoding: zstd` if the client accepts it.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: log_path
+            description: The path to the log file, as returned from the `/api/manage/logs` API.
+            in: path
+            required: true
+            schema:
+                type: string
+          - name: Range
+            description: Byte range of the file to return.
+            in: header
+            required: false
+            schema:
+                type: string
+                example: "bytes=0-1048575"
+        responses:
+            200:
+                description: The full log file.
+                content:
+                    application/x-ndjson:
+                        schema:
+                            type: string
+                    application/zstd:
+                        schema:
+                            type: string
+                            format: binary
+            206:
+                description: The requested byte range of the log file.
+            400:
+                description: Invalid log path.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Invalid log path"
+            404:
+                description: Log file not found.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Log file not found"
+            416:
+                description: Requested range is not satisfiable.
+    """
+    abs_log_path = os.path.abspath(os.path.join(app_log_manager.log_dir, log_path))
+
+    if not abs_log_path.startswith(app_log_manager.log_dir) or not abs_log_path.endswith((".log", ".zst")):
+        return jsonify({"error": "Invalid log path"}), 400
+    elif not os.path.exists(abs_log_path) or not os.path.isfile(abs_log_path):
+        return jsonify({"error": "Log file not found"}), 404
+    log_name = os.path.basename(abs_log_path)
+    pass_through_encoding = (log_name.endswith(".zst")
+                             and "zstd" in request.headers.get("Accept-Encoding", "").lower())
+    if pass_through_encoding:
+        with open(abs_log_path, "rb") as log_file:
+            # Clients can't decode frames compressed with one of our trained dictionaries
+            pass_through_encoding = read_frame_dictionary_id(log_file) == 0
+    try:
+        if pass_through_encoding:
+            response = await send_file(abs_log_path, mimetype="application/x-ndjson", as_attachment=True,
+                                       attachment_filename=log_name.removesuffix(".zst"), conditional=True)
+            response.headers["Content-Encoding"] = "zstd"
+        else:
+            mimetype = "application/zstd" if log_name.endswith(".zst") else "application/x-ndjson"
+            response = await send_file(abs_log_path, mimetype=mimetype, as_attachment=True, conditional=True)
+    except RequestedRangeNotSatisfiable:
+        return jsonify({"error": "Requested range not satisfiable"}), 416
+    response.headers["Vary"] = "Accept-Encoding"
+    response.cache_control.public = False
+    response.cache_control.private = True
+    # Read large chunks so transfers aren't bound by per-chunk overhead
+    response.response.buffer_size = LOG_DOWNLOAD_BUFFER_SIZE
+    return response
+
+
+@manage_api.route("/processes", methods=["GET"])
+@api_wrapper
+@permissions_required(["admin"])
+async def get_processes() -> Response:
+    """
+    Helper processes.
+    ---
+    get:
+        tags:
+          - Processes
+        description: Retrieve running helper processes (e.g. x11vnc) and the most recently exited ones.
+        security:
+          - ApiKeyAuth: []
+        responses:
+            200:
+                description: List of helper processes.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                processes:
+                                    type: array
+                                    items:
+                                        type: object
+                                        properties:
+                                            id:
+                                                type: integer
+                                            name:
+                                                type: string
+                                                example: "x11vnc"
+                                            args:
+                                                type: array
+                                                items:
+                                                    type: string
+                                            pid:
+                                                type: integer
+                                            started:
+                                                type: number
+                                                description: Unix timestamp the process was started.
+                                            returncode:
+                                                type: integer
+                                                nullable: true
+                                            line_count:
+                                                type: integer
+                                                description: Output lines read from the process.
+                                            dropped:
+                                                type: integer
+                                                description: Output lines no longer buffered.
+    """
+    return jsonify({"processes": [process.info() for process in list_processes()]})
+
+
+@manage_api.route("/processes/<int:process_id>/output", methods=["GET"])
+@api_wrapper
+@permissions_required(["admin"])
+async def get_process_output(process_id: int) -> Response:
+    """
+    Recent helper process output.
+    ---
+    get:
+        tags:
+          - Processes
+        description: Retrieve the buffered output of a helper process, oldest first.
+        security:
+          - ApiKeyAuth: []
+        parameters:
+          - name: process_id
+            description: The ID of the process, as returned from the `/api/manage/processes` API.
+            in: path
+            required: true
+            schema:
+                type: integer
+          - name: limit
+            description: Only return this many of the newest lines.
+            in: query
+            required: false
+            schema:
+                type: integer
+                minimum: 0
+        responses:
+            200:
+                description: Process details and output lines.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                process:
+                                    type: object
+                                output:
+                                    type: array
+                                    items:
+                                        type: object
+                                        properties:
+                                            time:
+                                                type: number
+                                            stream:
+                                                type: string
+                                                example: "stderr"
+                                            line:
+                                                type: string
+            400:
+                description: Invalid parameters.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Parameter 'limit' must be at least 0"
+            404:
+                description: Process not found.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                error:
+                                    type: string
+                                    example: "Process not found"
+    """
+    limit = request.args.get("limit", type=int)
+    if limit is not None and limit < 0:
+        return jsonify({"error": "Parameter 'limit' must be at least 0"}), 400
+    process = get_process(process_id)
+    if not process:
+        return jsonify({"error": "Process not found"}), 404
+    return jsonify({
+        "process": process.info(),
+        "output": process.recent_output(limit)
+    })
+
+
+@manage_api.route("/fetcher/stats", methods=["GET"])
+@api_wrapper
+@permissions_required(["admin"])
+async def get_fetcher_stats() -> Response:
+    """
+    Page fetcher escalation rates.
+    ---
+    get:
+        tags:
+          - Fetcher
+        description: Retrieve how often fetching pages from each domain needed a headless browser.
+        security:
+          - ApiKeyAuth: []
+        responses:
+            200:
+                description: Fetch counts by domain.
+                content:
+                    application/json:
+                        schema:
+                            type: object
+                            properties:
+                                domains:
+                                    type: object
+                                    additionalProperties:
+                                        type: object
+                                        properties:
+                                            fetches:
+                                                type: integer
+                                            http_attempts:
+                                                type: integer
+                                                description: Fetches that tried a plain request.
+                                            escalations:
+                                                type: integer
+                                                description: Plain requests that needed a browser.
+                                            escalation_rate:
+                                                type: number
+                                                example: 0.25
+                                            browser_first:
+                                                type: integer
+                                                description: Fetches that skipped the plain request.
+                                            browser_failures:
+                                                type: integer
+                                            reasons:
+                                                type: object
+                                                additionalProperties:
+                                                    type: integer
+                                                example: {"challenge": 3, "empty content": 1}
+                                            last_escalated:
+                                                type: number
+                                                nullable: true
+                                                description: Unix timestamp of the last escalation.
+    """
+    tiered_fetcher = fetcher.tiered_fetcher
+    return jsonify({"domains": tiered_fetcher.stats() if tiered_fetcher else {}})
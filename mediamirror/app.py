@@ -1,4 +1,5 @@
 from apispec import APISpec
+import asyncio
 from contextlib import asynccontextmanager
 import importlib
 import logging
@@ -32,10 +33,16 @@ from mediamirror.services.auth import (
     seen_user,
     UserSessionInterface
 )
+import mediamirror.services.browser as browser
+import mediamirror.services.browser_profiles as browser_profiles
 from mediamirror.services.common import env_dict
 import mediamirror.services.database_manager as database_manager
+import mediamirror.services.fetcher as fetcher
 import mediamirror.services.logs as logs
 import mediamirror.services.plugin_manager as plugins
+import mediamirror.services.process_watchdog as process_watchdog
+import mediamirror.services.settings as settings
+import mediamirror.services.vnc_sessions as vnc_sessions
 
 
 APP_VERSION = "0.1.0"
@@ -179,6 +186,8 @@ async def startup_tasks():
         print(f"Failed to initialize database connection and logging: {e}", file=sys.stderr)
         sys.exit(1)
 
+    settings.settings_service = settings.SettingsService()
+    await settings.settings_service.load()
     logs.app_log_manager = logs.AppLogManager(app, env_dict("LOGS"), "quart")
     await logs.app_log_manager.initialize(app, env_dict("LOGS"))
     sys.excepthook = main_exception_logger
@@ -189,7 +198,11 @@ async def startup_tasks():
     if is_debug:
         log.warn("App is running in DEBUG mode. Make sure this is on purpose!")
     previous_rev, _ = await database_manager.run_updates(env_dict("DATABASE").get("SCHEMA_DIR", "schema_revisions"))
+    if not previous_rev:
+        # Settings table was just created
+        await settings.settings_service.load()
     await logs.app_log_manager.save_logging_config_to_db()
+    settings.settings_service.start_listener()
 
     if not app.config["SECRET_KEY"]:
         log.warn("Missing SECRET_KEY in config, generating a random key for this instance")
@@ -211,6 +224,97 @@ async def startup_tasks():
     await document_api()
     plugins.plugin_manager = plugins.PluginManager()
     plugins.plugin_manager.load_all_plugins()
+    browser_config = env_dict("BROWSER")
+    process_watchdog.mark_app_processes()
+    orphans = await asyncio.to_thread(process_watchdog.sweep_orphans)
+    if orphans:
+        log.warning(f"Killed {orphans} browser processes left by a previous run")
+    profiles_dir = browser_config.get("PROFILES_DIR", browser_profiles.DEFAULT_PROFILES_DIR)
+    if profiles_dir:
+        browser_profiles.profile_store = browser_profiles.ProfileStore(
+            profiles_dir,
+            str(browser_config.get("PROFILE_TEMPLATE", "true")).lower() == "true"
+        )
+        await browser_profiles.profile_store.clean_temporary()
+    watchdog = process_watchdog.ProcessWatchdog(
+        int(browser_config.get("MAX_RENDERER_RSS_MIB", process_watchdog.DEFAULT_MAX_RENDERER_RSS_MIB)),
+        float(browser_config.get("MAX_RENDERER_CPU", process_watchdog.DEFAULT_MAX_RENDERER_CPU)),
+        int(browser_config.get("MAX_RSS_MIB", process_watchdog.DEFAULT_MAX_BROWSER_RSS_MIB)),
+        int(browser_config.get("WATCHDOG_CPU_STRIKES", process_watchdog.DEFAULT_CPU_STRIKES))
+    )
+    browser_width = int(browser_config.get("WIDTH", browser.DEFAULT_BROWSER_WIDTH))
+    browser_height = int(browser_config.get("HEIGHT", browser.DEFAULT_BROWSER_HEIGHT))
+    lease_wait = float(browser_config.get("LEASE_WAIT", browser.DEFAULT_LEASE_WAIT))
+    lease_duration = float(browser_config.get("LEASE_DURATION", browser.DEFAULT_LEASE_DURATION))
+    max_leases = int(browser_config.get("MAX_LEASES", browser.DEFAULT_MAX_LEASES))
+    watchdog_interval = float(browser_config.get("WATCHDOG_INTERVAL", process_watchdog.DEFAULT_WATCHDOG_INTERVAL))
+    if browser.VNC_INSTALL:
+        # Only VNC sessions lease from this pool, and its browsers need the displays installed with VNC
+        browser.browser_pool = browser.BrowserPool(
+            int(browser_config.get("POOL_SIZE", browser.DEFAULT_POOL_SIZE)),
+            browser_width,
+            browser_height,
+            lease_wait,
+            lease_duration,
+            max_leases,
+            int(browser_config.get("POOL_MAX_SIZE", browser.DEFAULT_POOL_MAX_SIZE)),
+            watchdog,
+            watchdog_interval
+        )
+        vnc_config = env_dict("VNC")
+        vnc_sessions.vnc_registry = vnc_sessions.VncSessionRegistry(
+            browser.browser_pool,
+            vnc_sessions.parse_port_range(vnc_config.get("PORT_RANGE", vnc_sessions.DEFAULT_VNC_PORT_RANGE)),
+            int(vnc_config.get("MAX_SESSIONS", 0)),
+            int(vnc_config.get("SESSION_MEMORY_MIB", vnc_sessions.DEFAULT_SESSION_MEMORY_MIB)),
+            float(vnc_config.get("SESSION_CPUS", vnc_sessions.DEFAULT_SESSION_CPUS)),
+            float(vnc_config.get("IDLE_TIMEOUT", vnc_sessions.DEFAULT_IDLE_TIMEOUT))
+        )
+        try:
+            vnc_sessions.vnc_registry.start()
+        except vnc_sessions.VncUnavailableException as e:
+            log.error(f"VNC is disabled in this worker: {e}")
+            vnc_sessions.vnc_registry = None
+            browser.browser_pool = None
+        if vnc_sessions.vnc_registry:
+            # Each session needs its own browser
+            browser.browser_pool.max_size = max(browser.browser_pool.max_size,
+                                                vnc_sessions.vnc_registry.max_sessions)
+            log.info(f"Allowing up to {vnc_sessions.vnc_registry.max_sessions} VNC sessions")
+            if browser.browser_pool.size > 0:
+                browser.browser_pool.start()
+    fetcher_config = env_dict("FETCHER")
+    fetcher_browsers = int(fetcher_config.get("BROWSER_POOL_MAX_SIZE", 1))
+    if fetcher_browsers > 0:
+        # Fetcher escalations get their own headless browsers so they never take one from a VNC user
+        browser.headless_pool = browser.BrowserPool(
+            int(fetcher_config.get("BROWSER_POOL_SIZE", 0)),
+            browser_width,
+            browser_height,
+            lease_wait,
+            lease_duration,
+            max_leases,
+            fetcher_browsers,
+            watchdog,
+            watchdog_interval,
+            headless=True
+        )
+        browser.headless_pool.start()
+    fetcher.tiered_fetcher = fetcher.fetcher_from_env(browser.headless_pool)
+
+
+@app.after_serving
+async def shutdown_tasks():
+    if settings.settings_service:
+        await settings.settings_service.stop_listener()
+    if vnc_sessions.vnc_registry:
+        await vnc_sessions.vnc_registry.close_all()
+    if fetcher.tiered_fetcher:
+        await fetcher.tiered_fetcher.close()
+    if browser.headless_pool:
+        await browser.headless_pool.close()
+    if browser.browser_pool:
+        await browser.browser_pool.close()
 
 
 @app.before_request
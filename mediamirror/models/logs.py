@@ -0,0 +1,37 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    Integer,
+    SmallInteger,
+    String,
+    Text
+)
+
+from mediamirror.models import (
+    Base,
+    TZDateTime
+)
+
+
+class LogRecordEntry(Base):
+    __tablename__ = "log_records"
+    # Partitioned by day on created, see DatabaseLogHandler
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    created = Column(TZDateTime, primary_key=True, nullable=False)
+    name = Column(String(255), nullable=False)
+    levelname = Column(String(20), nullable=False)
+    levelno = Column(SmallInteger, nullable=False)
+    pathname = Column(Text)
+    module = Column(String(255))
+    lineno = Column(Integer)
+    func_name = Column(String(255))
+    relative_created = Column(Float)
+    thread = Column(BigInteger)
+    thread_name = Column(String(255))
+    process_name = Column(String(255))
+    process = Column(Integer)
+    message = Column(Text)
+    exc_text = Column(Text)
+    stack_info = Column(Text)
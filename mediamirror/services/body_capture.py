@@ -0,0 +1,311 @@
+import asyncio
+import base64
+import hashlib
+from logging import getLogger
+import mimetypes
+from nodriver import cdp
+import os
+import time
+from typing import Optional
+from uuid import uuid4
+
+from mediamirror.services.media_capture import (
+    declared_size,
+    media_kind
+)
+
+DEFAULT_CAPTURE_DIR = "browser_captures"
+DEFAULT_MEDIA_KINDS = ["image", "video", "audio"]
+DEFAULT_CHUNK_SIZE = 1048576
+DEFAULT_REPLAY_MAX_BYTES = 8388608
+DEFAULT_MAX_STREAMS = 4
+DEFAULT_QUEUE_SIZE = 1000
+# Seconds to wait for cancelled captures to clean up their partial files
+STOP_TIMEOUT = 5
+# Resource types media is loaded as when every URL is captured, so other responses aren't paused. Media
+# elements load video and audio in ranges, which are never captured, so they aren't paused at all, but
+# segments fetched by players are when `stream` is captured too.
+MEDIA_RESOURCE_TYPES = {
+    "image": [cdp.network.ResourceType.IMAGE],
+    "video": [],
+    "audio": [],
+    "stream": [cdp.network.ResourceType.XHR, cdp.network.ResourceType.FETCH]
+}
+
+
+class CapturedBody:
+    """
+    A response body saved from a browser.
+    """
+    __slots__ = ["url", "path", "sha256", "size", "mime_type", "status", "headers", "page_url", "captured"]
+
+    def __init__(self, url: str, path: str, sha256: str, size: int, mime_type: str, status: int, headers: dict,
+                 page_url: Optional[str]):
+        self.url = url
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.mime_type = mime_type
+        self.status = status
+        self.headers = headers
+        self.page_url = page_url
+        self.captured = time.time()
+
+    def to_dict(self) -> dict:
+        """
+        Describe the saved body.
+
+        :return: Body details
+        """
+        return {
+            "url": self.url,
+            "path": self.path,
+            "sha256": self.sha256,
+            "size": self.size,
+            "mime_type": self.mime_type,
+            "status": self.status,
+            "headers": self.headers,
+            "page_url": self.page_url,
+            "captured": self.captured
+        }
+
+
+class ResponseBodyCapture:
+    """
+    Saves selected response bodies from a browser to disk as they load, so media the browser has seen
+    doesn't need downloading again.
+
+    Bodies are streamed from the paused response in chunks and hashed as they are written, so memory use
+    doesn't depend on the size of the response. Files are named by their SHA-256, so the same content is
+    only stored once.
+
+    Once a body is taken from the browser, the page only gets it back if it is no bigger than
+    `replay_max_bytes`, since replaying sends the whole body in a single message. So when every URL is
+    captured, only responses that declare a size up to `replay_max_bytes` are saved, and others load
+    in the page unchanged. Responses from URLs selected explicitly are always saved, and fail in the
+    page if they are larger.
+    """
+    capture_dir = DEFAULT_CAPTURE_DIR
+    min_bytes = 0
+    chunk_size = DEFAULT_CHUNK_SIZE
+    replay_max_bytes = DEFAULT_REPLAY_MAX_BYTES
+
+    def __init__(self, capture_dir: str = DEFAULT_CAPTURE_DIR, url_patterns: list[str] = ["*"],
+                 media_kinds: list[str] = DEFAULT_MEDIA_KINDS, min_bytes: int = 0,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, replay_max_bytes: int = DEFAULT_REPLAY_MAX_BYTES,
+                 max_streams: int = DEFAULT_MAX_STREAMS, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        :param capture_dir: Directory to save bodies in
+        :param url_patterns: URLs to capture, `*` is a wildcard
+        :param media_kinds: Kinds of media to capture, see `media_kind`
+        :param min_bytes: Smallest declared size captured
+        :param chunk_size: Bytes read from the browser at a time
+        :param replay_max_bytes: Largest body given back to the page after saving it
+        :param max_streams: Most bodies saved at once
+        :param queue_size: Most saved bodies waiting to be read
+        """
+        self.capture_dir = os.path.abspath(capture_dir)
+        self.url_patterns = list(url_patterns)
+        self.media_kinds = set(media_kinds)
+        self.min_bytes = min_bytes
+        self.chunk_size = chunk_size
+        self.replay_max_bytes = replay_max_bytes
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self._streams = asyncio.Semaphore(max_streams)
+        self._tasks = set()
+        os.makedirs(self.capture_dir, exist_ok=True)
+
+    def request_patterns(self) -> list[cdp.fetch.RequestPattern]:
+        """
+        Get the Fetch patterns that pause responses that might be captured.
+
+        :return: Request patterns for the response stage
+        """
+        if self.url_patterns != ["*"]:
+            # Specific URLs are captured whatever they're loaded as
+            return [
+                cdp.fetch.RequestPattern(url_pattern=url_pattern, request_stage=cdp.fetch.RequestStage.RESPONSE)
+                for url_pattern in self.url_patterns
+            ]
+        resource_types = {
+            resource_type for kind in self.media_kinds for resource_type in MEDIA_RESOURCE_TYPES.get(kind, [])
+        }
+        return [
+            cdp.fetch.RequestPattern(url_pattern="*", resource_type=resource_type,
+                                     request_stage=cdp.fetch.RequestStage.RESPONSE)
+            for resource_type in sorted(resource_types, key=lambda resource_type: resource_type.value)
+        ]
+
+    def handle(self, tab, event: cdp.fetch.RequestPaused) -> None:
+        """
+        Capture a paused response if it is selected, continuing it otherwise.
+
+        Runs from nodriver's message loop, so the capture itself happens in a task.
+
+        :param tab: nodriver Tab the response was paused in
+        :param event: Response stage RequestPaused event
+        """
+        task = asyncio.create_task(self._capture(tab, event))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _selected(self, event: cdp.fetch.RequestPaused, headers: dict) -> bool:
+        if event.response_status_code != 200 or event.response_error_reason is not None:
+            # Partial responses are only fragments of the file
+            return False
+        kind = media_kind(headers.get("content-type", ""))
+        if kind not in self.media_kinds:
+            return False
+        size = declared_size(headers)
+        if size and size < self.min_bytes:
+            return False
+        # Bodies taken from the browser have to be replayed whole for the page to still load them
+        return self.url_patterns != ["*"] or 0 < size <= self.replay_max_bytes
+
+    async def _capture(self, tab, event: cdp.fetch.RequestPaused) -> None:
+        try:
+            await self._capture_response(tab, event)
+        except Exception:
+            # Usually the tab closed while the response was paused
+            log.debug(f"Failed to handle paused response for '{event.request.url}'", exc_info=True)
+
+    async def _capture_response(self, tab, event: cdp.fetch.RequestPaused) -> None:
+        headers = {header.name.lower(): header.value for header in event.response_headers or []}
+        selected = self._selected(event, headers)
+        if selected and self.queue.full():
+            self.dropped += 1
+        if not selected or self.queue.full():
+            await tab.send(cdp.fetch.continue_request(event.request_id))
+            return
+        # Replays are included, so at most `max_streams` bodies are held in memory at once
+        async with self._streams:
+            try:
+                captured_body = await self._save(tab, event, headers)
+            except Exception:
+                log.warning(f"Failed to capture response body for '{event.request.url}'", exc_info=True)
+                await tab.send(cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.FAILED))
+                return
+            try:
+                self.queue.put_nowait(captured_body)
+            except asyncio.QueueFull:
+                self.dropped += 1
+            await self._replay(tab, event, captured_body)
+
+    async def _save(self, tab, event: cdp.fetch.RequestPaused, headers: dict) -> CapturedBody:
+        stream = await tab.send(cdp.fetch.take_response_body_as_stream(event.request_id))
+        partial_path = os.path.join(self.capture_dir, f".partial-{uuid4().hex}")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(partial_path, "wb") as body_file:
+                while True:
+                    base64_encoded, data, eof = await tab.send(cdp.io.read(stream, size=self.chunk_size))
+                    chunk = base64.b64decode(data) if base64_encoded else data.encode()
+                    if chunk:
+                        await asyncio.to_thread(body_file.write, chunk)
+                        hasher.update(chunk)
+                        size += len(chunk)
+                    if eof:
+                        break
+            sha256 = hasher.hexdigest()
+            mime_type = headers.get("content-type", "").split(";")[0].strip()
+            body_dir = os.path.join(self.capture_dir, sha256[:2])
+            os.makedirs(body_dir, exist_ok=True)
+            body_path = os.path.join(body_dir, sha256 + (mimetypes.guess_extension(mime_type) or ""))
+            if os.path.exists(body_path):
+                os.unlink(partial_path)
+            else:
+                os.replace(partial_path, body_path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.unlink(partial_path)
+            raise
+        finally:
+            try:
+                await tab.send(cdp.io.close(stream))
+            except Exception:
+                pass
+        page_url = tab.target.url if getattr(tab, "target", None) else None
+        log.debug(f"Captured {size} bytes from '{event.request.url}' to '{body_path}'")
+        return CapturedBody(event.request.url, body_path, sha256, size, mime_type, event.response_status_code,
+                            headers, page_url)
+
+    async def _replay(self, tab, event: cdp.fetch.RequestPaused, captured_body: CapturedBody) -> None:
+        if captured_body.size > self.replay_max_bytes:
+            await tab.send(cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.ABORTED))
+            return
+        body = await asyncio.to_thread(read_base64, captured_body.path)
+        await tab.send(cdp.fetch.fulfill_request(
+            event.request_id,
+            event.response_status_code,
+            event.response_headers,
+            body=body,
+            response_phrase=event.response_status_text or None
+        ))
+
+    async def stop(self) -> None:
+        """
+        Cancel the bodies still being saved, removing their partial files.
+        """
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=STOP_TIMEOUT)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[CapturedBody]:
+        """
+        Wait for the next saved body.
+
+        :param timeout: Seconds to wait, None to wait indefinitely
+        :return: Saved body, None if none arrived in time
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self, limit: Optional[int] = None) -> list[CapturedBody]:
+        """
+        Take the saved bodies waiting in the queue without waiting for more.
+
+        :param limit: Most bodies to take
+        :return: Saved bodies, oldest first
+        """
+        captured_bodies = []
+        while not self.queue.empty() and (limit is None or len(captured_bodies) < limit):
+            captured_bodies.append(self.queue.get_nowait())
+        return captured_bodies
+
+
+def read_base64(path: str) -> str:
+    """
+    Read a file as base64.
+
+    :param path: File path
+    :return: Base64 encoded file contents
+    """
+    with open(path, "rb") as body_file:
+        return base64.b64encode(body_file.read()).decode()
+
+
+def body_capture_from_env() -> ResponseBodyCapture:
+    """
+    Make a response body capture configured by the BROWSER_BODY_CAPTURE_* environment variables.
+
+    :return: Response body capture
+    """
+    media_kinds = os.environ.get("BROWSER_BODY_CAPTURE_KINDS", ",".join(DEFAULT_MEDIA_KINDS))
+    url_patterns = os.environ.get("BROWSER_BODY_CAPTURE_URLS", "*")
+    return ResponseBodyCapture(
+        os.environ.get("BROWSER_BODY_CAPTURE_DIR", DEFAULT_CAPTURE_DIR),
+        [url_pattern.strip() for url_pattern in url_patterns.split(",") if url_pattern.strip()] or ["*"],
+        [kind.strip() for kind in media_kinds.split(",") if kind.strip()],
+        int(os.environ.get("BROWSER_BODY_CAPTURE_MIN_BYTES", 0)),
+        replay_max_bytes=int(os.environ.get("BROWSER_BODY_CAPTURE_REPLAY_MAX_BYTES", DEFAULT_REPLAY_MAX_BYTES)),
+        max_streams=int(os.environ.get("BROWSER_BODY_CAPTURE_MAX_STREAMS", DEFAULT_MAX_STREAMS))
+    )
+
+
+log = getLogger(__name__)
@@ -1,43 +1,85 @@
 import asyncio
-from logging import (
-    DEBUG,
-    ERROR,
-    getLogger
-)
+from http.cookiejar import CookieJar
+from logging import getLogger
 import nodriver
+from nodriver import cdp
 import os
-import subprocess
 from pyvirtualdisplay import Display
+import time
+from typing import Optional
+from uuid import uuid4
 
-from mediamirror.services.logs import log_subprocess_output
+import mediamirror.services.browser_profiles as browser_profiles
+from mediamirror.services.body_capture import ResponseBodyCapture
+from mediamirror.services.domain_matcher import DomainMatcher
+from mediamirror.services.media_capture import MediaCapture
+from mediamirror.services.process_watchdog import (
+    DEFAULT_WATCHDOG_INTERVAL,
+    ProcessWatchdog,
+    read_processes
+)
+from mediamirror.services.resource_blocking import (
+    headless_profile_from_env,
+    ResourceProfile
+)
+from mediamirror.services.subprocesses import start_process
 
 VNC_INSTALL = os.environ.get("VNC_INSTALL", "false") == "true"
-INTERNAL_VNC_PORT = 5900
-NOVNC_PORT = os.environ.get("NOVNC_RUN_PORT")
+DEFAULT_POOL_SIZE = 1 if VNC_INSTALL else 0
+DEFAULT_POOL_MAX_SIZE = 0
+DEFAULT_BROWSER_WIDTH = 1366
+DEFAULT_BROWSER_HEIGHT = 768
+DEFAULT_LEASE_WAIT = 30
+DEFAULT_LEASE_DURATION = 3600
+DEFAULT_MAX_LEASES = 20
+HEALTH_CHECK_TIMEOUT = 5
+HEALTH_CHECK_INTERVAL = 60
+START_RETRY_DELAY = 30
 
 
 class BrowserCreationException(Exception):
     pass
 
 
+class BrowserUnavailableException(Exception):
+    pass
+
+
 class WebBrowser(object):
     browser = None
-    limited_domains = []
+    limited_domains = DomainMatcher([])
+    resource_profile = None
+    profile_dir = None
+    media_capture = None
+    body_capture = None
     subprocesses = []
 
-    def __init__(self, browser_width: int, browser_height: int):
+    def __init__(self, browser_width: int, browser_height: int, headless: bool = False):
+        self.subprocesses = []
+        self.lease_count = 0
+        self.browser_width = browser_width
+        self.browser_height = browser_height
+        self.__display = None
+        if headless:
+            # Headless browsers don't draw to X, so they run without Xvfb installed
+            return
         try:
-            self.__display = Display(visible=0, size=(browser_width, browser_height))
+            # Each browser gets its own display, so DISPLAY is passed to the browser instead of set globally
+            self.__display = Display(visible=0, size=(browser_width, browser_height), manage_global_env=False)
             self.__display.start()
         except Exception as e:
             raise BrowserCreationException("Failed to start display.", e)
 
-    async def start(self, headless: bool = True) -> None:
+    async def start(self, headless: bool = True, resource_profile: Optional[ResourceProfile] = None,
+                    profile_dir: Optional[str] = None) -> None:
         """
         Start the browser process.
 
         :param headless: If the browser should start in headless mode
+        :param resource_profile: Resources to block, headless browsers default to the BROWSER_HEADLESS_* profile
+        :param profile_dir: User data directory, an empty temporary profile is used if not set
         """
+        self.profile_dir = profile_dir
         browser_args = [
             "--disable-web-security",
             "--disable-blink-features=AutomationControlled",
@@ -45,36 +87,153 @@ class WebBrowser(object):
             "--disable-features=IsolateOrigins,site-per-process",
             "--start-fullscreen"
         ]
+        if self.__display:
+            browser_args.append(f"--display=:{self.get_display_num()}")
+        else:
+            browser_args.append(f"--window-size={self.browser_width},{self.browser_height}")
         if headless:
             browser_args += [
                 "--disable-gpu",
                 "--disable-software-rasterizer",
                 "--mute-audio"
             ]
+            if not resource_profile:
+                resource_profile = headless_profile_from_env()
+        if resource_profile and resource_profile.blocks_anything:
+            self.resource_profile = resource_profile
+            browser_args += resource_profile.browser_args()
         self.browser = await nodriver.start(
             headless=headless,
             browser_args=browser_args,
+            user_data_dir=profile_dir,
             sandbox=False
         )
+        if self.resource_profile:
+            await self.resource_profile.apply(self.browser.main_tab)
+            await configure_request_interception(self, self.browser.main_tab)
 
     async def limit_domains(self, domains: list[str]) -> None:
         """
         Set a list of domains that the browser is allowed to navigate to.
 
-        :param domains: List of domains to match in navigation events
+        Only document requests are intercepted, so subresources load without waiting on the app.
+
+        :param domains: Host patterns allowed for navigation, see `DomainMatcher`
+        :raises ValueError: If a domain pattern is invalid
+        """
+        self.limited_domains = DomainMatcher(domains)
+        for tab in self.browser.tabs:
+            await configure_request_interception(self, tab)
+
+    async def start_media_capture(self, media_capture: MediaCapture) -> None:
+        """
+        Report media responses from the browser's tabs to a capture, replacing any current capture.
+
+        :param media_capture: Capture to report to
+        """
+        self.stop_media_capture()
+        self.media_capture = media_capture
+        for tab in self.browser.tabs:
+            await media_capture.attach(tab)
+
+    def stop_media_capture(self) -> None:
+        """
+        Stop reporting media responses.
+        """
+        if self.media_capture:
+            self.media_capture.detach_all()
+            self.media_capture = None
+
+    async def start_body_capture(self, body_capture: ResponseBodyCapture) -> None:
+        """
+        Save selected response bodies from the browser's tabs to disk, replacing any current body capture.
+
+        :param body_capture: Capture to save bodies with
+        """
+        self.body_capture = body_capture
+        for tab in self.browser.tabs:
+            await configure_request_interception(self, tab)
+
+    async def stop_body_capture(self) -> None:
+        """
+        Stop saving response bodies, cancelling any still being saved.
+        """
+        if self.body_capture:
+            body_capture = self.body_capture
+            self.body_capture = None
+            await body_capture.stop()
+            for tab in self.browser.tabs:
+                await configure_request_interception(self, tab)
+
+    async def start_vnc(self, vnc_port: int) -> None:
+        """
+        Start the VNC server for the browser's display, clients connect through the app's websocket proxy.
+
+        :param vnc_port: Local port for the VNC server
+        """
+        if not VNC_INSTALL:
+            raise BrowserCreationException("MediaMirror was not installed with VNC, cannot start VNC processes.")
+        if not self.__display:
+            raise BrowserCreationException("Headless browsers have no display to start VNC for.")
+        vnc_process = await start_process("x11vnc", [
+            "x11vnc", "-display", f":{self.get_display_num()}", "-forever", "-rfbport",
+            str(vnc_port), "-localhost", "-nopw", "-shared"
+        ], log)
+        self.subprocesses.append(vnc_process)
+
+    async def stop_vnc(self) -> None:
+        """
+        Stop the VNC processes.
+        """
+        for process in self.subprocesses:
+            await process.terminate()
+        self.subprocesses = []
+
+    async def is_healthy(self) -> bool:
         """
-        self.__limited_domains = domains
-        if len(domains) > 0:
-            await self.browser.cdp.send("Network.enable", {})
-            await self.browser.cdp.send("Network.setRequestInterception", {"patterns": [{"urlPattern": "*"}]})
+        Check that the browser is running and responding.
 
-    def get_display_num(self) -> int:
+        :return: If the browser can be used
+        """
+        if not self.browser or self.browser.stopped:
+            return False
+        try:
+            await asyncio.wait_for(self.browser.main_tab.evaluate("1"), HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def reset(self) -> None:
+        """
+        Clear state left by the previous user, so the browser can be leased again.
+        """
+        await self.stop_vnc()
+        self.stop_media_capture()
+        await self.stop_body_capture()
+        main_tab = self.browser.main_tab
+        for tab in self.browser.tabs:
+            if tab is not main_tab:
+                await tab.close()
+        await self.limit_domains([])
+        await main_tab.send(cdp.network.clear_browser_cookies())
+        await main_tab.send(cdp.network.clear_browser_cache())
+        await main_tab.send(cdp.storage.clear_data_for_origin(origin="*", storage_types="all"))
+        await main_tab.get("about:blank")
+
+    @property
+    def pid(self) -> Optional[int]:
+        if not self.browser:
+            return None
+        # nodriver doesn't expose the browser process publicly
+        return getattr(self.browser, "_process_pid", None)
+
+    def get_display_num(self) -> Optional[int]:
         """
         Get the display number being used by the virtual display.
 
-        :return: Associated PyVirtualDisplay display number
+        :return: Associated PyVirtualDisplay display number, None for headless browsers
         """
-        return self.__display.display
+        return self.__display.display if self.__display else None
 
     def get_iframe_url(self) -> str:
         """
@@ -82,8 +241,9 @@ class WebBrowser(object):
 
         :return: URL for embedding
         """
-        if VNC_INSTALL:
-            return f"http://localhost:{NOVNC_PORT}/vnc.html?autoconnect=true&shared=false&resize=remote&compression=9"
+        if VNC_INSTALL and self.subprocesses:
+            return ("/vnc/client/vnc.html?autoconnect=true&shared=false&resize=remote&compression=9"
+                    "&path=vnc/websockify")
 
     def get_cookies(self) -> list[dict]:
         """
@@ -93,73 +253,387 @@ class WebBrowser(object):
         """
         return self.browser.cookies.get_all(requests_cookie_format=True)
 
-    def close(self) -> None:
+    async def set_cookies(self, cookie_jar: CookieJar) -> None:
+        """
+        Add cookies to the browser, such as an account's.
+
+        :param cookie_jar: Cookies to add
+        """
+        cookies = []
+        for cookie in cookie_jar:
+            cookie_param = cdp.network.CookieParam(
+                name=cookie.name,
+                value=cookie.value or "",
+                path=cookie.path or "/",
+                secure=bool(cookie.secure),
+                http_only=cookie.has_nonstandard_attr("HttpOnly"),
+                expires=cdp.network.TimeSinceEpoch(cookie.expires) if cookie.expires else None
+            )
+            if cookie.domain_specified:
+                cookie_param.domain = cookie.domain
+            else:
+                # Host-only cookies are set by URL so they aren't sent to subdomains
+                scheme = "https" if cookie.secure else "http"
+                cookie_param.url = f"{scheme}://{cookie.domain}{cookie_param.path}"
+            cookies.append(cookie_param)
+        if cookies:
+            await self.browser.main_tab.send(cdp.network.set_cookies(cookies))
+
+    async def close(self) -> None:
         """
         End related processes, stop the browser and close the virtual display.
         """
-        for process in self.subprocesses:
-            process.terminate()
-            process.wait()
-        self.browser.stop()
-        self.__display.stop()
+        await self.stop_vnc()
+        if self.browser:
+            await browser_profiles.stop_browser(self.browser)
+        if self.__display:
+            self.__display.stop()
+        if self.profile_dir and browser_profiles.profile_store:
+            await browser_profiles.profile_store.remove_profile(self.profile_dir)
 
 
-async def restrict_browser_navigation(web_browser: WebBrowser) -> None:
+async def configure_request_interception(web_browser: WebBrowser, tab: nodriver.Tab) -> None:
     """
-    Prevent navigation to domains outside those configured for a browser.
+    Intercept the requests in a tab that a browser's domain limit, resource profile and body capture apply to.
+
+    Only document requests are intercepted for the domain limit, only blocked resource types for the
+    profile, and only responses that might be captured for the body capture, so other requests load
+    without waiting on the app.
 
     :param web_browser: The WebBrowser object being restricted
+    :param tab: Tab to intercept requests in
     """
-    async for event in web_browser.browser.cdp.listen("Network.requestIntercepted"):
-        if len(web_browser.limited_domains) > 0:
-            request = event["params"]["request"]
-            url = request["url"]
-            domain = url.split("/")[2]
-            is_navigation_request = event["params"].get("isNavigationRequest", False)
-            if is_navigation_request and domain not in web_browser.limited_domains:
-                await web_browser.browser.cdp.send("Network.continueInterceptedRequest", {
-                    "interceptionId": event["params"]["interceptionId"],
-                    "errorReason": "BlockedByClient"
-                })
+    resource_types = set()
+    if web_browser.limited_domains:
+        resource_types.add(cdp.network.ResourceType.DOCUMENT)
+    if web_browser.resource_profile:
+        resource_types.update(web_browser.resource_profile.blocked_types)
+    patterns = [
+        cdp.fetch.RequestPattern(url_pattern="*", resource_type=resource_type)
+        for resource_type in sorted(resource_types, key=lambda resource_type: resource_type.value)
+    ]
+    if web_browser.body_capture:
+        patterns += web_browser.body_capture.request_patterns()
+    if not patterns:
+        if cdp.fetch.RequestPaused in tab.handlers:
+            tab.handlers.pop(cdp.fetch.RequestPaused)
+            await tab.send(cdp.fetch.disable())
+        return
+    if cdp.fetch.RequestPaused not in tab.handlers:
+        # Registering a handler would otherwise make nodriver enable Fetch for every request
+        if cdp.fetch not in tab.enabled_domains:
+            tab.enabled_domains.append(cdp.fetch)
+
+        def continue_request(event: cdp.fetch.RequestPaused) -> None:
+            if event.response_status_code is not None or event.response_error_reason is not None:
+                # Paused at the response stage for the body capture
+                if web_browser.body_capture:
+                    web_browser.body_capture.handle(tab, event)
+                else:
+                    tab.feed_cdp(cdp.fetch.continue_request(event.request_id))
+                return
+            url = event.request.url
+            if event.resource_type == cdp.network.ResourceType.DOCUMENT:
+                blocked = (web_browser.limited_domains and url.startswith(("http:", "https:"))
+                           and not web_browser.limited_domains.matches(url))
+                if blocked:
+                    log.debug(f"Blocked navigation to '{url}'")
             else:
-                await web_browser.browser.cdp.send("Network.continueInterceptedRequest", {
-                    "interceptionId": event["params"]["interceptionId"]
-                })
+                blocked = (web_browser.resource_profile is not None
+                           and event.resource_type in web_browser.resource_profile.blocked_types)
+            # Handlers run in nodriver's message loop, awaiting a reply here would block it
+            if blocked:
+                tab.feed_cdp(cdp.fetch.fail_request(event.request_id, cdp.network.ErrorReason.BLOCKED_BY_CLIENT))
+            else:
+                tab.feed_cdp(cdp.fetch.continue_request(event.request_id))
+
+        tab.add_handler(cdp.fetch.RequestPaused, continue_request)
+    await tab.send(cdp.fetch.enable(patterns=patterns))
 
 
-async def make_browser(browser_width: int, browser_height: int, use_vnc: bool = False) -> WebBrowser:
+async def make_browser(browser_width: int, browser_height: int, headless: bool = False,
+                       resource_profile: Optional[ResourceProfile] = None) -> WebBrowser:
     """
-    Make a WebBrowser object driven with nodriver, and optionally configure VNC.
+    Make a WebBrowser object driven with nodriver.
+
+    When a profile store is configured, the browser starts from a copy of the profile template.
 
-    :param browser_width: Width of virtual display for browser
-    :param browser_height: Height of virtual display for browser
-    :param use_vnc: Whether or not to start VNC processes with the browser
+    :param browser_width: Width of virtual display for browser, or of the window for headless browsers
+    :param browser_height: Height of virtual display for browser, or of the window for headless browsers
+    :param headless: If the browser should start in headless mode
+    :param resource_profile: Resources to block, see `WebBrowser.start`
     :return: WebBrowser object
     """
     log = getLogger(__name__)
-    if use_vnc and not VNC_INSTALL:
-        raise BrowserCreationException("MediaMirror was not installed with VNC, cannot start VNC browser instance.")
+    web_browser = None
+    start_time = time.monotonic()
     try:
-        web_browser = WebBrowser(browser_width, browser_height)
-        if use_vnc:
-            # Start VNC process
-            vnc_process = subprocess.Popen([
-                "x11vnc", "-display", f":{web_browser.get_display_num()}", "-forever", "-rfbport",
-                str(INTERNAL_VNC_PORT), "-nopw", "-shared"
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            asyncio.create_task(log_subprocess_output(log, vnc_process.stdout, DEBUG))
-            asyncio.create_task(log_subprocess_output(log, vnc_process.stderr, ERROR))
-            web_browser.subprocesses.append(vnc_process)
-            # Start noVNC proxy process
-            novnc_process = subprocess.Popen([
-                "novnc_proxy", "--vnc", f"localhost:{INTERNAL_VNC_PORT}", "--listen",
-                str(NOVNC_PORT)
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            asyncio.create_task(log_subprocess_output(log, novnc_process.stdout, DEBUG))
-            asyncio.create_task(log_subprocess_output(log, novnc_process.stderr, ERROR))
-            web_browser.subprocesses.append(novnc_process)
-        await web_browser.start(False)
+        web_browser = await asyncio.to_thread(WebBrowser, browser_width, browser_height, headless)
+        profile_dir = None
+        if browser_profiles.profile_store:
+            profile_dir = await browser_profiles.profile_store.new_profile()
+        await web_browser.start(headless, resource_profile, profile_dir)
+        log.debug(f"Started browser in {time.monotonic() - start_time:.2f}s")
         return web_browser
     except Exception as e:
         log.exception("Failed to create web browser.")
+        if web_browser:
+            await web_browser.close()
         raise e
+
+
+class BrowserLease:
+    """
+    A pooled browser lent to one user until it is released or expires.
+    """
+    id = None
+    owner = None
+    web_browser = None
+    expires = None
+
+    def __init__(self, owner: str, web_browser: WebBrowser, duration: float):
+        self.id = uuid4().hex
+        self.owner = owner
+        self.web_browser = web_browser
+        self.duration = duration
+        self.renew()
+
+    def renew(self) -> None:
+        """
+        Extend the lease by its duration from now.
+        """
+        self.expires = time.monotonic() + self.duration
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+
+class BrowserPool:
+    """
+    Keeps browsers started and waiting on their own displays, and leases them out.
+
+    When every browser is leased, more are started on demand up to `max_size`, and idle
+    browsers beyond `size` are closed again.
+
+    Released browsers are reset and health checked before they are leased again, and are
+    replaced after `max_leases` uses or if they stop responding. With a watchdog, runaway
+    renderers are killed and browsers over their memory limit are replaced, even while leased.
+    """
+    size = DEFAULT_POOL_SIZE
+    max_size = DEFAULT_POOL_MAX_SIZE
+    browser_width = DEFAULT_BROWSER_WIDTH
+    browser_height = DEFAULT_BROWSER_HEIGHT
+    lease_wait = DEFAULT_LEASE_WAIT
+    lease_duration = DEFAULT_LEASE_DURATION
+    max_leases = DEFAULT_MAX_LEASES
+    watchdog = None
+    watchdog_interval = DEFAULT_WATCHDOG_INTERVAL
+    headless = False
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, browser_width: int = DEFAULT_BROWSER_WIDTH,
+                 browser_height: int = DEFAULT_BROWSER_HEIGHT, lease_wait: float = DEFAULT_LEASE_WAIT,
+                 lease_duration: float = DEFAULT_LEASE_DURATION, max_leases: int = DEFAULT_MAX_LEASES,
+                 max_size: int = DEFAULT_POOL_MAX_SIZE, watchdog: Optional[ProcessWatchdog] = None,
+                 watchdog_interval: float = DEFAULT_WATCHDOG_INTERVAL, headless: bool = False):
+        """
+        :param size: Number of browsers to keep
+        :param browser_width: Width of each virtual display
+        :param browser_height: Height of each virtual display
+        :param lease_wait: Seconds to wait for a browser when all are leased
+        :param lease_duration: Seconds a lease lasts without being renewed
+        :param max_leases: Leases before a browser is replaced, `0` = no limit
+        :param max_size: Most browsers started at once, `0` = the pool size
+        :param watchdog: Watchdog to check browser processes with
+        :param watchdog_interval: Seconds between watchdog checks
+        :param headless: If browsers start in headless mode
+        """
+        self.size = size
+        self.max_size = max(max_size, size, 1)
+        self.browser_width = browser_width
+        self.browser_height = browser_height
+        self.lease_wait = lease_wait
+        self.lease_duration = lease_duration
+        self.max_leases = max_leases
+        self.watchdog = watchdog
+        self.watchdog_interval = watchdog_interval
+        self.headless = headless
+        self.leases = {}
+        self._idle = asyncio.Queue()
+        self._starting = 0
+        self._tasks = set()
+        self._maintain_task = None
+        self._closed = False
+
+    @property
+    def browser_count(self) -> int:
+        return self._idle.qsize() + len(self.leases) + self._starting
+
+    def start(self) -> None:
+        """
+        Start warming browsers and checking on them in the background.
+        """
+        if not self._maintain_task:
+            self._maintain_task = asyncio.create_task(self._maintain())
+
+    async def _maintain(self) -> None:
+        next_health_check = time.monotonic() + HEALTH_CHECK_INTERVAL
+        next_watchdog_check = time.monotonic() + self.watchdog_interval
+        while True:
+            try:
+                for lease in [lease for lease in self.leases.values() if lease.expired]:
+                    log.info(f"Browser lease for '{lease.owner}' expired")
+                    await self.release(lease.id)
+                for lease in [lease for lease in self.leases.values() if lease.web_browser.browser.stopped]:
+                    log.warning(f"Browser leased to '{lease.owner}' exited")
+                    self.leases.pop(lease.id, None)
+                    await self._discard(lease.web_browser)
+                if time.monotonic() >= next_health_check:
+                    await self._check_idle()
+                    next_health_check = time.monotonic() + HEALTH_CHECK_INTERVAL
+                if self.watchdog and time.monotonic() >= next_watchdog_check:
+                    await self._watch()
+                    next_watchdog_check = time.monotonic() + self.watchdog_interval
+                while self.browser_count > self.size and not self._idle.empty():
+                    await self._discard(self._idle.get_nowait())
+                while self.browser_count < self.size:
+                    if not await self._add_browser():
+                        await asyncio.sleep(START_RETRY_DELAY)
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Browser pool maintenance failed")
+            await asyncio.sleep(1)
+
+    async def _add_browser(self) -> bool:
+        self._starting += 1
+        try:
+            web_browser = await make_browser(self.browser_width, self.browser_height, self.headless)
+        except Exception:
+            return False
+        finally:
+            self._starting -= 1
+        if self._closed:
+            await web_browser.close()
+            return False
+        self._idle.put_nowait(web_browser)
+        return True
+
+    async def _check_idle(self) -> None:
+        for _ in range(self._idle.qsize()):
+            web_browser = self._idle.get_nowait()
+            if await web_browser.is_healthy():
+                self._idle.put_nowait(web_browser)
+            else:
+                log.warning("Replacing unresponsive idle browser")
+                await self._discard(web_browser)
+
+    async def _watch(self) -> None:
+        processes = await asyncio.to_thread(read_processes)
+        for lease in list(self.leases.values()):
+            web_browser = lease.web_browser
+            if web_browser.pid and not self.watchdog.check(web_browser.pid, processes):
+                log.warning(f"Replacing browser leased to '{lease.owner}' for using too much memory")
+                self.leases.pop(lease.id, None)
+                await self._discard(web_browser)
+        for _ in range(self._idle.qsize()):
+            web_browser = self._idle.get_nowait()
+            if not web_browser.pid or self.watchdog.check(web_browser.pid, processes):
+                self._idle.put_nowait(web_browser)
+            else:
+                log.warning("Replacing idle browser for using too much memory")
+                await self._discard(web_browser)
+
+    async def _discard(self, web_browser: WebBrowser) -> None:
+        try:
+            await web_browser.close()
+        except Exception:
+            log.exception("Failed to close browser")
+
+    async def lease(self, owner: str, wait: Optional[float] = None) -> BrowserLease:
+        """
+        Lease a warm browser, waiting for one to be released if they are all in use.
+
+        :param owner: Who the browser is leased to
+        :param wait: Seconds to wait for a browser, defaults to the pool's wait
+        :raises BrowserUnavailableException: If no browser became available in time
+        :return: Browser lease
+        """
+        deadline = time.monotonic() + (self.lease_wait if wait is None else wait)
+        if self._idle.empty() and self.browser_count < self.max_size:
+            # Pool is still warming up, or every warm browser is leased
+            if not await self._add_browser():
+                raise BrowserUnavailableException("Failed to start a browser.")
+        while True:
+            try:
+                web_browser = await asyncio.wait_for(self._idle.get(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise BrowserUnavailableException("No browser became available in time.")
+            if await web_browser.is_healthy():
+                break
+            await self._discard(web_browser)
+        web_browser.lease_count += 1
+        lease = BrowserLease(owner, web_browser, self.lease_duration)
+        self.leases[lease.id] = lease
+        return lease
+
+    def get_lease(self, lease_id: str) -> Optional[BrowserLease]:
+        """
+        Get an active lease.
+
+        :param lease_id: Lease ID
+        :return: Lease, if it hasn't been released or expired
+        """
+        lease = self.leases.get(lease_id)
+        if lease and not lease.expired:
+            return lease
+        return None
+
+    async def release(self, lease_id: str) -> None:
+        """
+        Return a leased browser to the pool.
+
+        :param lease_id: Lease ID
+        """
+        lease = self.leases.pop(lease_id, None)
+        if lease:
+            await self._recycle(lease.web_browser)
+
+    async def _recycle(self, web_browser: WebBrowser) -> None:
+        if self._closed or (self.max_leases and web_browser.lease_count >= self.max_leases):
+            await self._discard(web_browser)
+            return
+        try:
+            await web_browser.reset()
+        except Exception:
+            log.warning("Failed to reset browser, replacing it", exc_info=True)
+            await self._discard(web_browser)
+            return
+        if await web_browser.is_healthy():
+            self._idle.put_nowait(web_browser)
+        else:
+            await self._discard(web_browser)
+
+    async def close(self) -> None:
+        """
+        Stop maintaining the pool and close every browser.
+        """
+        self._closed = True
+        if self._maintain_task:
+            self._maintain_task.cancel()
+            try:
+                await self._maintain_task
+            except asyncio.CancelledError:
+                pass
+            self._maintain_task = None
+        for lease in list(self.leases.values()):
+            await self._discard(lease.web_browser)
+        self.leases = {}
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+
+browser_pool = None
+headless_pool = None
+log = getLogger(__name__)
@@ -0,0 +1,225 @@
+import asyncio
+from logging import getLogger
+import nodriver
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+DEFAULT_PROFILES_DIR = "browser_profiles"
+TEMPLATE_WARMUP_SECONDS = 5
+BROWSER_EXIT_TIMEOUT = 10
+# Temporary profiles newer than this may still be about to be used by another worker
+STALE_PROFILE_AGE = 300
+# Left by a running browser, or only useful to the browser that wrote them
+EXCLUDED_PROFILE_FILES = {
+    "DevToolsActivePort",
+    "SingletonCookie",
+    "SingletonLock",
+    "SingletonSocket"
+}
+EXCLUDED_PROFILE_DIRS = {
+    "BrowserMetrics",
+    "Crash Reports",
+    "Crashpad",
+    "GrShaderCache",
+    "ShaderCache"
+}
+
+
+class ProfileStore:
+    """
+    Browser user data directories started from a pre-initialized template.
+
+    The template is made once by starting a browser and letting it finish its first-run setup, so new
+    browsers start from a copy of it instead of an empty profile. Copies use reflinks where the
+    filesystem supports them. Profiles are removed when their browser closes.
+    """
+
+    def __init__(self, profiles_dir: str = DEFAULT_PROFILES_DIR, use_template: bool = True):
+        """
+        :param profiles_dir: Directory to keep the template and profiles in
+        :param use_template: If new profiles should be copied from the template
+        """
+        self.profiles_dir = os.path.abspath(profiles_dir)
+        self.template_dir = os.path.join(self.profiles_dir, "template")
+        self.temporary_dir = os.path.join(self.profiles_dir, "temporary")
+        self.use_template = use_template
+        self._template_lock = asyncio.Lock()
+        os.makedirs(self.temporary_dir, exist_ok=True)
+
+    @property
+    def has_template(self) -> bool:
+        return os.path.isdir(self.template_dir)
+
+    async def build_template(self, warmup: float = TEMPLATE_WARMUP_SECONDS) -> None:
+        """
+        Make the template by running a headless browser through its first-run setup, replacing any existing
+        template.
+
+        :param warmup: Seconds to leave the browser running for background initialization
+        """
+        start_time = time.monotonic()
+        build_dir = tempfile.mkdtemp(prefix="template-", dir=self.temporary_dir)
+        try:
+            browser = await nodriver.start(headless=True, user_data_dir=build_dir, sandbox=False)
+            try:
+                await browser.main_tab.get("about:blank")
+                await asyncio.sleep(warmup)
+            finally:
+                await stop_browser(browser)
+            await asyncio.to_thread(remove_excluded_files, build_dir)
+            if self.has_template:
+                await asyncio.to_thread(shutil.rmtree, self.template_dir)
+            os.rename(build_dir, self.template_dir)
+        except Exception:
+            await asyncio.to_thread(shutil.rmtree, build_dir, True)
+            raise
+        log.info(f"Built browser profile template in {time.monotonic() - start_time:.1f}s")
+
+    async def ensure_template(self) -> bool:
+        """
+        Build the template if it is enabled and doesn't exist yet.
+
+        :return: If a template is available
+        """
+        if not self.use_template:
+            return False
+        async with self._template_lock:
+            if not self.has_template:
+                try:
+                    await self.build_template()
+                except Exception:
+                    if self.has_template:
+                        # Another worker built it at the same time
+                        return True
+                    log.exception("Failed to build browser profile template")
+                    return False
+        return True
+
+    async def _seed(self, profile_dir: str) -> None:
+        if await self.ensure_template():
+            await copy_profile(self.template_dir, profile_dir)
+        else:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    async def new_profile(self) -> str:
+        """
+        Make a temporary profile, removed with `remove_profile` when its browser is closed.
+
+        :return: Profile directory
+        """
+        profile_dir = os.path.join(tempfile.mkdtemp(prefix="profile-", dir=self.temporary_dir), "user-data")
+        await self._seed(profile_dir)
+        return profile_dir
+
+    def is_temporary(self, profile_dir: str) -> bool:
+        """
+        Check if a profile was made by `new_profile`.
+
+        :param profile_dir: Profile directory
+        :return: If the profile is temporary
+        """
+        return os.path.commonpath([self.temporary_dir, os.path.abspath(profile_dir)]) == self.temporary_dir
+
+    async def remove_profile(self, profile_dir: str) -> None:
+        """
+        Remove a profile once its browser has closed, if it is temporary.
+
+        :param profile_dir: Profile directory
+        """
+        if self.is_temporary(profile_dir):
+            await asyncio.to_thread(shutil.rmtree, os.path.dirname(os.path.abspath(profile_dir)), True)
+
+    async def clean_temporary(self) -> None:
+        """
+        Remove temporary profiles left behind by browsers that weren't closed, skipping ones in use.
+        """
+        for entry in os.scandir(self.temporary_dir):
+            if time.time() - entry.stat().st_mtime < STALE_PROFILE_AGE:
+                continue
+            profile_dirs = [entry.path, os.path.join(entry.path, "user-data")]
+            if any(profile_in_use(profile_dir) for profile_dir in profile_dirs):
+                continue
+            await asyncio.to_thread(shutil.rmtree, entry.path, True)
+
+
+def profile_in_use(profile_dir: str) -> bool:
+    """
+    Check if a running browser holds a profile's lock.
+
+    :param profile_dir: Profile directory
+    :return: If the profile's lock belongs to a running process on this host
+    """
+    try:
+        # Browsers lock profiles with a symlink to `hostname-pid`
+        lock_target = os.readlink(os.path.join(profile_dir, "SingletonLock"))
+    except OSError:
+        return False
+    hostname, _, pid = lock_target.rpartition("-")
+    if hostname != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+async def copy_profile(source_dir: str, destination_dir: str) -> None:
+    """
+    Copy a profile directory, sharing file data through reflinks where the filesystem supports them.
+
+    :param source_dir: Profile to copy
+    :param destination_dir: Directory to create
+    :raises OSError: If the profile couldn't be copied
+    """
+    if shutil.which("cp"):
+        process = await asyncio.create_subprocess_exec(
+            "cp", "-a", "--reflink=auto", source_dir, destination_dir,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode == 0:
+            return
+        log.debug(f"Falling back to copying profile without reflinks: {stderr.decode(errors='replace').strip()}")
+        await asyncio.to_thread(shutil.rmtree, destination_dir, True)
+    await asyncio.to_thread(shutil.copytree, source_dir, destination_dir, symlinks=True)
+
+
+def remove_excluded_files(profile_dir: str) -> None:
+    """
+    Remove files from a stopped browser's profile that shouldn't be copied to other browsers.
+
+    :param profile_dir: Profile directory
+    """
+    for dir_path, dir_names, file_names in os.walk(profile_dir):
+        for dir_name in [dir_name for dir_name in dir_names if dir_name in EXCLUDED_PROFILE_DIRS]:
+            shutil.rmtree(os.path.join(dir_path, dir_name), True)
+            dir_names.remove(dir_name)
+        for file_name in EXCLUDED_PROFILE_FILES.intersection(file_names):
+            os.unlink(os.path.join(dir_path, file_name))
+        for dir_name in EXCLUDED_PROFILE_FILES.intersection(dir_names):
+            # Singleton files are symlinks, which os.walk lists as directories when they resolve to one
+            os.unlink(os.path.join(dir_path, dir_name))
+            dir_names.remove(dir_name)
+
+
+async def stop_browser(browser: nodriver.Browser, timeout: float = BROWSER_EXIT_TIMEOUT) -> None:
+    """
+    Stop a nodriver browser and wait for its process to exit, so its profile can be copied or removed.
+
+    :param browser: nodriver Browser
+    :param timeout: Seconds to wait for the process to exit
+    """
+    browser.stop()
+    deadline = time.monotonic() + timeout
+    while not browser.stopped and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+profile_store = None
+log = getLogger(__name__)
@@ -1,15 +1,40 @@
+from functools import lru_cache
 from io import TextIOWrapper
+import os
+import struct
+from typing import (
+    Optional,
+    Tuple
+)
 import zstandard as zstd
 
+SKIPPABLE_FRAME_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+DICTIONARY_DIR_NAME = "dictionaries"
+DICTIONARY_SUFFIX = ".zdict"
+DEFAULT_COMPRESSION_LEVEL = 3
+DEFAULT_DICTIONARY_SIZE = 112640
+DICTIONARY_SAMPLE_BYTES = 16777216
+FRAME_HEADER_MAX_SIZE = 18
+
 
 class ZstdReader:
-    def __init__(self, path):
+    def __init__(self, path: str, offset: int = 0, dictionary_dir: Optional[str] = None):
         self.path = path
+        self.offset = offset
+        self.dictionary_dir = dictionary_dir
 
     def __enter__(self):
         self.f = open(self.path, "rb")
-        dctx = zstd.ZstdDecompressor()
-        self.reader = dctx.stream_reader(self.f)
+        # Frames are independent, so decompression can begin at any frame boundary
+        self.f.seek(self.offset)
+        dictionary = None
+        if self.dictionary_dir:
+            dict_id = read_frame_dictionary_id(self.f)
+            if dict_id:
+                dictionary = load_dictionary(self.dictionary_dir, dict_id)
+        dctx = zstd.ZstdDecompressor(dict_data=dictionary)
+        self.reader = dctx.stream_reader(self.f, read_across_frames=True)
         self.wrapper = TextIOWrapper(self.reader, encoding="utf-8")
         return self.wrapper
 
@@ -19,18 +44,162 @@ class ZstdReader:
 
 
 class ZstdWriter:
-    def __init__(self, path):
+    """
+    Writes a zstd file, optionally in seekable mode where independent frames
+    are started every `frame_size` bytes and a seek table is appended.
+    Frames can also be ended explicitly with `new_frame` by passing `seekable`.
+    """
+
+    def __init__(self, path: str, frame_size: Optional[int] = None,
+                 dictionary: Optional[zstd.ZstdCompressionDict] = None,
+                 level: int = DEFAULT_COMPRESSION_LEVEL, seekable: Optional[bool] = None):
         self.path = path
+        self.frame_size = frame_size
+        self.dictionary = dictionary
+        self.level = level
+        self.seekable = bool(frame_size) if seekable is None else seekable
+        self.frames = []
 
     def __enter__(self):
         self.f = open(self.path, "wb")
-        ctx = zstd.ZstdCompressor()
-        self.writer = ctx.stream_writer(self.f)
-        self.wrapper = TextIOWrapper(self.writer, encoding="utf-8")
-        return self.wrapper
+        ctx = zstd.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+        self.writer = ctx.stream_writer(self.f, closefd=False)
+        self._frame_start = 0
+        self._frame_bytes = 0
+        return self
+
+    def write(self, data: str | bytes) -> int:
+        """
+        Write data to the current frame.
+
+        :param data: Text or bytes to compress
+        :return: Number of uncompressed bytes written
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._frame_bytes += len(data)
+        return self.writer.write(data)
+
+    def frame_full(self) -> bool:
+        """
+        Whether the current frame has reached the configured frame size.
+
+        :return: If a new frame should be started
+        """
+        return bool(self.frame_size) and self._frame_bytes >= self.frame_size
+
+    def new_frame(self) -> int:
+        """
+        End the current frame if it has any data.
+
+        :return: Compressed offset at which the next frame begins
+        """
+        if self._frame_bytes:
+            self.writer.flush(zstd.FLUSH_FRAME)
+            frame_end = self.f.tell()
+            self.frames.append((frame_end - self._frame_start, self._frame_bytes))
+            self._frame_start = frame_end
+            self._frame_bytes = 0
+        return self._frame_start
 
     def __exit__(self, *a):
-        self.wrapper.flush()
-        self.writer.flush(zstd.FLUSH_FRAME)
+        if self._frame_bytes or not self.frames:
+            self.writer.flush(zstd.FLUSH_FRAME)
+            self.frames.append((self.f.tell() - self._frame_start, self._frame_bytes))
+        if self.seekable:
+            self.f.write(seek_table(self.frames))
         self.f.close()
         return False
+
+
+def seek_table(frames: list[tuple[int, int]]) -> bytes:
+    """
+    Build a seek table in the zstd seekable format, stored in a skippable frame.
+
+    :param frames: List of (compressed size, decompressed size) for each frame
+    :return: Seek table frame
+    """
+    entries = b"".join(struct.pack("<II", compressed_size, decompressed_size)
+                       for compressed_size, decompressed_size in frames)
+    footer = struct.pack("<IBI", len(frames), 0, SEEKABLE_MAGIC)
+    table = entries + footer
+    return struct.pack("<II", SKIPPABLE_FRAME_MAGIC, len(table)) + table
+
+
+def train_dictionary(sample_path: str, dictionary_dir: str,
+                     dict_size: int = DEFAULT_DICTIONARY_SIZE) -> zstd.ZstdCompressionDict:
+    """
+    Train a new dictionary version from the most recent lines of a log and store it.
+
+    :param sample_path: Path to an uncompressed log to sample lines from
+    :param dictionary_dir: Directory dictionaries are stored in
+    :param dict_size: Maximum dictionary size in bytes
+    :return: Trained dictionary
+    :raises zstd.ZstdError: Not enough samples to train a dictionary
+    """
+    with open(sample_path, "rb") as sample_file:
+        sample_file.seek(max(0, os.path.getsize(sample_path) - DICTIONARY_SAMPLE_BYTES))
+        if sample_file.tell():
+            # Skip partial line
+            sample_file.readline()
+        samples = [line for line in sample_file if line.strip()]
+    dictionary = zstd.train_dictionary(dict_size, samples)
+    if not os.path.isdir(dictionary_dir):
+        os.makedirs(dictionary_dir)
+    dictionary_path = os.path.join(dictionary_dir, f"{dictionary.dict_id()}{DICTIONARY_SUFFIX}")
+    with open(f"{dictionary_path}.tmp", "wb") as dictionary_file:
+        dictionary_file.write(dictionary.as_bytes())
+    os.replace(f"{dictionary_path}.tmp", dictionary_path)
+    return dictionary
+
+
+def latest_dictionary(dictionary_dir: str) -> Tuple[Optional[zstd.ZstdCompressionDict], float]:
+    """
+    Get the most recently trained dictionary.
+
+    :param dictionary_dir: Directory dictionaries are stored in
+    :return: Dictionary if one exists, time it was trained
+    """
+    if not os.path.isdir(dictionary_dir):
+        return None, 0.0
+    dictionary_paths = [
+        os.path.join(dictionary_dir, file_name) for file_name in os.listdir(dictionary_dir)
+        if file_name.endswith(DICTIONARY_SUFFIX)
+    ]
+    if not dictionary_paths:
+        return None, 0.0
+    latest_path = max(dictionary_paths, key=os.path.getmtime)
+    dict_id = int(os.path.basename(latest_path).removesuffix(DICTIONARY_SUFFIX))
+    return load_dictionary(dictionary_dir, dict_id), os.path.getmtime(latest_path)
+
+
+@lru_cache(maxsize=16)
+def load_dictionary(dictionary_dir: str, dict_id: int) -> Optional[zstd.ZstdCompressionDict]:
+    """
+    Load a stored dictionary by its ID.
+
+    :param dictionary_dir: Directory dictionaries are stored in
+    :param dict_id: Dictionary ID recorded in the frame header
+    :return: Dictionary if it exists
+    """
+    dictionary_path = os.path.join(dictionary_dir, f"{dict_id}{DICTIONARY_SUFFIX}")
+    if not os.path.isfile(dictionary_path):
+        return None
+    with open(dictionary_path, "rb") as dictionary_file:
+        return zstd.ZstdCompressionDict(dictionary_file.read())
+
+
+def read_frame_dictionary_id(f) -> int:
+    """
+    Read the dictionary ID from the frame header at the current position, leaving the position unchanged.
+
+    :param f: Binary file positioned at the start of a frame
+    :return: Dictionary ID, or 0 if the frame doesn't use a dictionary
+    """
+    position = f.tell()
+    header = f.read(FRAME_HEADER_MAX_SIZE)
+    f.seek(position)
+    try:
+        return zstd.get_frame_parameters(header).dict_id
+    except zstd.ZstdError:
+        return 0
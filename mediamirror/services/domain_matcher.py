@@ -0,0 +1,114 @@
+from typing import Optional
+from urllib.parse import urlsplit
+
+DEFAULT_PORTS = {
+    "http": 80,
+    "https": 443,
+    "ws": 80,
+    "wss": 443
+}
+
+
+class DomainMatcher:
+    """
+    Precompiled set of allowed hosts for checking URLs.
+
+    Patterns are hosts like `example.com`, optionally with a port like `example.com:8080`, and
+    `*.example.com` matches any subdomain of `example.com`. Patterns without a port match any port, and
+    `*` matches every host. URLs are checked with one set lookup per label in their host.
+    """
+    __slots__ = ["patterns", "_exact", "_wildcard"]
+
+    def __init__(self, patterns: list[str]):
+        """
+        :param patterns: Allowed host patterns
+        :raises ValueError: If a pattern is invalid
+        """
+        self.patterns = list(patterns)
+        # Host or subdomain suffix -> allowed ports, None for any port
+        self._exact = {}
+        self._wildcard = {}
+        for pattern in self.patterns:
+            host, port = parse_host_pattern(pattern)
+            if host.startswith("*."):
+                suffix = host[2:]
+                self._wildcard[suffix] = _add_port(self._wildcard.get(suffix, set()), port)
+            else:
+                self._exact[host] = _add_port(self._exact.get(host, set()), port)
+
+    def __bool__(self) -> bool:
+        return len(self.patterns) > 0
+
+    def matches_host(self, host: str, port: Optional[int] = None) -> bool:
+        """
+        Check a host against the patterns.
+
+        :param host: Hostname
+        :param port: Port the host is being accessed on
+        :return: If the host is allowed
+        """
+        host = host.lower().rstrip(".")
+        if "*" in self._exact and _port_allowed(self._exact["*"], port):
+            return True
+        if host in self._exact and _port_allowed(self._exact[host], port):
+            return True
+        if self._wildcard:
+            # Only dots after the first label, so the host itself isn't matched by its own wildcard
+            dot = host.find(".")
+            while dot != -1:
+                suffix = host[dot + 1:]
+                if suffix in self._wildcard and _port_allowed(self._wildcard[suffix], port):
+                    return True
+                dot = host.find(".", dot + 1)
+        return False
+
+    def matches(self, url: str) -> bool:
+        """
+        Check the host of a URL against the patterns.
+
+        :param url: Absolute URL
+        :return: If the URL's host is allowed
+        """
+        try:
+            parsed_url = urlsplit(url)
+            port = parsed_url.port or DEFAULT_PORTS.get(parsed_url.scheme)
+        except ValueError:
+            return False
+        if not parsed_url.hostname:
+            return False
+        return self.matches_host(parsed_url.hostname, port)
+
+
+def parse_host_pattern(pattern: str) -> tuple[str, Optional[int]]:
+    """
+    Split a host pattern into its host and port.
+
+    :param pattern: Host pattern, a URL prefix like `https://example.com/` is also accepted
+    :raises ValueError: If the pattern has no host or an invalid port
+    :return: Lowercase host and port, None for any port
+    """
+    pattern = pattern.strip().lower()
+    if "://" not in pattern:
+        pattern = f"//{pattern}"
+    netloc = urlsplit(pattern).netloc
+    if netloc.endswith(":*"):
+        netloc = netloc[:-2]
+    parsed_pattern = urlsplit(f"//{netloc}")
+    host = parsed_pattern.hostname
+    if not host or (host != "*" and "*" in host.removeprefix("*.")):
+        raise ValueError(f"Invalid host pattern '{pattern.lstrip('/')}'")
+    if host.startswith("*.") and not host[2:].strip("."):
+        # Would otherwise become `*` and match every host
+        raise ValueError(f"Invalid host pattern '{pattern.lstrip('/')}'")
+    return host.rstrip("."), parsed_pattern.port
+
+
+def _add_port(ports: Optional[set], port: Optional[int]) -> Optional[set]:
+    if ports is None or port is None:
+        return None
+    ports.add(port)
+    return ports
+
+
+def _port_allowed(ports: Optional[set], port: Optional[int]) -> bool:
+    return ports is None or port in ports
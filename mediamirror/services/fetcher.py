@@ -0,0 +1,418 @@
+import aiohttp
+import asyncio
+from collections import OrderedDict
+from http.cookiejar import CookieJar
+from http.cookies import Morsel
+from logging import getLogger
+import os
+import re
+import time
+from typing import Optional
+from urllib.parse import urlparse
+from yarl import URL
+
+from mediamirror.models.accounts import RemoteAccountModel
+from mediamirror.services.accounts import get_cookiejar_for_account
+from mediamirror.services.browser import BrowserPool
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 8
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_BODY_BYTES = 16777216
+DEFAULT_MIN_TEXT_CHARS = 200
+DEFAULT_BROWSER_TIMEOUT = 30
+DEFAULT_BROWSER_FIRST_RATE = 0.9
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/130.0.0.0 Safari/537.36")
+# Plain requests a domain needs before its escalation rate decides whether to skip them
+MIN_FETCHES_FOR_BROWSER_FIRST = 20
+# Domains going straight to a browser still get a plain request this often, so their rate stays current
+BROWSER_FIRST_PROBE_INTERVAL = 10
+# Seconds between checks of a browser page for a challenge finishing
+BROWSER_SETTLE_INTERVAL = 1
+MAX_TRACKED_DOMAINS = 10000
+CHALLENGE_STATUSES = {403, 429, 503}
+CHALLENGE_MARKERS = [
+    "/cdn-cgi/challenge-platform/",
+    "cf-browser-verification",
+    "cf_chl_opt",
+    "<title>just a moment...</title>",
+    "ddos-guard",
+    "_incapsula_resource",
+    "px-captcha",
+    "sucuri_cloudproxy_js",
+    "awswafintegration"
+]
+JAVASCRIPT_REQUIRED_MARKERS = [
+    "enable javascript",
+    "javascript is disabled",
+    "javascript is required",
+    "requires javascript"
+]
+HIDDEN_ELEMENTS_PATTERN = re.compile(r"<(script|style|noscript|template)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class FetchException(Exception):
+    pass
+
+
+class FetchResult:
+    """
+    A page fetched by the tiered fetcher.
+    """
+    __slots__ = ["url", "final_url", "status", "headers", "content", "tier", "escalation_reason", "elapsed"]
+
+    def __init__(self, url: str, final_url: str, status: Optional[int], headers: dict, content: bytes, tier: str,
+                 escalation_reason: Optional[str], elapsed: float):
+        self.url = url
+        self.final_url = final_url
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.tier = tier
+        self.escalation_reason = escalation_reason
+        self.elapsed = elapsed
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(charset_from_headers(self.headers) or "utf-8", errors="replace")
+
+
+class DomainFetchStats:
+    """
+    How often fetches from a domain needed a browser.
+    """
+    __slots__ = ["fetches", "http_attempts", "escalations", "browser_first", "browser_failures", "reasons",
+                 "last_escalated"]
+
+    def __init__(self):
+        self.fetches = 0
+        self.http_attempts = 0
+        self.escalations = 0
+        self.browser_first = 0
+        self.browser_failures = 0
+        self.reasons = {}
+        self.last_escalated = None
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalations / self.http_attempts if self.http_attempts else 0.0
+
+    def to_dict(self) -> dict:
+        """
+        Describe the domain's fetches.
+
+        :return: Fetch counts and escalation rate
+        """
+        return {
+            "fetches": self.fetches,
+            "http_attempts": self.http_attempts,
+            "escalations": self.escalations,
+            "escalation_rate": self.escalation_rate,
+            "browser_first": self.browser_first,
+            "browser_failures": self.browser_failures,
+            "reasons": dict(self.reasons),
+            "last_escalated": self.last_escalated
+        }
+
+
+class TieredFetcher:
+    """
+    Fetches pages with a plain HTTP request first, and only with a headless browser when the response
+    is a JavaScript challenge or has no content.
+
+    Plain requests share one connection pool, and each uses its own cookie jar so accounts' cookies
+    aren't mixed. Escalations are counted per domain, and domains that almost always need a browser
+    skip straight to one, with an occasional plain request to notice if that changes.
+    """
+    max_body_bytes = DEFAULT_MAX_BODY_BYTES
+    min_text_chars = DEFAULT_MIN_TEXT_CHARS
+    browser_timeout = DEFAULT_BROWSER_TIMEOUT
+    browser_first_rate = DEFAULT_BROWSER_FIRST_RATE
+    user_agent = DEFAULT_USER_AGENT
+
+    def __init__(self, browser_pool: Optional[BrowserPool], max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST, timeout: float = DEFAULT_TIMEOUT,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES, min_text_chars: int = DEFAULT_MIN_TEXT_CHARS,
+                 browser_timeout: float = DEFAULT_BROWSER_TIMEOUT,
+                 browser_first_rate: float = DEFAULT_BROWSER_FIRST_RATE, user_agent: str = DEFAULT_USER_AGENT):
+        """
+        :param browser_pool: Pool of headless browsers to escalate to, None to only make plain requests
+        :param max_connections: Most open connections for plain requests
+        :param max_connections_per_host: Most open connections to one host for plain requests
+        :param timeout: Seconds a plain request may take
+        :param max_body_bytes: Most of a response body read by a plain request
+        :param min_text_chars: Least visible text a page needs to not be considered empty
+        :param browser_timeout: Seconds to wait for a browser page to get past a challenge
+        :param browser_first_rate: Escalation rate at which a domain skips plain requests, `0` = never skip them
+        :param user_agent: User-Agent sent with plain requests
+        """
+        self.browser_pool = browser_pool
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.min_text_chars = min_text_chars
+        self.browser_timeout = browser_timeout
+        self.browser_first_rate = browser_first_rate
+        self.user_agent = user_agent
+        self.domain_stats = OrderedDict()
+        self._connector = None
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        if not self._connector or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                                   limit_per_host=self.max_connections_per_host)
+        return self._connector
+
+    async def fetch(self, url: str, account: Optional[RemoteAccountModel] = None) -> FetchResult:
+        """
+        Fetch a page, escalating to a headless browser if a plain request doesn't get its content.
+
+        :param url: URL of the page
+        :param account: Account whose cookies to send
+        :raises FetchException: If neither a plain request nor a browser could fetch the page
+        :raises InvalidCookiesFormatException: If the account's cookies couldn't be loaded
+        :return: Fetched page
+        """
+        domain = (urlparse(url).hostname or "").lower()
+        stats = self._stats(domain)
+        stats.fetches += 1
+        cookie_jar = get_cookiejar_for_account(account) if account else None
+        if self._browser_first(stats):
+            stats.browser_first += 1
+            try:
+                return await self._fetch_browser(url, cookie_jar, "browser first")
+            except Exception:
+                stats.browser_failures += 1
+                log.debug(f"Browser fetch of '{url}' failed, trying a plain request", exc_info=True)
+        stats.http_attempts += 1
+        http_result = None
+        try:
+            http_result = await self._fetch_http(url, cookie_jar)
+            reason = escalation_reason(http_result.status, http_result.headers, http_result.content,
+                                       self.min_text_chars)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            reason = "request failed"
+            log.debug(f"Plain request for '{url}' failed: {e!r}")
+        if not reason or not self.browser_pool:
+            if http_result:
+                return http_result
+            raise FetchException(f"Failed to fetch '{url}'.")
+        stats.escalations += 1
+        stats.reasons[reason] = stats.reasons.get(reason, 0) + 1
+        stats.last_escalated = time.time()
+        log.debug(f"Fetching '{url}' with a browser: {reason}")
+        try:
+            return await self._fetch_browser(url, cookie_jar, reason)
+        except Exception as e:
+            stats.browser_failures += 1
+            if http_result:
+                log.warning(f"Browser fetch of '{url}' failed, using the plain response", exc_info=True)
+                return http_result
+            raise FetchException(f"Failed to fetch '{url}'.", e)
+
+    def _stats(self, domain: str) -> DomainFetchStats:
+        stats = self.domain_stats.get(domain)
+        if stats:
+            self.domain_stats.move_to_end(domain)
+            return stats
+        stats = self.domain_stats[domain] = DomainFetchStats()
+        if len(self.domain_stats) > MAX_TRACKED_DOMAINS:
+            self.domain_stats.popitem(last=False)
+        return stats
+
+    def _browser_first(self, stats: DomainFetchStats) -> bool:
+        if not self.browser_pool or not self.browser_first_rate:
+            return False
+        if stats.http_attempts < MIN_FETCHES_FOR_BROWSER_FIRST or stats.escalation_rate < self.browser_first_rate:
+            return False
+        return stats.fetches % BROWSER_FIRST_PROBE_INTERVAL != 0
+
+    async def _fetch_http(self, url: str, cookie_jar: Optional[CookieJar]) -> FetchResult:
+        start_time = time.monotonic()
+        async with aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            cookie_jar=aiohttp_cookie_jar(cookie_jar) if cookie_jar else aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent}
+        ) as session:
+            async with session.get(url) as response:
+                content = bytearray()
+                async for chunk in response.content.iter_chunked(65536):
+                    content += chunk
+                    if len(content) >= self.max_body_bytes:
+                        del content[self.max_body_bytes:]
+                        break
+                return FetchResult(url, str(response.url), response.status, dict(response.headers), bytes(content),
+                                   "http", None, time.monotonic() - start_time)
+
+    async def _fetch_browser(self, url: str, cookie_jar: Optional[CookieJar], reason: str) -> FetchResult:
+        start_time = time.monotonic()
+        lease = await self.browser_pool.lease(f"fetcher:{urlparse(url).hostname}")
+        try:
+            web_browser = lease.web_browser
+            if cookie_jar:
+                await web_browser.set_cookies(cookie_jar)
+            tab = await web_browser.browser.get(url)
+            html = await self._settled_content(tab)
+            final_url = tab.target.url or url
+        finally:
+            await self.browser_pool.release(lease.id)
+        return FetchResult(url, final_url, None, {"content-type": "text/html; charset=utf-8"}, html.encode(),
+                           "browser", reason, time.monotonic() - start_time)
+
+    async def _settled_content(self, tab) -> str:
+        # Challenge pages replace themselves with the real page once their script finishes
+        deadline = time.monotonic() + self.browser_timeout
+        html = ""
+        while True:
+            try:
+                html = await tab.get_content()
+            except Exception:
+                # Page navigated while its content was read
+                log.debug("Failed to read browser page content", exc_info=True)
+            headers = {"content-type": "text/html"}
+            if not escalation_reason(200, headers, html.encode(), self.min_text_chars):
+                return html
+            if time.monotonic() >= deadline:
+                return html
+            await asyncio.sleep(BROWSER_SETTLE_INTERVAL)
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Get each domain's fetch counts and escalation rate.
+
+        :return: Fetch stats by domain
+        """
+        return {domain: stats.to_dict() for domain, stats in self.domain_stats.items()}
+
+    async def close(self) -> None:
+        """
+        Close the pooled connections.
+        """
+        if self._connector:
+            await self._connector.close()
+            self._connector = None
+
+
+def escalation_reason(status: int, headers: dict, content: bytes,
+                      min_text_chars: int = DEFAULT_MIN_TEXT_CHARS) -> Optional[str]:
+    """
+    Check if a response needs a browser to get the page's content.
+
+    :param status: Response status code
+    :param headers: Response headers
+    :param content: Response body
+    :param min_text_chars: Least visible text a page needs to not be considered empty
+    :return: Why a browser is needed, None if the response is usable
+    """
+    lower_headers = {name.lower(): value for name, value in headers.items()}
+    if lower_headers.get("cf-mitigated", "").lower() == "challenge":
+        return "challenge"
+    content_type = lower_headers.get("content-type", "").lower()
+    is_html = "html" in content_type or (not content_type and content.lstrip()[:1] == b"<")
+    if not content:
+        return "empty content" if status < 300 or status in CHALLENGE_STATUSES else None
+    if not is_html:
+        return None
+    html = content.decode(charset_from_headers(headers) or "utf-8", errors="replace")
+    lower_html = html.lower()
+    if status in CHALLENGE_STATUSES and any(marker in lower_html for marker in CHALLENGE_MARKERS):
+        return "challenge"
+    if status >= 300:
+        # A real error page, a browser would get the same
+        return None
+    text = visible_text(html)
+    if len(text) >= min_text_chars:
+        return None
+    if any(marker in lower_html for marker in CHALLENGE_MARKERS):
+        return "challenge"
+    if any(marker in lower_html for marker in JAVASCRIPT_REQUIRED_MARKERS):
+        return "javascript required"
+    return "empty content"
+
+
+def visible_text(html: str) -> str:
+    """
+    Get the text a browser would show for a page without running its scripts.
+
+    :param html: Page HTML
+    :return: Text with whitespace collapsed
+    """
+    html = HIDDEN_ELEMENTS_PATTERN.sub(" ", COMMENT_PATTERN.sub(" ", html))
+    return WHITESPACE_PATTERN.sub(" ", TAG_PATTERN.sub(" ", html)).strip()
+
+
+def charset_from_headers(headers: dict) -> Optional[str]:
+    """
+    Get the character set declared in a response's Content-Type.
+
+    :param headers: Response headers
+    :return: Character set, None if not declared
+    """
+    content_type = next((value for name, value in headers.items() if name.lower() == "content-type"), "")
+    for parameter in content_type.split(";")[1:]:
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            charset = value.strip().strip("\"'")
+            try:
+                "".encode(charset)
+                return charset
+            except LookupError:
+                return None
+    return None
+
+
+def aiohttp_cookie_jar(cookie_jar: CookieJar) -> aiohttp.CookieJar:
+    """
+    Copy cookies into a cookie jar for aiohttp requests.
+
+    :param cookie_jar: Cookies to copy
+    :return: aiohttp cookie jar
+    """
+    aiohttp_jar = aiohttp.CookieJar(unsafe=True)
+    for cookie in cookie_jar:
+        morsel = Morsel()
+        morsel.set(cookie.name, cookie.value or "", cookie.value or "")
+        morsel["path"] = cookie.path or "/"
+        if cookie.secure:
+            morsel["secure"] = True
+        if cookie.has_nonstandard_attr("HttpOnly"):
+            morsel["httponly"] = True
+        host = cookie.domain.lstrip(".")
+        if cookie.domain_specified:
+            morsel["domain"] = host
+        if cookie.expires:
+            morsel["max-age"] = str(max(int(cookie.expires - time.time()), 0))
+        aiohttp_jar.update_cookies({cookie.name: morsel}, URL(f"https://{host}/"))
+    return aiohttp_jar
+
+
+def fetcher_from_env(browser_pool: Optional[BrowserPool]) -> TieredFetcher:
+    """
+    Make a tiered fetcher configured by the FETCHER_* environment variables.
+
+    :param browser_pool: Pool of headless browsers to escalate to
+    :return: Tiered fetcher
+    """
+    return TieredFetcher(
+        browser_pool,
+        int(os.environ.get("FETCHER_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        int(os.environ.get("FETCHER_MAX_CONNECTIONS_PER_HOST", DEFAULT_MAX_CONNECTIONS_PER_HOST)),
+        float(os.environ.get("FETCHER_TIMEOUT", DEFAULT_TIMEOUT)),
+        int(os.environ.get("FETCHER_MAX_BODY_BYTES", DEFAULT_MAX_BODY_BYTES)),
+        int(os.environ.get("FETCHER_MIN_TEXT_CHARS", DEFAULT_MIN_TEXT_CHARS)),
+        float(os.environ.get("FETCHER_BROWSER_TIMEOUT", DEFAULT_BROWSER_TIMEOUT)),
+        float(os.environ.get("FETCHER_BROWSER_FIRST_RATE", DEFAULT_BROWSER_FIRST_RATE)),
+        os.environ.get("FETCHER_USER_AGENT") or DEFAULT_USER_AGENT
+    )
+
+
+tiered_fetcher = None
+log = getLogger(__name__)
@@ -0,0 +1,231 @@
+from collections import deque
+import fcntl
+import json
+import logging
+from logging import LogRecord
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Optional
+
+from mediamirror.services.logs import ConfiguredLogRotator
+
+SEND_ATTEMPTS = 50
+SEND_RETRY_DELAY = 0.02
+# Records kept while the writer can't be reached, newer records are dropped once full
+MAX_PENDING_RECORDS = 10000
+
+
+class LogRecordStreamHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        """
+        Pass records sent by a worker to the writer's file handler.
+        """
+        for line in self.rfile:
+            try:
+                record = logging.makeLogRecord(json.loads(line))
+            except (ValueError, TypeError):
+                continue
+            self.server.file_handler.handle(record)
+
+
+class LogAggregationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, file_handler: ConfiguredLogRotator):
+        self.file_handler = file_handler
+        super().__init__(socket_path, LogRecordStreamHandler)
+
+
+class AggregatingLogHandler(logging.Handler):
+    """
+    File handler for running multiple workers against the same log.
+
+    The worker holding the writer lock owns the ConfiguredLogRotator and receives records
+    from the other workers over a Unix socket, so only one process formats, rotates and
+    compresses the log. If the writer exits, the next worker to fail sending takes over.
+    Records that can't be sent are queued and retried from a background thread, so logging
+    never waits on the writer.
+    """
+    file_handler = None
+    server = None
+    _retry_thread = None
+
+    def __init__(self, filename: str, **rotator_kwargs):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.rotator_kwargs = rotator_kwargs
+        log_dir, log_file_name = os.path.split(self.filename)
+        self.socket_path = os.path.join(log_dir, f".{log_file_name}.sock")
+        self.lock_path = os.path.join(log_dir, f".{log_file_name}.lock")
+        self._lock_file = None
+        self._socket = None
+        self._pending = deque()
+        self._encoder = json.JSONEncoder(default=str, check_circular=False)
+        self._exception_formatter = logging.Formatter()
+        self._become_writer()
+
+    def _become_writer(self) -> bool:
+        """
+        Take the writer lock if no other worker holds it, and start receiving records.
+
+        :return: Whether this worker is now the writer
+        """
+        if self.file_handler:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self._close_socket()
+        self.file_handler = ConfiguredLogRotator(self.filename, **self.rotator_kwargs)
+        self.file_handler.setFormatter(self.formatter)
+        if os.path.exists(self.socket_path):
+            # Left behind by a previous writer
+            os.remove(self.socket_path)
+        self.server = LogAggregationServer(self.socket_path, self.file_handler)
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(target=self.server.serve_forever, name="LogAggregationServer", daemon=True).start()
+        return True
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        """
+        Set the formatter used by the writer.
+
+        :param fmt: Formatter for the log file
+        """
+        super().setFormatter(fmt)
+        if self.file_handler:
+            self.file_handler.setFormatter(fmt)
+
+    def serialize(self, record: LogRecord) -> bytes:
+        """
+        Encode a record to send to the writer, rendering anything that can't be sent as-is.
+
+        :param record: Log record
+        :return: Newline-terminated JSON record
+        """
+        record_dict = dict(record.__dict__)
+        record_dict["msg"] = record.getMessage()
+        record_dict["args"] = None
+        if record.exc_info:
+            record_dict["exc_text"] = record.exc_text or self._exception_formatter.formatException(record.exc_info)
+        record_dict["exc_info"] = None
+        record_dict.pop("message", None)
+        return (self._encoder.encode(record_dict) + "\n").encode("utf-8")
+
+    def _send(self, data: bytes) -> None:
+        if not self._socket:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.socket_path)
+        self._socket.sendall(data)
+
+    def _close_socket(self) -> None:
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def _send_pending(self) -> None:
+        """
+        Send queued records in order, or write them if this worker can become the writer.
+
+        :raises OSError: If the writer couldn't be reached
+        """
+        while self._pending:
+            record, data = self._pending[0]
+            try:
+                self._send(data)
+            except OSError:
+                self._close_socket()
+                if not self._become_writer():
+                    raise
+                self.file_handler.handle(record)
+            self._pending.popleft()
+
+    def _drop_pending(self, reason: str) -> None:
+        if self._pending:
+            sys.stderr.write(f"Dropped {len(self._pending)} log records: {reason}\n")
+            self._pending.clear()
+
+    def _retry_pending(self) -> None:
+        """
+        Retry queued records until they are sent or the writer stays unreachable for `SEND_ATTEMPTS` tries.
+        """
+        failures = 0
+        while True:
+            time.sleep(SEND_RETRY_DELAY)
+            with self.lock:
+                try:
+                    self._send_pending()
+                except OSError:
+                    failures += 1
+                    if failures < SEND_ATTEMPTS:
+                        continue
+                    self._drop_pending("log writer is unreachable")
+                except Exception as e:
+                    self._drop_pending(f"failed to write them ({e})")
+                self._retry_thread = None
+                return
+
+    def emit(self, record: LogRecord) -> None:
+        """
+        Write the record if this worker is the writer, otherwise send it to the writer.
+
+        :param record: Log record
+        """
+        if self.file_handler:
+            self.file_handler.handle(record)
+            return
+        try:
+            data = self.serialize(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._pending) >= MAX_PENDING_RECORDS:
+            return
+        # Queue behind earlier records that are still being retried so order is kept
+        self._pending.append((record, data))
+        if self._retry_thread:
+            return
+        try:
+            self._send_pending()
+        except OSError:
+            # A new writer may hold the lock but not be listening yet
+            self._retry_thread = threading.Thread(target=self._retry_pending, name="LogAggregationRetry",
+                                                  daemon=True)
+            self._retry_thread.start()
+        except Exception:
+            self._pending.clear()
+            self._close_socket()
+            self.handleError(record)
+
+    def close(self) -> None:
+        """
+        Stop receiving records and release the writer lock, dropping records that couldn't be sent to the writer.
+        """
+        with self.lock:
+            if self._pending:
+                try:
+                    self._send_pending()
+                except OSError:
+                    self._drop_pending("log writer is unreachable")
+        self._close_socket()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.server = None
+        if self.file_handler:
+            self.file_handler.close()
+            self.file_handler = None
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+        super().close()
@@ -0,0 +1,267 @@
+from collections import deque
+from datetime import (
+    datetime,
+    timedelta,
+    timezone
+)
+import io
+import logging
+from logging import LogRecord
+from sqlalchemy import select
+import sys
+import threading
+import time
+from typing import (
+    Optional,
+    Tuple
+)
+
+from mediamirror.models.logs import LogRecordEntry
+from mediamirror.services.database_manager import (
+    create_sync_db_engine,
+    paged_results
+)
+
+TABLE_NAME = "log_records"
+PARTITION_PREFIX = f"{TABLE_NAME}_"
+PARTITION_DATE_FORMAT = "%Y%m%d"
+COPY_COLUMNS = [
+    "created", "name", "levelname", "levelno", "pathname", "module", "lineno", "func_name",
+    "relative_created", "thread", "thread_name", "process_name", "process", "message", "exc_text", "stack_info"
+]
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_QUEUE = 100000
+DEFAULT_RETENTION_DAYS = 30
+RETENTION_CHECK_INTERVAL = 3600
+
+
+class DatabaseLogHandler(logging.Handler):
+    """
+    Writes log records to the day-partitioned `log_records` table.
+
+    Records are queued in memory and written by a background thread with one `COPY` per batch,
+    creating each day's partition as it is needed and dropping partitions past the retention period.
+    The formatter must provide `record_fields` like JsonLogFormatter, so rows match the log files.
+    """
+    retention_days = DEFAULT_RETENTION_DAYS
+    batch_size = DEFAULT_BATCH_SIZE
+    flush_interval = DEFAULT_FLUSH_INTERVAL
+
+    def __init__(self, db_config: dict, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_queue: int = DEFAULT_MAX_QUEUE):
+        """
+        :param db_config: Dict of database configuration values
+        :param retention_days: Days of partitions to keep, `0` = keep all
+        :param batch_size: Queued records that trigger a write before the flush interval
+        :param flush_interval: Seconds between writes
+        :param max_queue: Records kept while the database is unavailable, the oldest are dropped past this
+        """
+        super().__init__()
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.engine = create_sync_db_engine(db_config)
+        self._queue = deque(maxlen=max_queue)
+        self._partitions = set()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._next_retention_check = 0.0
+        self._writer_thread = threading.Thread(target=self._write_loop, name="DatabaseLogWriter", daemon=True)
+        self._writer_thread.start()
+
+    def emit(self, record: LogRecord) -> None:
+        """
+        Queue a log record to be written.
+
+        :param record: Log record
+        """
+        try:
+            fields = self.formatter.record_fields(record)
+            self._queue.append((
+                datetime.fromtimestamp(record.created, timezone.utc).replace(tzinfo=None),
+                fields["name"],
+                fields["levelname"],
+                fields["levelno"],
+                fields["pathname"],
+                fields["module"],
+                fields["lineno"],
+                fields["funcName"],
+                fields["relativeCreated"],
+                fields["thread"],
+                fields["threadName"],
+                fields["processName"],
+                fields["process"],
+                fields["message"],
+                fields["exc_text"],
+                fields["stack_info"]
+            ))
+            if len(self._queue) >= self.batch_size:
+                self._wake.set()
+        except Exception:
+            self.handleError(record)
+
+    def _write_loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self.retention_days and time.monotonic() >= self._next_retention_check:
+                    self.drop_expired_partitions()
+                    self._next_retention_check = time.monotonic() + RETENTION_CHECK_INTERVAL
+            except Exception as e:
+                # Logging this would feed back into the handler
+                print(f"Failed to write logs to the database: {e}", file=sys.stderr)
+
+    def flush(self) -> None:
+        """
+        Write all queued records, one `COPY` per batch.
+        """
+        with self._write_lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+                try:
+                    self.write_batch(batch)
+                except Exception:
+                    # Keep the records for the next attempt
+                    self._queue.extendleft(reversed(batch))
+                    raise
+
+    def write_batch(self, batch: list[tuple]) -> None:
+        """
+        Copy a batch of rows into the table, creating partitions for any new days.
+
+        :param batch: Rows in COPY_COLUMNS order
+        """
+        days = {row[0].date() for row in batch}
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                for day in days - self._partitions:
+                    cursor.execute(create_partition_statement(day))
+                    connection.commit()
+                    self._partitions.add(day)
+                copy_data = io.StringIO("".join(
+                    "\t".join(copy_value(value) for value in row) + "\n" for row in batch
+                ))
+                cursor.copy_expert(
+                    f"COPY {TABLE_NAME} ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+                    copy_data
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def drop_expired_partitions(self) -> list[str]:
+        """
+        Drop daily partitions older than the retention period.
+
+        :return: Names of the dropped partitions
+        """
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=self.retention_days)
+        dropped = []
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT child.relname FROM pg_inherits "
+                    "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                    "WHERE parent.relname = %s",
+                    (TABLE_NAME,)
+                )
+                for (partition_name,) in cursor.fetchall():
+                    try:
+                        day = datetime.strptime(partition_name.removeprefix(PARTITION_PREFIX),
+                                                PARTITION_DATE_FORMAT).date()
+                    except ValueError:
+                        continue
+                    if day < cutoff:
+                        cursor.execute(f'DROP TABLE IF EXISTS "{partition_name}"')
+                        self._partitions.discard(day)
+                        dropped.append(partition_name)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        return dropped
+
+    def close(self) -> None:
+        """
+        Stop the writer thread and write any queued records.
+        """
+        self._stopped.set()
+        self._wake.set()
+        self._writer_thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Failed to write logs to the database: {e}", file=sys.stderr)
+        self.engine.dispose()
+        super().close()
+
+
+def create_partition_statement(day) -> str:
+    """
+    Build the statement creating the partition for a day.
+
+    :param day: UTC date of the partition
+    :return: CREATE TABLE statement
+    """
+    next_day = day + timedelta(days=1)
+    return (f'CREATE TABLE IF NOT EXISTS "{PARTITION_PREFIX}{day.strftime(PARTITION_DATE_FORMAT)}" '
+            f"PARTITION OF {TABLE_NAME} FOR VALUES FROM ('{day.isoformat()}') TO ('{next_day.isoformat()}')")
+
+
+def copy_value(value) -> str:
+    """
+    Encode a value for text format `COPY`.
+
+    :param value: Column value
+    :return: Escaped value
+    """
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+            .replace("\r", "\\r").replace("\x00", ""))
+
+
+async def query_log_records(start_time: Optional[float] = None, end_time: Optional[float] = None,
+                            levels: Optional[list[str]] = None, loggers: Optional[list[str]] = None,
+                            page_size: int = 100, page: int = 1) -> Tuple[list[LogRecordEntry], bool]:
+    """
+    Query stored log records, newest first.
+
+    :param start_time: Only include records created at or after this timestamp
+    :param end_time: Only include records created at or before this timestamp
+    :param levels: Only include records with these level names
+    :param loggers: Only include records from these loggers
+    :param page_size: Number of records per page
+    :param page: Page number to retrieve
+    :return: Records, whether there is a next page
+    """
+    statement = select(LogRecordEntry)
+    # Bounding created lets Postgres skip partitions outside the range
+    if start_time is not None:
+        statement = statement.where(LogRecordEntry.created >= datetime.fromtimestamp(start_time, timezone.utc))
+    if end_time is not None:
+        statement = statement.where(LogRecordEntry.created <= datetime.fromtimestamp(end_time, timezone.utc))
+    if levels:
+        statement = statement.where(LogRecordEntry.levelno.in_(
+            [logging.getLevelName(level) for level in levels if isinstance(logging.getLevelName(level), int)]
+        ))
+    if loggers:
+        statement = statement.where(LogRecordEntry.name.in_(loggers))
+    statement = statement.order_by(LogRecordEntry.created.desc(), LogRecordEntry.id.desc())
+    results, has_next_page = await paged_results(statement, page_size, page)
+    return [result[0] for result in results], has_next_page
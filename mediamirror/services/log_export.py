@@ -0,0 +1,120 @@
+import glob
+import json
+import os
+import tarfile
+import tempfile
+from typing import (
+    Iterator,
+    Optional
+)
+import zstandard as zstd
+
+from mediamirror.services.log_index import (
+    INDEX_SUFFIX,
+    line_timestamp,
+    read_index
+)
+
+EXPORT_CHUNK_SIZE = 1048576
+EXPORT_SPOOL_SIZE = 8388608
+EXPORT_COMPRESSION_LEVEL = 3
+EXPORT_ROOT_DIR = "logs"
+
+
+def export_log_paths(log_dir: str, start_time: float, end_time: float) -> list[str]:
+    """
+    Find logs that may contain records in a time range.
+
+    :param log_dir: Log directory
+    :param start_time: Start of the range (timestamp)
+    :param end_time: End of the range (timestamp)
+    :return: Relative paths of matching logs, oldest first
+    """
+    log_paths = []
+    for pattern in ["*.log", "*/*.log", "*/*.log.zst"]:
+        for log_path in glob.glob(os.path.join(log_dir, pattern)):
+            # A log's last record is written shortly before it is rotated
+            if os.path.getmtime(log_path) < start_time:
+                continue
+            first_time = log_start_time(log_path)
+            if first_time is not None and first_time > end_time:
+                continue
+            log_paths.append(log_path)
+    log_paths.sort(key=os.path.getmtime)
+    return [os.path.relpath(log_path, log_dir) for log_path in log_paths]
+
+
+def log_start_time(log_path: str) -> Optional[float]:
+    """
+    Get the time of the first record in a log, using its index if there is one.
+
+    :param log_path: Path to the log
+    :return: Timestamp of the first record, or None if unknown
+    """
+    index_entries = read_index(f"{log_path}{INDEX_SUFFIX}")
+    if index_entries:
+        return index_entries[0][0]
+    if log_path.endswith(".log"):
+        with open(log_path, "rb") as log_file:
+            created = line_timestamp(log_file.readline())
+            return created if created else None
+    return None
+
+
+def export_logs(log_manager, start_time: float, end_time: float, loggers: Optional[list[str]] = None,
+                threads: int = 0) -> Iterator[bytes]:
+    """
+    Stream a tar.zst of the records in a time range, one decompressed member per log file.
+
+    Each member is spooled to a temporary file before being added since tar headers need its size,
+    so memory stays bounded regardless of how large the logs are.
+
+    :param log_manager: AppLogManager to read logs with
+    :param start_time: Start of the range (timestamp)
+    :param end_time: End of the range (timestamp)
+    :param loggers: Only include records from these loggers
+    :param threads: zstd worker threads, `0` = compress in the calling thread
+    :return: Compressed archive chunks
+    """
+    cctx = zstd.ZstdCompressor(level=EXPORT_COMPRESSION_LEVEL, threads=threads)
+    chunker = cctx.chunker(chunk_size=EXPORT_CHUNK_SIZE)
+    archive_size = 0
+    for rel_log_path in export_log_paths(log_manager.log_dir, start_time, end_time):
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as member_file:
+            for line in log_manager.read_log(rel_log_path, start_time=start_time, end_time=end_time):
+                if loggers and not line_matches_loggers(line, loggers):
+                    continue
+                member_file.write(line.encode("utf-8"))
+            member_size = member_file.tell()
+            if not member_size:
+                continue
+            member_file.seek(0)
+            member_info = tarfile.TarInfo(os.path.join(EXPORT_ROOT_DIR, rel_log_path.removesuffix(".zst")))
+            member_info.size = member_size
+            member_info.mtime = int(os.path.getmtime(os.path.join(log_manager.log_dir, rel_log_path)))
+            member_info.mode = 0o644
+            header = member_info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+            yield from chunker.compress(header)
+            while data := member_file.read(EXPORT_CHUNK_SIZE):
+                yield from chunker.compress(data)
+            padding = -member_size % tarfile.BLOCKSIZE
+            yield from chunker.compress(tarfile.NUL * padding)
+            archive_size += len(header) + member_size + padding
+    # End of archive marker, padded to a full record like tarfile does
+    archive_size += tarfile.BLOCKSIZE * 2
+    yield from chunker.compress(tarfile.NUL * (tarfile.BLOCKSIZE * 2 + -archive_size % tarfile.RECORDSIZE))
+    yield from chunker.finish()
+
+
+def line_matches_loggers(line: str, loggers: list[str]) -> bool:
+    """
+    Whether a JSON log line was written by one of the given loggers.
+
+    :param line: Log line
+    :param loggers: Logger display names
+    :return: If the line matches, or can't be parsed
+    """
+    try:
+        return json.loads(line).get("name") in loggers
+    except (ValueError, AttributeError):
+        return True
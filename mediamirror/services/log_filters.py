@@ -0,0 +1,142 @@
+import logging
+from logging import LogRecord
+import random
+import threading
+import time
+from typing import Optional
+
+DEFAULT_BURST_WINDOW = 10.0
+DEFAULT_BURST_THRESHOLD = 5
+
+
+class BurstState:
+    __slots__ = ["window_start", "count", "suppressed"]
+
+    def __init__(self, window_start: float):
+        self.window_start = window_start
+        self.count = 0
+        self.suppressed = 0
+
+
+class BurstFilter(logging.Filter):
+    """
+    Collapses bursts of identical records and samples DEBUG records.
+
+    Records are identical if they share a logger, level and message template. Within each window
+    the first `threshold` of them pass, the rest are counted and reported in a summary record once
+    the window ends. DEBUG records from loggers with a sample rate below 1 are randomly dropped.
+
+    Attach to handlers, since a filter on a logger never sees records from its child loggers. Each
+    record's decision is remembered on the record, so one passing through several handlers is only
+    counted once and every handler agrees on whether it is logged.
+    """
+    window = DEFAULT_BURST_WINDOW
+    threshold = DEFAULT_BURST_THRESHOLD
+    debug_sample_rates = {}
+
+    def __init__(self, window: float = DEFAULT_BURST_WINDOW, threshold: int = DEFAULT_BURST_THRESHOLD,
+                 debug_sample_rates: Optional[dict[str, float]] = None):
+        """
+        :param window: Seconds each burst window lasts, `0` = no deduplication
+        :param threshold: Identical records passed per window before the rest are suppressed
+        :param debug_sample_rates: Fraction of DEBUG records to keep per logger name, applies to child loggers
+        """
+        super().__init__()
+        self.window = window
+        self.threshold = threshold
+        self.debug_sample_rates = debug_sample_rates or {}
+        self._states = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "BurstFilter":
+        """
+        Create a filter from the `burst_filter` logging setting.
+
+        :param config: Setting value
+        :return: Configured filter
+        """
+        return cls(float(config.get("window", DEFAULT_BURST_WINDOW)),
+                   int(config.get("threshold", DEFAULT_BURST_THRESHOLD)),
+                   {name: float(rate) for name, rate in config.get("debug_sample_rates", {}).items()})
+
+    def sample_rate(self, logger_name: str) -> float:
+        """
+        Get the DEBUG sample rate for a logger from its closest configured ancestor.
+
+        :param logger_name: Logger name
+        :return: Fraction of DEBUG records to keep
+        """
+        name = logger_name
+        while name:
+            if name in self.debug_sample_rates:
+                return self.debug_sample_rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: LogRecord) -> bool:
+        """
+        Decide whether a record is logged.
+
+        :param record: Log record
+        :return: If the record should be logged
+        """
+        if getattr(record, "burst_summary", False):
+            return True
+        decision = getattr(record, "burst_passed", None)
+        if decision is None:
+            decision = record.burst_passed = self._decide(record)
+        return decision
+
+    def _decide(self, record: LogRecord) -> bool:
+        if record.levelno == logging.DEBUG and self.debug_sample_rates:
+            rate = self.sample_rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+        if self.window <= 0 or self.threshold <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.name, record.levelno, str(record.msg))
+        expired = []
+        with self._lock:
+            if now >= self._next_sweep:
+                # Summarize bursts that have ended, and forget idle keys
+                for state_key, state in list(self._states.items()):
+                    if now - state.window_start >= self.window:
+                        del self._states[state_key]
+                        if state.suppressed:
+                            expired.append((state_key, state))
+                self._next_sweep = now + self.window
+            state = self._states.get(key)
+            if state and now - state.window_start >= self.window:
+                del self._states[key]
+                if state.suppressed:
+                    expired.append((key, state))
+                state = None
+            if not state:
+                state = self._states[key] = BurstState(now)
+            state.count += 1
+            passed = state.count <= self.threshold
+            if not passed:
+                state.suppressed += 1
+        for state_key, expired_state in expired:
+            self.emit_summary(state_key, expired_state, now)
+        return passed
+
+    def emit_summary(self, key: tuple[str, int, str], state: BurstState, now: float) -> None:
+        """
+        Log how many records of a burst were suppressed.
+
+        :param key: Logger name, level and message template of the burst
+        :param state: Ended burst
+        :param now: Current monotonic time
+        """
+        logger_name, levelno, template = key
+        logger = logging.getLogger(logger_name)
+        summary = logger.makeRecord(
+            logger_name, levelno, "(burst filter)", 0,
+            "Suppressed %d repeats of '%s' in %.1fs", (state.suppressed, template, now - state.window_start),
+            None, extra={"burst_summary": True}
+        )
+        logger.handle(summary)
@@ -0,0 +1,197 @@
+from bisect import (
+    bisect_left,
+    bisect_right
+)
+import json
+import os
+from typing import (
+    Optional,
+    Tuple
+)
+
+INDEX_SUFFIX = ".idx"
+DEFAULT_INTERVAL_LINES = 5000
+DEFAULT_INTERVAL_BYTES = 1048576
+
+
+class LogIndex:
+    """
+    Sparse sidecar index for a JSON log file.
+
+    Every `interval_lines` lines or `interval_bytes` bytes a checkpoint
+    (timestamp, byte offset, line number) is appended to the sidecar file,
+    so readers can seek close to a time or line instead of scanning from the start.
+    """
+    index_path = None
+    interval_lines = DEFAULT_INTERVAL_LINES
+    interval_bytes = DEFAULT_INTERVAL_BYTES
+
+    def __init__(self, index_path: str, interval_lines: int = DEFAULT_INTERVAL_LINES,
+                 interval_bytes: int = DEFAULT_INTERVAL_BYTES):
+        self.index_path = index_path
+        self.interval_lines = interval_lines
+        self.interval_bytes = interval_bytes
+        self.line_count = 0
+        self._lines_since = 0
+        self._bytes_since = 0
+        self._index_file = None
+
+    def checkpoint_due(self) -> bool:
+        """
+        Whether the next line written should be recorded as a checkpoint.
+
+        :return: If a checkpoint is due
+        """
+        return (self.line_count == 0
+                or (self.interval_lines and self._lines_since >= self.interval_lines)
+                or (self.interval_bytes and self._bytes_since >= self.interval_bytes))
+
+    def add_checkpoint(self, timestamp: float, offset: int) -> None:
+        """
+        Record a checkpoint for the next line written.
+
+        :param timestamp: Creation time of the log record on the line
+        :param offset: Byte offset of the start of the line
+        """
+        if not self._index_file:
+            self._index_file = open(self.index_path, "a", encoding="utf-8")
+        self._index_file.write(json.dumps([timestamp, offset, self.line_count]) + "\n")
+        self._index_file.flush()
+        self._lines_since = 0
+        self._bytes_since = 0
+
+    def advance(self, size: int) -> None:
+        """
+        Account for a line written to the log.
+
+        :param size: Size of the line in bytes, including the terminator
+        """
+        self.line_count += 1
+        self._lines_since += 1
+        self._bytes_since += size
+
+    def resume(self, log_path: str) -> None:
+        """
+        Restore index state for an existing log file, indexing anything written after the last checkpoint.
+
+        :param log_path: Path to the log file being indexed
+        """
+        entries = read_index(self.index_path)
+        log_size = os.path.getsize(log_path) if os.path.isfile(log_path) else 0
+        if entries and entries[-1][1] > log_size:
+            # Index does not belong to this log file, rebuild it
+            entries = []
+        if not entries:
+            self.reset()
+        if not log_size:
+            return
+        with open(log_path, "rb") as log_file:
+            if entries:
+                _, offset, line_num = entries[-1]
+                log_file.seek(offset)
+                first_line = log_file.readline()
+                self.line_count = line_num
+                self.advance(len(first_line))
+                offset += len(first_line)
+            else:
+                offset = 0
+            for line in log_file:
+                if self.checkpoint_due():
+                    self.add_checkpoint(line_timestamp(line), offset)
+                self.advance(len(line))
+                offset += len(line)
+
+    def reset(self) -> None:
+        """
+        Discard all checkpoints, for when the log file is started over.
+        """
+        self.close()
+        with open(self.index_path, "w", encoding="utf-8"):
+            pass
+        self.line_count = 0
+        self._lines_since = 0
+        self._bytes_since = 0
+
+    def finalize(self, dest: Optional[str] = None) -> None:
+        """
+        Close the index and move it alongside a rotated log.
+
+        :param dest: Rotated log file location, or None to discard the index
+        """
+        self.close()
+        if os.path.isfile(self.index_path):
+            if dest:
+                os.replace(self.index_path, f"{dest}{INDEX_SUFFIX}")
+            else:
+                os.remove(self.index_path)
+
+    def close(self) -> None:
+        """
+        Close the sidecar file.
+        """
+        if self._index_file:
+            self._index_file.close()
+            self._index_file = None
+
+
+def line_timestamp(line: str | bytes) -> float:
+    """
+    Get the creation time of a JSON log line.
+
+    :param line: Raw log line
+    :return: Record creation timestamp, or 0 if it could not be read
+    """
+    try:
+        return float(json.loads(line).get("created", 0))
+    except Exception:
+        return 0.0
+
+
+def read_index(index_path: str) -> list[Tuple[float, int, int]]:
+    """
+    Read checkpoints from a sidecar index file.
+
+    :param index_path: Path to the sidecar index
+    :return: List of (timestamp, byte offset, line number) checkpoints
+    """
+    entries = []
+    if os.path.isfile(index_path):
+        with open(index_path, "r", encoding="utf-8") as index_file:
+            for line in index_file:
+                try:
+                    timestamp, offset, line_num = json.loads(line)
+                    entries.append((float(timestamp), int(offset), int(line_num)))
+                except (ValueError, TypeError):
+                    # Partially written checkpoint
+                    continue
+    return entries
+
+
+def seek_time(entries: list[Tuple[float, int, int]], timestamp: float) -> Tuple[int, int]:
+    """
+    Find the checkpoint to start reading from for records created at or after a time.
+
+    :param entries: Index checkpoints
+    :param timestamp: Earliest record time wanted
+    :return: Byte offset, line number
+    """
+    position = bisect_left([entry[0] for entry in entries], timestamp) - 1
+    if position < 0:
+        return 0, 0
+    _, offset, line_num = entries[position]
+    return offset, line_num
+
+
+def seek_line(entries: list[Tuple[float, int, int]], line_num: int) -> Tuple[int, int]:
+    """
+    Find the checkpoint to start reading from for a line number.
+
+    :param entries: Index checkpoints
+    :param line_num: First line number wanted
+    :return: Byte offset, line number
+    """
+    position = bisect_right([entry[2] for entry in entries], line_num) - 1
+    if position < 0:
+        return 0, 0
+    _, offset, entry_line = entries[position]
+    return offset, entry_line
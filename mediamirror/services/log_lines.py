@@ -0,0 +1,257 @@
+from array import array
+from collections import OrderedDict
+import json
+import os
+import threading
+from typing import (
+    Iterator,
+    Optional,
+    Tuple
+)
+
+from mediamirror.services.compression import ZstdReader
+
+DEFAULT_CACHED_FILES = 8
+DEFAULT_CACHED_FILTERS = 4
+MAX_WINDOW_LINES = 1000
+# Lines between cached offsets, readers seek to the closest one before a line and scan forward
+CHECKPOINT_LINES = 256
+
+
+class LineFilter:
+    """
+    Level, component and message search filter for JSON log lines.
+    """
+    __slots__ = ["levels", "components", "search"]
+
+    def __init__(self, levels: Optional[list[str]] = None, components: Optional[list[str]] = None,
+                 search: Optional[str] = None):
+        """
+        :param levels: Only match records with these level names
+        :param components: Only match records from these components
+        :param search: Only match records whose message or exception contains this text, ignoring case
+        """
+        self.levels = frozenset(levels or [])
+        self.components = frozenset(components or [])
+        self.search = (search or "").strip().lower()
+
+    @property
+    def active(self) -> bool:
+        return bool(self.levels or self.components or self.search)
+
+    @property
+    def key(self) -> tuple:
+        return (self.levels, self.components, self.search)
+
+    def matches(self, line: str | bytes) -> bool:
+        """
+        Whether a log line passes the filter.
+
+        :param line: JSON log line
+        :return: If the line matches
+        """
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return False
+        if self.levels and record.get("levelname") not in self.levels:
+            return False
+        if self.components and record.get("name") not in self.components:
+            return False
+        if self.search:
+            text = f"{record.get('message') or ''}\n{record.get('exc_text') or ''}".lower()
+            if self.search not in text:
+                return False
+        return True
+
+
+class LineOffsets:
+    """
+    Cached line positions of one log file.
+
+    For plain logs `checkpoints` holds the byte offset of every `CHECKPOINT_LINES`th line, so memory use
+    grows with the log a fraction as fast as its line count. For compressed logs only the line count is
+    kept since lines are read through the frame index instead.
+    """
+    __slots__ = ["inode", "mtime_ns", "size", "checkpoints", "line_count", "filters", "lock"]
+
+    def __init__(self, inode: int, mtime_ns: int):
+        self.inode = inode
+        self.mtime_ns = mtime_ns
+        self.size = 0
+        self.checkpoints = array("Q")
+        self.line_count = 0
+        # Filter key -> (lines scanned, matching line numbers)
+        self.filters = OrderedDict()
+        self.lock = threading.Lock()
+
+
+class LineOffsetCache:
+    """
+    LRU cache of sparse line offsets for log files, so any window of lines can be read by scanning at most
+    `CHECKPOINT_LINES` lines before it.
+
+    The active log is only scanned from where the previous scan stopped, rotated or rewritten files are
+    scanned again from the start. Line numbers matching a filter are cached the same way.
+    """
+    max_files = DEFAULT_CACHED_FILES
+    max_filters = DEFAULT_CACHED_FILTERS
+
+    def __init__(self, max_files: int = DEFAULT_CACHED_FILES, max_filters: int = DEFAULT_CACHED_FILTERS):
+        """
+        :param max_files: Number of files to keep offsets for
+        :param max_filters: Number of filters to keep matching lines for, per file
+        """
+        self.max_files = max_files
+        self.max_filters = max_filters
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, path: str) -> LineOffsets:
+        file_stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            compressed = path.endswith(".zst")
+            if (not entry or entry.inode != file_stat.st_ino or file_stat.st_size < entry.size
+                    or (compressed and entry.mtime_ns != file_stat.st_mtime_ns)):
+                entry = LineOffsets(file_stat.st_ino, file_stat.st_mtime_ns)
+                self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _update(self, path: str, entry: LineOffsets, dictionary_dir: Optional[str]) -> None:
+        if path.endswith(".zst"):
+            if not entry.size:
+                with ZstdReader(path, 0, dictionary_dir) as log_file:
+                    entry.line_count = sum(1 for line in log_file if line.endswith("\n"))
+                entry.size = os.path.getsize(path)
+            return
+        with open(path, "rb") as log_file:
+            log_file.seek(entry.size)
+            position = entry.size
+            line_count = entry.line_count
+            for line in log_file:
+                # Partial lines are still being written
+                if not line.endswith(b"\n"):
+                    break
+                if line_count % CHECKPOINT_LINES == 0:
+                    entry.checkpoints.append(position)
+                line_count += 1
+                position += len(line)
+        entry.size = position
+        entry.line_count = line_count
+
+    def line_count(self, path: str, dictionary_dir: Optional[str] = None) -> int:
+        """
+        Count the complete lines in a log.
+
+        :param path: Absolute path to the log
+        :param dictionary_dir: Directory of compression dictionaries
+        :return: Number of lines
+        """
+        entry = self._entry(path)
+        with entry.lock:
+            self._update(path, entry, dictionary_dir)
+            return entry.line_count
+
+    def matching_lines(self, path: str, line_filter: LineFilter,
+                       dictionary_dir: Optional[str] = None) -> array:
+        """
+        Find the line numbers in a log that pass a filter.
+
+        :param path: Absolute path to the log
+        :param line_filter: Filter to apply
+        :param dictionary_dir: Directory of compression dictionaries
+        :return: Matching line numbers, in order
+        """
+        entry = self._entry(path)
+        with entry.lock:
+            self._update(path, entry, dictionary_dir)
+            scanned, matches = entry.filters.pop(line_filter.key, (0, array("Q")))
+            if scanned < entry.line_count:
+                for line_num, line in enumerate(self._iter_lines(path, entry, scanned, dictionary_dir), scanned):
+                    if line_filter.matches(line):
+                        matches.append(line_num)
+                scanned = entry.line_count
+            entry.filters[line_filter.key] = (scanned, matches)
+            while len(entry.filters) > self.max_filters:
+                entry.filters.popitem(last=False)
+            return matches
+
+    def _iter_lines(self, path: str, entry: LineOffsets, start: int,
+                    dictionary_dir: Optional[str]) -> Iterator[str | bytes]:
+        if path.endswith(".zst"):
+            with ZstdReader(path, 0, dictionary_dir) as log_file:
+                for line_num, line in enumerate(log_file):
+                    if line_num >= entry.line_count:
+                        break
+                    if line_num >= start:
+                        yield line
+            return
+        if start >= entry.line_count:
+            return
+        with open(path, "rb") as log_file:
+            log_file.seek(entry.checkpoints[start // CHECKPOINT_LINES])
+            for _ in range(start % CHECKPOINT_LINES):
+                log_file.readline()
+            for _ in range(entry.line_count - start):
+                yield log_file.readline()
+
+    def read_lines(self, path: str, line_nums: list[int]) -> list[str]:
+        """
+        Read specific lines from a plain log using the cached offsets.
+
+        Consecutive lines are read in one pass, other lines are read by seeking to the closest cached
+        offset before them.
+
+        :param path: Absolute path to the log
+        :param line_nums: Line numbers in ascending order, which must have been counted already
+        :return: Lines, in the same order
+        """
+        entry = self._entry(path)
+        with entry.lock:
+            line_nums = [line_num for line_num in line_nums if line_num < entry.line_count]
+            checkpoints = {line_num // CHECKPOINT_LINES: entry.checkpoints[line_num // CHECKPOINT_LINES]
+                           for line_num in line_nums}
+        lines = []
+        with open(path, "rb") as log_file:
+            current = None
+            for line_num in line_nums:
+                checkpoint = line_num // CHECKPOINT_LINES
+                if current is None or line_num < current or line_num - current > line_num % CHECKPOINT_LINES:
+                    log_file.seek(checkpoints[checkpoint])
+                    current = checkpoint * CHECKPOINT_LINES
+                while current < line_num:
+                    log_file.readline()
+                    current += 1
+                lines.append(log_file.readline().decode("utf-8", errors="replace"))
+                current += 1
+        return lines
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        Forget cached offsets.
+
+        :param path: Absolute path to the log, defaults to all logs
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+def window_bounds(start: int, end: Optional[int], total: int) -> Tuple[int, int]:
+    """
+    Clamp a requested line window to the lines available.
+
+    :param start: First line requested
+    :param end: Line to stop before, defaults to `MAX_WINDOW_LINES` after the start
+    :param total: Number of lines available
+    :return: Clamped start and end
+    """
+    if end is None or end - start > MAX_WINDOW_LINES:
+        end = start + MAX_WINDOW_LINES
+    return min(start, total), min(end, total)
@@ -0,0 +1,279 @@
+import fcntl
+import glob
+import json
+from logging import getLogger
+import os
+import threading
+import time
+
+from mediamirror.services.compression import (
+    DICTIONARY_DIR_NAME,
+    DICTIONARY_SUFFIX,
+    load_dictionary,
+    read_frame_dictionary_id,
+    ZstdReader,
+    ZstdWriter
+)
+from mediamirror.services.log_index import (
+    INDEX_SUFFIX,
+    LogIndex,
+    read_index
+)
+
+STATE_FILE_NAME = ".retention.json"
+LOCK_FILE_NAME = ".retention.lock"
+DEFAULT_CHECK_INTERVAL = 3600
+DEFAULT_COMPACTION_AGE = 1
+
+
+class LogRetentionManager:
+    """
+    Keeps rotated logs within a disk budget and maximum age, recompressing older
+    archives at a higher zstd level in a low-priority background thread.
+    """
+    log_dir = None
+    max_bytes = 0
+    max_age = 0
+    compaction_level = 0
+    compaction_age = DEFAULT_COMPACTION_AGE
+    check_interval = DEFAULT_CHECK_INTERVAL
+
+    def __init__(self, log_dir: str, max_bytes: int = 0, max_age: int = 0, compaction_level: int = 0,
+                 compaction_age: int = DEFAULT_COMPACTION_AGE, check_interval: int = DEFAULT_CHECK_INTERVAL):
+        """
+        :param log_dir: Directory containing the active logs and the month subdirectories of rotated logs
+        :param max_bytes: Total size allowed for the log directory, `0` = unlimited
+        :param max_age: Days rotated logs are kept, `0` = forever
+        :param compaction_level: zstd level to recompress archives at, `0` = no recompression
+        :param compaction_age: Days before an archive is recompressed
+        :param check_interval: Seconds between retention passes
+        """
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compaction_level = compaction_level
+        self.compaction_age = compaction_age
+        self.check_interval = check_interval
+        self.state_path = os.path.join(log_dir, STATE_FILE_NAME)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Whether any retention limit or recompression is configured.
+        """
+        return bool(self.max_bytes or self.max_age or self.compaction_level)
+
+    def start(self) -> None:
+        """
+        Start the background retention thread if any limit is configured.
+        """
+        if not self.enabled or self._thread:
+            return
+        self._thread = threading.Thread(target=self._retention_loop, name="LogRetention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background retention thread after its current step.
+        """
+        self._stopped.set()
+
+    def _retention_loop(self) -> None:
+        try:
+            # Only lower this thread's priority, Linux schedules threads individually
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while not self._stopped.is_set():
+            try:
+                self.run()
+            except Exception:
+                log.exception("Log retention pass failed")
+            self._stopped.wait(self.check_interval)
+
+    def run(self) -> None:
+        """
+        Run a single retention pass: recompress eligible archives, then prune oldest-first.
+        """
+        with open(os.path.join(self.log_dir, LOCK_FILE_NAME), "w") as lock_file:
+            try:
+                # Other workers run the same pass, one is enough
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            state = self.read_state()
+            if self.compaction_level:
+                self.compact(state)
+            self.prune(state)
+            self.write_state(state)
+
+    def archives(self) -> list[str]:
+        """
+        List rotated logs, oldest first.
+
+        :return: Absolute paths of rotated logs in the month subdirectories
+        """
+        archive_paths = []
+        for pattern in ["*/*.log", "*/*.log.zst"]:
+            archive_paths += glob.glob(os.path.join(self.log_dir, pattern))
+        return sorted(archive_paths, key=os.path.getmtime)
+
+    def compact(self, state: dict) -> None:
+        """
+        Recompress archives older than the compaction age at the compaction level.
+
+        :param state: Retention state, updated with the level each archive was compacted at
+        """
+        compacted = state.setdefault("compacted", {})
+        cutoff = time.time() - self.compaction_age * 86400
+        for archive_path in self.archives():
+            if self._stopped.is_set():
+                return
+            rel_path = os.path.relpath(archive_path, self.log_dir)
+            if (not archive_path.endswith(".zst")
+                    or compacted.get(rel_path, 0) >= self.compaction_level
+                    or os.path.getmtime(archive_path) > cutoff):
+                continue
+            try:
+                self.recompress(archive_path)
+            except Exception:
+                log.exception(f"Failed to recompress '{rel_path}'")
+                continue
+            compacted[rel_path] = self.compaction_level
+            # Persist progress, archives can take minutes each at high levels
+            self.write_state(state)
+
+    def recompress(self, archive_path: str) -> None:
+        """
+        Recompress an archive, keeping its dictionary and the frame boundaries of its index.
+
+        :param archive_path: Path to the compressed log
+        """
+        dictionary_dir = os.path.join(self.log_dir, DICTIONARY_DIR_NAME)
+        with open(archive_path, "rb") as archive_file:
+            dict_id = read_frame_dictionary_id(archive_file)
+        dictionary = load_dictionary(dictionary_dir, dict_id) if dict_id else None
+        if dict_id and not dictionary:
+            raise FileNotFoundError(f"Missing dictionary {dict_id}")
+        index_path = f"{archive_path}{INDEX_SUFFIX}"
+        index_entries = read_index(index_path)
+        boundaries = iter(index_entries)
+        next_boundary = next(boundaries, None)
+        temp_path = f"{archive_path}.tmp"
+        frame_index = None
+        if index_entries:
+            frame_index = LogIndex(f"{temp_path}{INDEX_SUFFIX}", 0, 0)
+            frame_index.reset()
+        stat = os.stat(archive_path)
+        with (ZstdReader(archive_path, dictionary_dir=dictionary_dir) as archive_file,
+              ZstdWriter(temp_path, dictionary=dictionary, level=self.compaction_level,
+                         seekable=bool(index_entries)) as compressed_file):
+            line_num = 0
+            for line in archive_file:
+                if next_boundary and line_num == next_boundary[2]:
+                    frame_index.add_checkpoint(next_boundary[0], compressed_file.new_frame())
+                    next_boundary = next(boundaries, None)
+                if frame_index:
+                    frame_index.advance(len(line))
+                compressed_file.write(line)
+                line_num += 1
+        # Keep the original time so ages stay based on when the log was rotated
+        os.utime(temp_path, (stat.st_atime, stat.st_mtime))
+        if frame_index:
+            frame_index.close()
+            os.replace(f"{temp_path}{INDEX_SUFFIX}", index_path)
+        os.replace(temp_path, archive_path)
+
+    def prune(self, state: dict) -> None:
+        """
+        Remove the oldest archives until within the maximum age and disk budget.
+
+        :param state: Retention state, archives removed are forgotten
+        """
+        compacted = state.setdefault("compacted", {})
+        archive_paths = self.archives()
+        total_size = directory_size(self.log_dir)
+        cutoff = time.time() - self.max_age * 86400
+        for archive_path in archive_paths:
+            expired = self.max_age and os.path.getmtime(archive_path) < cutoff
+            over_budget = self.max_bytes and total_size > self.max_bytes
+            if not expired and not over_budget:
+                break
+            rel_path = os.path.relpath(archive_path, self.log_dir)
+            for path in [archive_path, f"{archive_path}{INDEX_SUFFIX}"]:
+                if os.path.isfile(path):
+                    total_size -= os.path.getsize(path)
+                    os.remove(path)
+            compacted.pop(rel_path, None)
+            log.info(f"Removed '{rel_path}' ({'expired' if expired else 'over size budget'})")
+            month_dir = os.path.dirname(archive_path)
+            if not os.listdir(month_dir):
+                os.rmdir(month_dir)
+        self.prune_dictionaries()
+
+    def prune_dictionaries(self) -> None:
+        """
+        Remove dictionaries no remaining archive was compressed with, always keeping the latest version.
+        """
+        dictionary_dir = os.path.join(self.log_dir, DICTIONARY_DIR_NAME)
+        dictionary_paths = sorted(glob.glob(os.path.join(dictionary_dir, f"*{DICTIONARY_SUFFIX}")),
+                                  key=os.path.getmtime)
+        if len(dictionary_paths) < 2:
+            return
+        used_ids = set()
+        for archive_path in self.archives():
+            if archive_path.endswith(".zst"):
+                with open(archive_path, "rb") as archive_file:
+                    used_ids.add(read_frame_dictionary_id(archive_file))
+        for dictionary_path in dictionary_paths[:-1]:
+            dict_id = int(os.path.basename(dictionary_path).removesuffix(DICTIONARY_SUFFIX))
+            if dict_id not in used_ids:
+                os.remove(dictionary_path)
+
+    def read_state(self) -> dict:
+        """
+        Read the retention state file.
+
+        :return: Retention state
+        """
+        if not os.path.isfile(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def write_state(self, state: dict) -> None:
+        """
+        Write the retention state file.
+
+        :param state: Retention state
+        """
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_path, self.state_path)
+
+
+def directory_size(path: str) -> int:
+    """
+    Get the total size of files in a directory tree.
+
+    :param path: Directory path
+    :return: Size in bytes
+    """
+    total_size = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total_size += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                # Removed during the walk
+                pass
+    return total_size
+
+
+log = getLogger(__name__)
@@ -0,0 +1,151 @@
+from collections import defaultdict
+from datetime import (
+    datetime,
+    timedelta,
+    timezone
+)
+import fcntl
+import json
+import os
+import threading
+from typing import Optional
+
+STATS_DIR_NAME = "stats"
+DEFAULT_FLUSH_INTERVAL = 30
+ERROR_LEVELS = ["ERROR", "CRITICAL"]
+
+
+class LogStatsStore:
+    """
+    Counts log records per minute, level and logger, periodically merging them into per-day sidecar files.
+    """
+    stats_dir = None
+    flush_interval = DEFAULT_FLUSH_INTERVAL
+
+    def __init__(self, stats_dir: str, flush_interval: int = DEFAULT_FLUSH_INTERVAL):
+        self.stats_dir = stats_dir
+        self.flush_interval = flush_interval
+        if not os.path.isdir(stats_dir):
+            os.makedirs(stats_dir)
+        self._pending = defaultdict(int)
+        self._pending_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="LogStatsFlush", daemon=True)
+        self._flush_thread.start()
+
+    def add(self, created: float, level: str, logger_name: str) -> None:
+        """
+        Count a log record.
+
+        :param created: Record creation timestamp
+        :param level: Record level name
+        :param logger_name: Display name of the logger
+        """
+        minute = int(created // 60) * 60
+        with self._pending_lock:
+            self._pending[(minute, level, logger_name)] += 1
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Merge pending counts into the sidecar files.
+        """
+        with self._pending_lock:
+            pending = self._pending
+            self._pending = defaultdict(int)
+        if not pending:
+            return
+        by_day = defaultdict(list)
+        for (minute, level, logger_name), count in pending.items():
+            by_day[stats_day(minute)].append((minute, level, logger_name, count))
+        # Other workers may be flushing to the same files
+        with open(os.path.join(self.stats_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            for day, counts in by_day.items():
+                day_path = os.path.join(self.stats_dir, f"{day}.json")
+                day_stats = read_day_stats(day_path)
+                for minute, level, logger_name, count in counts:
+                    level_stats = day_stats.setdefault(str(minute), {}).setdefault(level, {})
+                    level_stats[logger_name] = level_stats.get(logger_name, 0) + count
+                temp_path = f"{day_path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as day_file:
+                    json.dump(day_stats, day_file, separators=(",", ":"))
+                os.replace(temp_path, day_path)
+
+    def histogram(self, start_time: float, end_time: float, interval: int = 3600,
+                  loggers: Optional[list[str]] = None) -> list[dict]:
+        """
+        Aggregate counts into fixed-size time buckets.
+
+        :param start_time: Start of the range (timestamp)
+        :param end_time: End of the range (timestamp)
+        :param interval: Bucket size in seconds, rounded up to whole minutes
+        :param loggers: Only count records from these loggers
+        :return: List of buckets with counts per level and the error rate
+        """
+        self.flush()
+        interval = max(60, -(-interval // 60) * 60)
+        first_bucket = int(start_time // interval) * interval
+        buckets = defaultdict(lambda: defaultdict(int))
+        day = datetime.fromtimestamp(start_time, timezone.utc).date()
+        last_day = datetime.fromtimestamp(end_time, timezone.utc).date()
+        while day <= last_day:
+            day_stats = read_day_stats(os.path.join(self.stats_dir, f"{day.isoformat()}.json"))
+            for minute, levels in day_stats.items():
+                minute = int(minute)
+                if minute < start_time - 59 or minute > end_time:
+                    continue
+                bucket_time = first_bucket + ((minute - first_bucket) // interval) * interval
+                for level, logger_counts in levels.items():
+                    for logger_name, count in logger_counts.items():
+                        if not loggers or logger_name in loggers:
+                            buckets[bucket_time][level] += count
+            day += timedelta(days=1)
+        histogram = []
+        for bucket_time in sorted(buckets):
+            counts = dict(buckets[bucket_time])
+            total = sum(counts.values())
+            errors = sum(counts.get(level, 0) for level in ERROR_LEVELS)
+            histogram.append({
+                "time": datetime.fromtimestamp(bucket_time, timezone.utc).isoformat(),
+                "counts": counts,
+                "total": total,
+                "error_rate": errors / total if total else 0.0
+            })
+        return histogram
+
+    def close(self) -> None:
+        """
+        Stop the flush thread and write any pending counts.
+        """
+        self._stopped.set()
+        self.flush()
+
+
+def stats_day(timestamp: float) -> str:
+    """
+    Get the UTC day a timestamp's counts are stored under.
+
+    :param timestamp: Record timestamp
+    :return: Day as %Y-%m-%d
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d")
+
+
+def read_day_stats(day_path: str) -> dict:
+    """
+    Read a day of counts from its sidecar file.
+
+    :param day_path: Path to the day's stats file
+    :return: Mapping of minute -> level -> logger -> count
+    """
+    if not os.path.isfile(day_path):
+        return {}
+    try:
+        with open(day_path, "r", encoding="utf-8") as day_file:
+            return json.load(day_file)
+    except (OSError, json.JSONDecodeError):
+        return {}
@@ -0,0 +1,164 @@
+import asyncio
+import ctypes
+import ctypes.util
+import json
+from logging import getLogger
+import os
+from typing import (
+    AsyncIterator,
+    Optional
+)
+
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+DEFAULT_POLL_INTERVAL = 1.0
+KEEPALIVE_INTERVAL = 15.0
+
+
+class LogWatcher:
+    """
+    Waits for changes in a log directory, using inotify when available and polling otherwise.
+    """
+    watch_dir = None
+    poll_interval = DEFAULT_POLL_INTERVAL
+
+    def __init__(self, watch_dir: str, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.watch_dir = watch_dir
+        self.poll_interval = poll_interval
+        self._inotify_fd = None
+        self._changed = asyncio.Event()
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            inotify_fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if inotify_fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            if libc.inotify_add_watch(inotify_fd, os.fsencode(watch_dir), WATCH_MASK) < 0:
+                os.close(inotify_fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            asyncio.get_running_loop().add_reader(inotify_fd, self._on_event)
+            self._inotify_fd = inotify_fd
+        except Exception:
+            log.debug(f"inotify unavailable for '{watch_dir}', falling back to polling")
+
+    def _on_event(self) -> None:
+        try:
+            while os.read(self._inotify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._changed.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until the directory changes, or at most one poll interval.
+
+        :param timeout: Longest time to wait, defaults to the poll interval
+        """
+        if timeout is None:
+            timeout = self.poll_interval
+        if self._inotify_fd is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
+
+    def close(self) -> None:
+        """
+        Stop watching the directory.
+        """
+        if self._inotify_fd is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+
+async def follow_log(log_path: str, poll_interval: float = DEFAULT_POLL_INTERVAL) -> AsyncIterator[Optional[str]]:
+    """
+    Follow new lines appended to a log, reopening it when it is rotated.
+
+    :param log_path: Path to the active log file
+    :param poll_interval: Seconds between checks when inotify is unavailable
+    :return: Stream of new lines, with None yielded while idle
+    """
+    watcher = LogWatcher(os.path.dirname(log_path), poll_interval)
+    log_file = open(log_path, "r", encoding="utf-8")
+    log_file.seek(0, os.SEEK_END)
+    log_inode = os.fstat(log_file.fileno()).st_ino
+    buffer = ""
+    try:
+        while True:
+            chunk = log_file.read()
+            if chunk:
+                buffer += chunk
+                lines = buffer.split("\n")
+                buffer = lines.pop()
+                for line in lines:
+                    yield line
+                continue
+            try:
+                log_stat = os.stat(log_path)
+            except FileNotFoundError:
+                log_stat = None
+            if log_stat and (log_stat.st_ino != log_inode or log_stat.st_size < log_file.tell()):
+                # Log was rotated, finish the old file and continue from the start of the new one
+                lines = (buffer + log_file.read()).split("\n")
+                log_file.close()
+                log_file = open(log_path, "r", encoding="utf-8")
+                log_inode = os.fstat(log_file.fileno()).st_ino
+                buffer = ""
+                # The old file won't be written to again, so its last line is complete even without a newline
+                if not lines[-1]:
+                    lines.pop()
+                for line in lines:
+                    yield line
+                continue
+            yield None
+            await watcher.wait()
+    finally:
+        log_file.close()
+        watcher.close()
+
+
+async def tail_log_events(log_path: str, levels: Optional[list[str]] = None,
+                          components: Optional[list[str]] = None) -> AsyncIterator[str]:
+    """
+    Stream new log records as Server-Sent Events.
+
+    :param log_path: Path to the active log file
+    :param levels: Only include records with these level names
+    :param components: Only include records from these components
+    :return: Stream of SSE messages
+    """
+    loop = asyncio.get_running_loop()
+    last_sent = loop.time()
+    async for line in follow_log(log_path):
+        if line is None:
+            if loop.time() - last_sent >= KEEPALIVE_INTERVAL:
+                last_sent = loop.time()
+                yield ": keepalive\n\n"
+            continue
+        if not line.strip():
+            continue
+        if levels or components:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if levels and record.get("levelname") not in levels:
+                continue
+            if components and record.get("name") not in components:
+                continue
+        last_sent = loop.time()
+        yield f"data: {line}\n\n"
+
+
+log = getLogger(__name__)
@@ -5,6 +5,10 @@ from colorama import (
     Style as text_style
 )
 from datetime import datetime
+from functools import (
+    cache,
+    lru_cache
+)
 import glob
 import json
 import logging
@@ -12,7 +16,8 @@ from logging import LogRecord
 import logging.config
 from logging.handlers import TimedRotatingFileHandler
 import os
-from sqlalchemy import select
+import threading
+import time
 import traceback
 from typing import (
     Iterator,
@@ -20,20 +25,72 @@ from typing import (
     Tuple,
     Type
 )
+from zstandard import (
+    ZstdCompressionDict,
+    ZstdError
+)
 
-from mediamirror.models.settings import Setting
-from mediamirror.services.compression import ZstdWriter
-from mediamirror.services.database_manager import get_db_session
+from mediamirror.services.compression import (
+    DICTIONARY_DIR_NAME,
+    latest_dictionary,
+    train_dictionary,
+    ZstdReader,
+    ZstdWriter
+)
+from mediamirror.services.common import env_dict
+from mediamirror.services.log_database import (
+    DatabaseLogHandler,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL as DEFAULT_DATABASE_FLUSH_INTERVAL,
+    DEFAULT_RETENTION_DAYS
+)
+from mediamirror.services.log_filters import (
+    BurstFilter,
+    DEFAULT_BURST_THRESHOLD,
+    DEFAULT_BURST_WINDOW
+)
+from mediamirror.services.log_index import (
+    DEFAULT_INTERVAL_BYTES,
+    DEFAULT_INTERVAL_LINES,
+    INDEX_SUFFIX,
+    line_timestamp,
+    LogIndex,
+    read_index,
+    seek_line,
+    seek_time
+)
+from mediamirror.services.log_lines import (
+    LineFilter,
+    LineOffsetCache,
+    window_bounds
+)
+from mediamirror.services.log_retention import (
+    DEFAULT_CHECK_INTERVAL,
+    DEFAULT_COMPACTION_AGE,
+    LogRetentionManager
+)
+from mediamirror.services.log_stats import (
+    DEFAULT_FLUSH_INTERVAL,
+    LogStatsStore,
+    STATS_DIR_NAME
+)
+import mediamirror.services.settings as settings
 
 LOGLINE_FORMAT = "[%(asctime)s] (%(levelname)s) %(name)s: %(message)s"
+DICTIONARY_SAMPLE_SUFFIX = ".sample"
 
 
 class LogManagerInitException(Exception):
     pass
 
 
+class InvalidLoggerException(Exception):
+    pass
+
+
 class JsonLogFormatter(logging.Formatter):
     root_path = None
+    encoder = json.JSONEncoder(default=str, check_circular=False)
 
     def __init__(self, root_path):
         super().__init__()
@@ -46,23 +103,45 @@ class JsonLogFormatter(logging.Formatter):
         :param record: Log record
         :return: Formatted log record
         """
-        record.name = app_namer(record.name)
-        record.message = record.getMessage()
-        record.asctime = self.formatTime(record, self.datefmt)
-        if record.pathname:
+        return self.encoder.encode(self.record_fields(record))
+
+    def record_fields(self, record: LogRecord) -> dict:
+        """
+        Get the fields written for a log record.
+
+        :param record: Log record
+        :return: Field values by name
+        """
+        pathname = record.pathname
+        if pathname:
             # Hide install path in logs
             if self.root_path:
-                record.pathname = record.pathname.replace(self.root_path, ".", 1)
+                pathname = pathname.replace(self.root_path, ".", 1)
             else:
-                record.pathname = os.path.basename(record.pathname)
-        if record.exc_info:
-            if not record.exc_text:
-                record.exc_text = self.formatException(record.exc_info)
-        record_dict = record.__dict__
-        # Remove unused values
-        for key in ["msg", "args", "filename"]:
-            _ = record_dict.pop(key)
-        return json.dumps(record_dict, default=str)
+                pathname = os.path.basename(pathname)
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = self.formatException(record.exc_info)
+        return {
+            "name": app_namer(record.name),
+            "levelname": record.levelname,
+            "levelno": record.levelno,
+            "pathname": pathname,
+            "module": record.module,
+            "lineno": record.lineno,
+            "funcName": record.funcName,
+            "created": record.created,
+            "msecs": record.msecs,
+            "relativeCreated": record.relativeCreated,
+            "thread": record.thread,
+            "threadName": record.threadName,
+            "processName": record.processName,
+            "process": record.process,
+            "message": record.getMessage(),
+            "asctime": format_asctime(record),
+            "exc_text": exc_text,
+            "stack_info": record.stack_info
+        }
 
 
 class ConsoleLogFormatter(logging.Formatter):
@@ -83,6 +162,12 @@ class ConsoleLogFormatter(logging.Formatter):
         except OSError:
             pass
         super().__init__()
+        separator = "─" * self.console_width
+        self.line_formats = {
+            levelno: f"{color}{LOGLINE_FORMAT}{text_style.RESET_ALL}\n{separator}"
+            for levelno, color in self.FORMATS.items()
+        }
+        self.default_line_format = f"{LOGLINE_FORMAT}\n{separator}"
 
     def formatException(self, exc_info: Optional[Tuple[Type[BaseException], BaseException, Optional[object]]]) -> str:
         """
@@ -102,26 +187,60 @@ class ConsoleLogFormatter(logging.Formatter):
         :param record: Log record
         :return: Formatted log record
         """
-        record.name = app_namer(record.name)
-        color = self.FORMATS.get(record.levelno)
+        message = record.getMessage()
         # Add exception info if it exists
         if record.exc_info:
-            record.msg = f"{record.msg}\n\n{self.formatException(record.exc_info)}"
-            record.exc_info = None
+            message = f"{message}\n\n{self.formatException(record.exc_info)}"
         # Hide install path in logs
-        record.msg = str(record.msg).replace(f"{self.root_path}", ".")
-        return logging.Formatter(f"{color}{LOGLINE_FORMAT}{text_style.RESET_ALL}\n" +
-                                 "─" * self.console_width).format(record)
+        if self.root_path:
+            message = message.replace(self.root_path, ".")
+        return self.line_formats.get(record.levelno, self.default_line_format) % {
+            "asctime": format_asctime(record),
+            "levelname": record.levelname,
+            "name": app_namer(record.name),
+            "message": message
+        }
 
 
 class ConfiguredLogRotator(TimedRotatingFileHandler):
     use_compression = False
+    compression_frame_size = 0
+    use_dictionary = False
+    dictionary_max_age = 7
+    log_index = None
+    _dictionary_thread = None
 
     def __init__(self, filename: str, when: int, interval: int, backupCount: int,
                  encoding: Optional[str] = None, delay: bool = False,
-                 utc: bool = False, use_compression: bool = False):
+                 utc: bool = False, use_compression: bool = False,
+                 index_interval_lines: int = DEFAULT_INTERVAL_LINES,
+                 index_interval_bytes: int = DEFAULT_INTERVAL_BYTES,
+                 compression_frame_size: int = 0, use_dictionary: bool = False,
+                 dictionary_max_age: int = 7):
         self.use_compression = use_compression
+        self.compression_frame_size = compression_frame_size
+        self.use_dictionary = use_dictionary
+        self.dictionary_max_age = dictionary_max_age
         super().__init__(filename, when, interval, backupCount, encoding, delay, utc)
+        if index_interval_lines or index_interval_bytes:
+            self.log_index = LogIndex(f"{self.baseFilename}{INDEX_SUFFIX}",
+                                      index_interval_lines, index_interval_bytes)
+            self.log_index.resume(self.baseFilename)
+
+    def format(self, record: LogRecord) -> str:
+        """
+        Format log record and update the sparse index for the line about to be written.
+
+        :param record: Log record
+        :return: Formatted log record
+        """
+        msg = super().format(record)
+        if self.log_index:
+            if self.log_index.checkpoint_due():
+                offset = self.stream.tell() if self.stream else os.path.getsize(self.baseFilename)
+                self.log_index.add_checkpoint(record.created, offset)
+            self.log_index.advance(len(msg.encode("utf-8")) + len(self.terminator))
+        return msg
 
     def namer(self, default_name: str) -> str:
         """
@@ -146,10 +265,76 @@ class ConfiguredLogRotator(TimedRotatingFileHandler):
         """
         if self.use_compression:
             if os.path.isfile(source):
-                with open(source, "r") as log_file, ZstdWriter(f"{dest}.zst") as compressed_file:
-                    compressed_file.write(log_file.read())
+                compressed_dest = f"{dest}.zst"
+                frame_index = None
+                if self.compression_frame_size:
+                    # Index the start of each independent frame
+                    frame_index = LogIndex(f"{compressed_dest}{INDEX_SUFFIX}", 0, 0)
+                    frame_index.reset()
+                dictionary, training_due = self.compression_dictionary()
+                with (open(source, "rb") as log_file,
+                      ZstdWriter(compressed_dest, self.compression_frame_size, dictionary) as compressed_file):
+                    for line in log_file:
+                        if frame_index:
+                            if frame_index.line_count == 0 or compressed_file.frame_full():
+                                frame_index.add_checkpoint(line_timestamp(line), compressed_file.new_frame())
+                            frame_index.advance(len(line))
+                        compressed_file.write(line)
+                if frame_index:
+                    frame_index.close()
+                if training_due:
+                    self.train_dictionary_later(source)
+                else:
+                    os.remove(source)
+            if self.log_index:
+                # Offsets into the uncompressed log don't apply to the compressed file
+                self.log_index.finalize()
         else:
             super().rotate(source, dest)
+            if self.log_index:
+                self.log_index.finalize(dest)
+
+    @property
+    def dictionary_dir(self) -> str:
+        return os.path.join(os.path.dirname(self.baseFilename), DICTIONARY_DIR_NAME)
+
+    def compression_dictionary(self) -> Tuple[Optional[ZstdCompressionDict], bool]:
+        """
+        Get the dictionary to compress with.
+
+        :return: Current dictionary, or None if dictionaries aren't used or none has been trained yet, and
+                 whether a new version should be trained from the rotated log
+        """
+        if not self.use_dictionary:
+            return None, False
+        dictionary, trained_at = latest_dictionary(self.dictionary_dir)
+        if self._dictionary_thread and self._dictionary_thread.is_alive():
+            return dictionary, False
+        return dictionary, not dictionary or time.time() - trained_at > self.dictionary_max_age * 86400
+
+    def train_dictionary_later(self, sample_path: str) -> None:
+        """
+        Train a new dictionary version from a rotated log in a background thread, so rollover doesn't wait for
+        it. Logs rotated until it is ready keep using the previous version.
+
+        :param sample_path: Path to the uncompressed rotated log, which is removed once training finishes
+        """
+        os.makedirs(self.dictionary_dir, exist_ok=True)
+        training_path = os.path.join(self.dictionary_dir, f"{time.time_ns()}{DICTIONARY_SAMPLE_SUFFIX}")
+        # The active log is reopened at the same path once rotation finishes
+        os.replace(sample_path, training_path)
+        self._dictionary_thread = threading.Thread(target=self._train_dictionary, args=(training_path,),
+                                                   name="LogDictionaryTraining", daemon=True)
+        self._dictionary_thread.start()
+
+    def _train_dictionary(self, training_path: str) -> None:
+        try:
+            train_dictionary(training_path, self.dictionary_dir)
+        except ZstdError:
+            # Not enough samples, keep using the previous version
+            pass
+        finally:
+            os.remove(training_path)
 
     def doRollover(self) -> None:
         """
@@ -159,8 +344,47 @@ class ConfiguredLogRotator(TimedRotatingFileHandler):
         if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir)
         super().doRollover()
+        if self.log_index:
+            self.log_index.reset()
+
+    def close(self) -> None:
+        """
+        Close the log file and its sparse index, waiting for dictionary training to finish.
+        """
+        if self.log_index:
+            self.log_index.close()
+        if self._dictionary_thread:
+            self._dictionary_thread.join()
+        super().close()
+
 
+class LogStatsHandler(logging.Handler):
+    stats_store = None
 
+    def __init__(self, stats_store: LogStatsStore):
+        super().__init__()
+        self.stats_store = stats_store
+
+    def emit(self, record: LogRecord) -> None:
+        """
+        Count log record in the statistics rollup.
+
+        :param record: Log record
+        """
+        if getattr(record, "burst_summary", False):
+            # The records it summarizes were already counted
+            return
+        self.stats_store.add(record.created, record.levelname, app_namer(record.name))
+
+    def close(self) -> None:
+        """
+        Write pending counts before closing.
+        """
+        self.stats_store.close()
+        super().close()
+
+
+@cache
 def app_namer(app_name: str) -> str:
     """
     Converts package.module_name to Module Name for log files.
@@ -171,12 +395,25 @@ def app_namer(app_name: str) -> str:
     return " ".join(part[:1].upper() + part[1:] for part in app_name.split(".")[-1].split("_"))
 
 
-async def log_subprocess_output(log, pipe, level=logging.DEBUG):
-    while True:
-        line = await pipe.readline()
-        if not line:
-            break
-        log.log(level, line.decode())
+@lru_cache(maxsize=4)
+def format_second(seconds: int) -> str:
+    """
+    Format the whole-second part of a log timestamp, cached since records arrive in bursts.
+
+    :param seconds: Timestamp in whole seconds
+    :return: Local time formatted with the default logging time format
+    """
+    return time.strftime(logging.Formatter.default_time_format, logging.Formatter.converter(seconds))
+
+
+def format_asctime(record: LogRecord) -> str:
+    """
+    Format a record's creation time the same way as logging.Formatter.formatTime without a datefmt.
+
+    :param record: Log record
+    :return: Formatted creation time
+    """
+    return logging.Formatter.default_msec_format % (format_second(int(record.created)), record.msecs)
 
 
 class AppLogManager:
@@ -184,10 +421,15 @@ class AppLogManager:
     log_name = None
     log_dir = None
     dict_config = {}
+    stats_store = None
+    retention_manager = None
+    burst_filter = None
+    database_handler = None
 
     def __init__(self, app, log_config, log_name):
         if not app:
             return
+        self.line_cache = LineOffsetCache()
         self.log_name = log_name
         self.root_path = app.root_path
         self.set_log_dir(log_config.get("DIR", "logs"))
@@ -239,9 +481,17 @@ class AppLogManager:
                 "interval": 1,
                 "backupCount": int(log_config.get("BACKUP_COUNT", 0)),
                 "use_compression": compression_flag or log_config.get("USE_COMPRESSION", "false") == "true",
+                "index_interval_lines": int(log_config.get("INDEX_INTERVAL_LINES", DEFAULT_INTERVAL_LINES)),
+                "index_interval_bytes": int(log_config.get("INDEX_INTERVAL_BYTES", DEFAULT_INTERVAL_BYTES)),
+                "compression_frame_size": int(log_config.get("COMPRESSION_FRAME_MIB", 0)) * 1048576,
+                "use_dictionary": log_config.get("COMPRESSION_DICTIONARY", "false") == "true",
+                "dictionary_max_age": int(log_config.get("COMPRESSION_DICTIONARY_MAX_AGE", 7)),
                 "formatter": "json_format"
             }
         }
+        if log_config.get("AGGREGATE", "false") == "true":
+            # Workers send records to a single writer process instead of each rotating the same file
+            self.dict_config["handlers"]["file"]["class"] = "mediamirror.services.log_aggregation.AggregatingLogHandler"
 
         if "app" in self.dict_config["loggers"]:
             self.dict_config["loggers"][app.name] = self.dict_config["loggers"].pop("app")
@@ -254,75 +504,149 @@ class AppLogManager:
         logging.config.dictConfig(self.dict_config)
         app.logger = logging.getLogger(app.name)
 
+        self.dict_config.setdefault("burst_filter", {
+            "window": DEFAULT_BURST_WINDOW,
+            "threshold": DEFAULT_BURST_THRESHOLD,
+            "debug_sample_rates": {}
+        })
+        self.burst_filter = BurstFilter.from_config(self.dict_config["burst_filter"])
+        if settings.settings_service:
+            settings.settings_service.subscribe("logging", self.apply_logging_settings)
+
+        # Count everything written to the log file, kept out of the stored configuration
+        self.stats_store = LogStatsStore(os.path.join(self.log_dir, STATS_DIR_NAME),
+                                         int(log_config.get("STATS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)))
+        stats_handler = LogStatsHandler(self.stats_store)
+        if log_config.get("DATABASE", "false") == "true":
+            # Same records as the log file, queryable with indexed SQL
+            self.database_handler = DatabaseLogHandler(
+                env_dict("DATABASE"),
+                retention_days=int(log_config.get("DATABASE_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)),
+                batch_size=int(log_config.get("DATABASE_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+                flush_interval=float(log_config.get("DATABASE_FLUSH_INTERVAL", DEFAULT_DATABASE_FLUSH_INTERVAL))
+            )
+            self.database_handler.setLevel(logging.DEBUG)
+            self.database_handler.setFormatter(JsonLogFormatter(self.root_path))
+        for module, logger_config in self.dict_config["loggers"].items():
+            if isinstance(logger_config, dict) and "file" in logger_config.get("handlers", []):
+                logging.getLogger(module).addHandler(stats_handler)
+                if self.database_handler:
+                    logging.getLogger(module).addHandler(self.database_handler)
+        # Collapse repeated records in every handler, which also sees records from child loggers. Stats
+        # still count every record, so error rates include the bursts that were collapsed.
+        for handler in {handler for module in self.dict_config["loggers"]
+                        for handler in logging.getLogger(module).handlers}:
+            if handler is not stats_handler:
+                handler.addFilter(self.burst_filter)
+
+        self.retention_manager = LogRetentionManager(
+            self.log_dir,
+            max_bytes=int(log_config.get("MAX_TOTAL_MIB", 0)) * 1048576,
+            max_age=int(log_config.get("MAX_AGE_DAYS", 0)),
+            compaction_level=int(log_config.get("COMPACTION_LEVEL", 0)),
+            compaction_age=int(log_config.get("COMPACTION_AGE_DAYS", DEFAULT_COMPACTION_AGE)),
+            check_interval=int(log_config.get("RETENTION_INTERVAL", DEFAULT_CHECK_INTERVAL))
+        )
+        self.retention_manager.start()
+
     async def fetch_logging_config_from_db(self) -> Tuple[Optional[dict], bool]:
         """
-        Fetch logging configuration from the database using the Setting model.
+        Build logging configuration from the cached logging settings.
 
         :return: Logging configuration dictionary or None if unavailable, compression flag
         """
         compression_flag = False
-        async with get_db_session() as db_session:
-            try:
-                query_result = (await db_session.execute(select(Setting).filter_by(component="logging"))).all()
-                if query_result:
-                    config_dict = {
-                        "version": 1,
-                        "disable_existing_loggers": True,
-                        "loggers": {}
-                    }
-                    for setting in query_result:
-                        if setting.key == "use_compression":
-                            compression_flag = setting.value.lower() == "true"
-                        if setting.key.startswith("loggers."):
-                            setting.key = setting.key.replace("loggers.", "", 1)
-                            try:
-                                setting_value = json.loads(setting.value)
-                            except json.JSONDecodeError:
-                                setting_value = setting.value
-                            config_dict["loggers"][setting.key] = setting_value
-                    return config_dict, compression_flag
-            except Exception:
-                return None, compression_flag
-        return None, compression_flag
+        logging_settings = settings.settings_service.get_component("logging") if settings.settings_service else {}
+        if not logging_settings:
+            return None, compression_flag
+        config_dict = {
+            "version": 1,
+            "disable_existing_loggers": True,
+            "loggers": {}
+        }
+        for key, value in logging_settings.items():
+            if key == "use_compression":
+                compression_flag = value.lower() == "true"
+            elif key == "burst_filter":
+                try:
+                    config_dict["burst_filter"] = json.loads(value)
+                except json.JSONDecodeError:
+                    pass
+            elif key.startswith("loggers."):
+                try:
+                    setting_value = json.loads(value)
+                except json.JSONDecodeError:
+                    setting_value = value
+                config_dict["loggers"][key.replace("loggers.", "", 1)] = setting_value
+        return config_dict, compression_flag
 
     async def save_logging_config_to_db(self) -> None:
         """
-        Save logger configurations to the database.
+        Save logger configurations to the database, only writing settings that changed.
 
-        :param logging_config: Logging configuration dictionary
+        :raises LogManagerInitException: If the settings could not be saved
         """
-        async with get_db_session() as db_session:
-            try:
-                for key, value in self.dict_config["loggers"].items():
-                    full_key = f"loggers.{key}"
-                    value_string = json.dumps(value) if isinstance(value, dict) else str(value)
-                    setting = (await db_session.scalars(select(Setting).filter_by(
-                        component="logging", key=full_key))).first()
-                    if setting:
-                        setting.value = value_string
-                    else:
-                        new_setting = Setting(
-                            component="logging",
-                            key=full_key,
-                            value=value_string
-                        )
-                        db_session.add(new_setting)
-                current_compression = str(self.dict_config["handlers"]["file"].get("use_compression", False))
-                compression_setting = (await db_session.scalars(select(Setting).filter_by(
-                    component="logging", key="use_compression"))).first()
-                if compression_setting:
-                    compression_setting.value = current_compression
-                else:
-                    new_compression_setting = Setting(
-                        component="logging",
-                        key="use_compression",
-                        value=current_compression
-                    )
-                    db_session.add(new_compression_setting)
-                await db_session.commit()
-            except Exception as e:
-                await db_session.rollback()
-                raise LogManagerInitException("Failed to save logging configuration to the database.", e)
+        values = {
+            f"loggers.{key}": json.dumps(value) if isinstance(value, dict) else str(value)
+            for key, value in self.dict_config["loggers"].items()
+        }
+        values["use_compression"] = str(self.dict_config["handlers"]["file"].get("use_compression", False))
+        if "burst_filter" in self.dict_config:
+            values["burst_filter"] = json.dumps(self.dict_config["burst_filter"])
+        try:
+            await settings.settings_service.set_many("logging", values)
+        except Exception as e:
+            raise LogManagerInitException("Failed to save logging configuration to the database.", e)
+
+    def apply_logging_settings(self, changed: dict[str, Optional[str]]) -> None:
+        """
+        Apply logging settings changed while running, such as by another worker.
+
+        :param changed: Mapping of changed setting keys to their new value
+        """
+        for key, value in changed.items():
+            if value is None:
+                continue
+            if key.startswith("loggers."):
+                module = key.replace("loggers.", "", 1)
+                try:
+                    logger_config = json.loads(value)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(logger_config, dict):
+                    continue
+                self.dict_config["loggers"][module] = logger_config
+                if "level" in logger_config:
+                    logging.getLogger(module).setLevel(logger_config["level"])
+                    log.info(f"Log level for '{module}' set to {logger_config['level']}")
+            elif key == "burst_filter" and self.burst_filter:
+                try:
+                    burst_config = json.loads(value)
+                except json.JSONDecodeError:
+                    continue
+                self.dict_config["burst_filter"] = burst_config
+                updated_filter = BurstFilter.from_config(burst_config)
+                self.burst_filter.window = updated_filter.window
+                self.burst_filter.threshold = updated_filter.threshold
+                self.burst_filter.debug_sample_rates = updated_filter.debug_sample_rates
+
+    async def set_logger_levels(self, levels: dict[str, str]) -> None:
+        """
+        Change logger levels in every worker without restarting.
+
+        :param levels: Mapping of logger name to level name
+        :raises InvalidLoggerException: If a logger isn't configured or a level doesn't exist
+        """
+        values = {}
+        for module, level in levels.items():
+            logger_config = self.dict_config["loggers"].get(module)
+            if not isinstance(logger_config, dict):
+                raise InvalidLoggerException(f"Logger '{module}' is not configured")
+            level = str(level).upper()
+            if not isinstance(logging.getLevelName(level), int):
+                raise InvalidLoggerException(f"Level '{level}' does not exist")
+            values[f"loggers.{module}"] = json.dumps({**logger_config, "level": level})
+        await settings.settings_service.set_many("logging", values)
 
     def set_log_dir(self, new_log_dir: str) -> None:
         """
@@ -356,7 +680,7 @@ class AppLogManager:
             all_log_files = []
             patterns = [
                 os.path.join(self.log_dir, "**/*.log"),
-                os.path.join(self.log_dir, "**/*.log.zstd")
+                os.path.join(self.log_dir, "**/*.log.zst")
             ]
 
             for pattern in patterns:
@@ -404,11 +728,16 @@ class AppLogManager:
                 log_files_info = sort_dict_recursively(log_files_info)
         return log_files_info
 
-    def read_log(self, rel_log_path: str) -> Iterator[str]:
+    def read_log(self, rel_log_path: str, start_time: Optional[float] = None, end_time: Optional[float] = None,
+                 start_line: Optional[int] = None, end_line: Optional[int] = None) -> Iterator[str]:
         """
         Streams lines from a log in the log folder.
 
         :param rel_log_path: Relative path to the log file in the log folder
+        :param start_time: Only include records created at or after this timestamp
+        :param end_time: Only include records created at or before this timestamp
+        :param start_line: First line number to include (zero-based)
+        :param end_line: Stop before this line number
         :return: Log file stream
         """
         abs_log_path = os.path.abspath(os.path.join(self.log_dir, rel_log_path))
@@ -416,15 +745,72 @@ class AppLogManager:
                 or not os.path.exists(abs_log_path)
                 or not os.path.isfile(abs_log_path)):
             yield "Bad file path.\n"
+            return
         try:
             _, log_ext = os.path.splitext(abs_log_path)
-            if log_ext == ".log":
-                with open(abs_log_path, "r", encoding="utf-8") as log_file:
+            if log_ext in [".log", ".zst"]:
+                offset, line_num = 0, 0
+                if start_line is not None or start_time is not None:
+                    # Offsets for compressed logs are the starts of independent frames
+                    index_entries = read_index(f"{abs_log_path}{INDEX_SUFFIX}")
+                    if index_entries:
+                        if start_line is not None:
+                            offset, line_num = seek_line(index_entries, start_line)
+                        else:
+                            offset, line_num = seek_time(index_entries, start_time)
+                if log_ext == ".zst":
+                    log_stream = ZstdReader(abs_log_path, offset, os.path.join(self.log_dir, DICTIONARY_DIR_NAME))
+                else:
+                    log_stream = open(abs_log_path, "r", encoding="utf-8")
+                    log_stream.seek(offset)
+                with log_stream as log_file:
                     for line in log_file:
+                        if end_line is not None and line_num >= end_line:
+                            break
+                        line_num += 1
+                        if start_line is not None and line_num <= start_line:
+                            continue
+                        if start_time is not None or end_time is not None:
+                            created = line_timestamp(line)
+                            if start_time is not None and created < start_time:
+                                continue
+                            if end_time is not None and created > end_time:
+                                break
                         yield line
         except Exception:
             yield "Encountered an error while reading log file.\n"
 
+    def read_log_window(self, abs_log_path: str, start: int, end: Optional[int] = None,
+                        line_filter: Optional[LineFilter] = None) -> Tuple[list[str], int]:
+        """
+        Read a window of lines from a log, using cached line offsets.
+
+        With a filter, line numbers count only the matching lines.
+
+        :param abs_log_path: Absolute path to the log file in the log folder
+        :param start: First line to include (zero-based)
+        :param end: Stop before this line, at most `MAX_WINDOW_LINES` after the start
+        :param line_filter: Only include lines matching this filter
+        :return: Lines in the window, total number of lines
+        """
+        dictionary_dir = os.path.join(self.log_dir, DICTIONARY_DIR_NAME)
+        if line_filter and line_filter.active:
+            line_nums = self.line_cache.matching_lines(abs_log_path, line_filter, dictionary_dir)
+        else:
+            line_nums = range(self.line_cache.line_count(abs_log_path, dictionary_dir))
+        total = len(line_nums)
+        start, end = window_bounds(start, end, total)
+        window_line_nums = line_nums[start:end]
+        if not len(window_line_nums):
+            return [], total
+        if not abs_log_path.endswith(".zst"):
+            return self.line_cache.read_lines(abs_log_path, window_line_nums), total
+        # Compressed logs are read from the nearest indexed frame
+        wanted = set(window_line_nums)
+        lines = self.read_log(abs_log_path, start_line=window_line_nums[0], end_line=window_line_nums[-1] + 1)
+        return [line for line_num, line in enumerate(lines, window_line_nums[0]) if line_num in wanted], total
+
 
 colorama_init()
 app_log_manager = None
+log = logging.getLogger(__name__)
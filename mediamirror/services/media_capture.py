@@ -0,0 +1,265 @@
+import asyncio
+from collections import OrderedDict
+from logging import getLogger
+from nodriver import cdp
+import os
+import time
+from typing import Optional
+
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_MIN_IMAGE_BYTES = 20480
+DEFAULT_MIN_VIDEO_BYTES = 0
+DEFAULT_MIN_AUDIO_BYTES = 0
+# Responses waiting for their body to finish loading
+MAX_PENDING_RESPONSES = 1000
+# URLs remembered so repeated range requests for the same file are only reported once
+MAX_SEEN_URLS = 10000
+STREAM_MIME_TYPES = {
+    "application/dash+xml",
+    "application/vnd.apple.mpegurl",
+    "application/x-mpegurl",
+    "audio/mpegurl",
+    "audio/x-mpegurl"
+}
+MEDIA_KIND_PREFIXES = {
+    "image/": "image",
+    "video/": "video",
+    "audio/": "audio"
+}
+
+
+class MediaResponse:
+    """
+    A media response seen by a browser.
+    """
+    __slots__ = ["url", "kind", "mime_type", "size", "status", "headers", "cookies", "page_url", "captured"]
+
+    def __init__(self, url: str, kind: str, mime_type: str, size: int, status: int, headers: dict, page_url: str):
+        self.url = url
+        self.kind = kind
+        self.mime_type = mime_type
+        self.size = size
+        self.status = status
+        self.headers = headers
+        self.cookies = []
+        self.page_url = page_url
+        self.captured = time.time()
+
+    def to_dict(self) -> dict:
+        """
+        Describe the response.
+
+        :return: Response details
+        """
+        return {
+            "url": self.url,
+            "kind": self.kind,
+            "mime_type": self.mime_type,
+            "size": self.size,
+            "status": self.status,
+            "headers": self.headers,
+            "cookies": self.cookies,
+            "page_url": self.page_url,
+            "captured": self.captured
+        }
+
+
+class MediaCapture:
+    """
+    Collects media responses from a browser's network events into a bounded queue.
+
+    Responses are classified by MIME type when received and reported once their body finishes loading
+    and their size is known, with the cookies the browser would send for them. When the queue is full,
+    new responses are dropped instead of slowing the browser down.
+    """
+    min_sizes = {}
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, min_image_bytes: int = DEFAULT_MIN_IMAGE_BYTES,
+                 min_video_bytes: int = DEFAULT_MIN_VIDEO_BYTES, min_audio_bytes: int = DEFAULT_MIN_AUDIO_BYTES):
+        """
+        :param queue_size: Most responses waiting to be read
+        :param min_image_bytes: Smallest image reported, to skip icons and tracking pixels
+        :param min_video_bytes: Smallest video reported
+        :param min_audio_bytes: Smallest audio reported
+        """
+        self.min_sizes = {
+            "image": min_image_bytes,
+            "video": min_video_bytes,
+            "audio": min_audio_bytes,
+            "stream": 0
+        }
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self._pending = OrderedDict()
+        self._seen_urls = OrderedDict()
+        self._tabs = []
+        self._tasks = set()
+
+    async def attach(self, tab) -> None:
+        """
+        Start capturing a tab's responses.
+
+        :param tab: nodriver Tab
+        """
+        if tab in self._tabs:
+            return
+        self._tabs.append(tab)
+        tab.add_handler(cdp.network.ResponseReceived, self._on_response)
+        tab.add_handler(cdp.network.LoadingFinished, self._on_finished)
+        tab.add_handler(cdp.network.LoadingFailed, self._on_failed)
+        await tab.send(cdp.network.enable())
+
+    def detach(self, tab) -> None:
+        """
+        Stop capturing a tab's responses.
+
+        :param tab: nodriver Tab
+        """
+        if tab not in self._tabs:
+            return
+        self._tabs.remove(tab)
+        for event_type, handler in [(cdp.network.ResponseReceived, self._on_response),
+                                    (cdp.network.LoadingFinished, self._on_finished),
+                                    (cdp.network.LoadingFailed, self._on_failed)]:
+            handlers = tab.handlers.get(event_type, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def detach_all(self) -> None:
+        """
+        Stop capturing every tab's responses.
+        """
+        for tab in list(self._tabs):
+            self.detach(tab)
+
+    # Handlers run in nodriver's message loop, so anything awaiting the browser runs in a task
+    def _on_response(self, event: cdp.network.ResponseReceived, tab=None) -> None:
+        response = event.response
+        kind = media_kind(response.mime_type)
+        if not kind or response.url.startswith(("data:", "blob:")) or response.status >= 400:
+            return
+        headers = dict(response.headers)
+        page_url = tab.target.url if tab is not None and getattr(tab, "target", None) else None
+        self._pending[event.request_id] = (
+            MediaResponse(response.url, kind, response.mime_type, declared_size(headers), response.status, headers,
+                          page_url),
+            tab
+        )
+        if len(self._pending) > MAX_PENDING_RESPONSES:
+            self._pending.popitem(last=False)
+
+    def _on_finished(self, event: cdp.network.LoadingFinished, tab=None) -> None:
+        pending = self._pending.pop(event.request_id, None)
+        if pending:
+            media_response, tab = pending
+            media_response.size = max(media_response.size, int(event.encoded_data_length))
+            self._report(media_response, tab)
+
+    def _on_failed(self, event: cdp.network.LoadingFailed, tab=None) -> None:
+        pending = self._pending.pop(event.request_id, None)
+        # Players cancel media requests after buffering enough, the file is still worth reporting
+        if pending and event.canceled and pending[0].size:
+            self._report(*pending)
+
+    def _report(self, media_response: MediaResponse, tab) -> None:
+        if media_response.size < self.min_sizes.get(media_response.kind, 0):
+            return
+        if media_response.url in self._seen_urls:
+            return
+        self._seen_urls[media_response.url] = None
+        if len(self._seen_urls) > MAX_SEEN_URLS:
+            self._seen_urls.popitem(last=False)
+        if self.queue.full():
+            self.dropped += 1
+            return
+        task = asyncio.create_task(self._enqueue(media_response, tab))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _enqueue(self, media_response: MediaResponse, tab) -> None:
+        if tab is not None:
+            try:
+                cookies = await tab.send(cdp.network.get_cookies([media_response.url]))
+                media_response.cookies = [cookie.to_json() for cookie in cookies]
+            except Exception:
+                log.debug(f"Failed to get cookies for '{media_response.url}'", exc_info=True)
+        try:
+            self.queue.put_nowait(media_response)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[MediaResponse]:
+        """
+        Wait for the next media response.
+
+        :param timeout: Seconds to wait, None to wait indefinitely
+        :return: Media response, None if none arrived in time
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self, limit: Optional[int] = None) -> list[MediaResponse]:
+        """
+        Take the media responses waiting in the queue without waiting for more.
+
+        :param limit: Most responses to take
+        :return: Media responses, oldest first
+        """
+        media_responses = []
+        while not self.queue.empty() and (limit is None or len(media_responses) < limit):
+            media_responses.append(self.queue.get_nowait())
+        return media_responses
+
+
+def media_kind(mime_type: str) -> Optional[str]:
+    """
+    Classify a response by its MIME type.
+
+    :param mime_type: Response MIME type
+    :return: `image`, `video`, `audio` or `stream`, None for other responses
+    """
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    if mime_type in STREAM_MIME_TYPES:
+        return "stream"
+    for prefix, kind in MEDIA_KIND_PREFIXES.items():
+        if mime_type.startswith(prefix):
+            # SVGs are documents rather than media
+            if mime_type == "image/svg+xml":
+                return None
+            return kind
+    return None
+
+
+def declared_size(headers: dict) -> int:
+    """
+    Get the full size of a response's resource from its headers.
+
+    :param headers: Response headers
+    :return: Size in bytes, from the total in Content-Range for partial responses, `0` if unknown
+    """
+    lower_headers = {name.lower(): value for name, value in headers.items()}
+    content_range = lower_headers.get("content-range", "")
+    total = content_range.rpartition("/")[2].strip()
+    if total.isdigit():
+        return int(total)
+    content_length = str(lower_headers.get("content-length", "")).strip()
+    return int(content_length) if content_length.isdigit() else 0
+
+
+def media_capture_from_env() -> MediaCapture:
+    """
+    Make a media capture configured by the BROWSER_CAPTURE_* environment variables.
+
+    :return: Media capture
+    """
+    return MediaCapture(
+        int(os.environ.get("BROWSER_CAPTURE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+        int(os.environ.get("BROWSER_CAPTURE_MIN_IMAGE_BYTES", DEFAULT_MIN_IMAGE_BYTES)),
+        int(os.environ.get("BROWSER_CAPTURE_MIN_VIDEO_BYTES", DEFAULT_MIN_VIDEO_BYTES)),
+        int(os.environ.get("BROWSER_CAPTURE_MIN_AUDIO_BYTES", DEFAULT_MIN_AUDIO_BYTES))
+    )
+
+
+log = getLogger(__name__)
@@ -0,0 +1,250 @@
+from logging import getLogger
+import os
+import signal
+import time
+from typing import Optional
+
+DEFAULT_MAX_RENDERER_RSS_MIB = 1024
+DEFAULT_MAX_RENDERER_CPU = 0.9
+DEFAULT_MAX_BROWSER_RSS_MIB = 0
+DEFAULT_WATCHDOG_INTERVAL = 10
+DEFAULT_CPU_STRIKES = 3
+# Helper processes started for browsers, by their /proc comm name
+BROWSER_PROCESS_NAMES = {"chrome", "chromium", "Xvfb", "x11vnc"}
+# Set in the app's environment so every process it starts inherits it, telling its orphans apart from the user's own
+APP_PROCESS_MARKER = b"MEDIAMIRROR_APP_PROCESS=1"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+class ProcessStats:
+    """
+    A process as read from /proc.
+    """
+    __slots__ = ["pid", "name", "ppid", "cpu_ticks", "rss_bytes", "uid"]
+
+    def __init__(self, pid: int, name: str, ppid: int, cpu_ticks: int, rss_bytes: int, uid: int):
+        self.pid = pid
+        self.name = name
+        self.ppid = ppid
+        self.cpu_ticks = cpu_ticks
+        self.rss_bytes = rss_bytes
+        self.uid = uid
+
+
+class ProcessWatchdog:
+    """
+    Kills browser renderers that use too much memory or CPU, and flags browsers that use too much memory
+    altogether.
+
+    Memory limits apply as soon as they're exceeded. CPU limits only apply after a renderer stays over
+    the limit for `cpu_strikes` checks in a row, so page loads aren't mistaken for runaway scripts.
+    """
+    max_renderer_rss_mib = DEFAULT_MAX_RENDERER_RSS_MIB
+    max_renderer_cpu = DEFAULT_MAX_RENDERER_CPU
+    max_browser_rss_mib = DEFAULT_MAX_BROWSER_RSS_MIB
+    cpu_strikes = DEFAULT_CPU_STRIKES
+
+    def __init__(self, max_renderer_rss_mib: int = DEFAULT_MAX_RENDERER_RSS_MIB,
+                 max_renderer_cpu: float = DEFAULT_MAX_RENDERER_CPU,
+                 max_browser_rss_mib: int = DEFAULT_MAX_BROWSER_RSS_MIB, cpu_strikes: int = DEFAULT_CPU_STRIKES):
+        """
+        :param max_renderer_rss_mib: Resident memory a renderer may use, `0` = no limit
+        :param max_renderer_cpu: Fraction of a CPU core a renderer may use, `0` = no limit
+        :param max_browser_rss_mib: Resident memory a browser and all its processes may use, `0` = no limit
+        :param cpu_strikes: Consecutive checks a renderer must exceed the CPU limit before it is killed
+        """
+        self.max_renderer_rss_mib = max_renderer_rss_mib
+        self.max_renderer_cpu = max_renderer_cpu
+        self.max_browser_rss_mib = max_browser_rss_mib
+        self.cpu_strikes = cpu_strikes
+        # PID -> (CPU ticks, time read, strikes)
+        self._cpu_samples = {}
+
+    def check(self, browser_pid: int, processes: Optional[dict[int, ProcessStats]] = None) -> bool:
+        """
+        Check a browser's processes, killing runaway renderers.
+
+        :param browser_pid: PID of the browser's main process
+        :param processes: Processes read with `read_processes`, read again if not given
+        :return: If the browser is within its memory limit
+        """
+        if processes is None:
+            processes = read_processes()
+        now = time.monotonic()
+        tree = process_tree(browser_pid, processes)
+        total_rss = 0
+        for process in tree:
+            total_rss += process.rss_bytes
+            if process.pid == browser_pid or not is_renderer(process.pid):
+                continue
+            reason = self._check_renderer(process, now)
+            if reason:
+                log.warning(f"Killing renderer {process.pid} of browser {browser_pid}: {reason}")
+                kill_process(process.pid)
+                total_rss -= process.rss_bytes
+        self._forget_exited(processes)
+        if self.max_browser_rss_mib and total_rss > self.max_browser_rss_mib * 1048576:
+            log.warning(f"Browser {browser_pid} is using {total_rss // 1048576} MiB, over the "
+                        f"{self.max_browser_rss_mib} MiB limit")
+            return False
+        return True
+
+    def _check_renderer(self, process: ProcessStats, now: float) -> Optional[str]:
+        if self.max_renderer_rss_mib and process.rss_bytes > self.max_renderer_rss_mib * 1048576:
+            return f"using {process.rss_bytes // 1048576} MiB"
+        previous_ticks, previous_time, strikes = self._cpu_samples.get(process.pid, (None, None, 0))
+        if previous_ticks is not None and now > previous_time:
+            cpu = (process.cpu_ticks - previous_ticks) / CLOCK_TICKS / (now - previous_time)
+            strikes = strikes + 1 if self.max_renderer_cpu and cpu > self.max_renderer_cpu else 0
+        self._cpu_samples[process.pid] = (process.cpu_ticks, now, strikes)
+        if strikes >= self.cpu_strikes:
+            return f"over {self.max_renderer_cpu:.0%} CPU for {strikes} checks"
+        return None
+
+    def _forget_exited(self, processes: dict[int, ProcessStats]) -> None:
+        for pid in [pid for pid in self._cpu_samples if pid not in processes]:
+            del self._cpu_samples[pid]
+
+
+def read_process(pid: int) -> Optional[ProcessStats]:
+    """
+    Read a process from /proc.
+
+    :param pid: Process ID
+    :return: Process, None if it exited or can't be read
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as stat_file:
+            stat = stat_file.read()
+        uid = os.stat(f"/proc/{pid}").st_uid
+    except OSError:
+        return None
+    # Name is in parentheses and may contain spaces or parentheses itself
+    name_start = stat.find("(")
+    name_end = stat.rfind(")")
+    fields = stat[name_end + 2:].split()
+    try:
+        return ProcessStats(
+            pid,
+            stat[name_start + 1:name_end],
+            int(fields[1]),
+            int(fields[11]) + int(fields[12]),
+            int(fields[21]) * PAGE_SIZE,
+            uid
+        )
+    except (IndexError, ValueError):
+        return None
+
+
+def read_processes() -> dict[int, ProcessStats]:
+    """
+    Read every process from /proc.
+
+    :return: Processes by PID
+    """
+    processes = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return processes
+    for entry in entries:
+        if entry.isdigit():
+            process = read_process(int(entry))
+            if process:
+                processes[process.pid] = process
+    return processes
+
+
+def process_tree(root_pid: int, processes: dict[int, ProcessStats]) -> list[ProcessStats]:
+    """
+    Get a process and all of its descendants.
+
+    :param root_pid: PID of the top process
+    :param processes: Processes read with `read_processes`
+    :return: Processes in the tree, the top process first
+    """
+    children = {}
+    for process in processes.values():
+        children.setdefault(process.ppid, []).append(process)
+    tree = [processes[root_pid]] if root_pid in processes else []
+    for process in tree:
+        tree.extend(children.get(process.pid, []))
+    return tree
+
+
+def is_renderer(pid: int) -> bool:
+    """
+    Check if a process is a Chrome renderer.
+
+    :param pid: Process ID
+    :return: If the process was started as a renderer
+    """
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as cmdline_file:
+            return b"--type=renderer" in cmdline_file.read()
+    except OSError:
+        return False
+
+
+def kill_process(pid: int, sig: int = signal.SIGKILL) -> bool:
+    """
+    Signal a process, ignoring processes that already exited.
+
+    :param pid: Process ID
+    :param sig: Signal to send
+    :return: If the signal was sent
+    """
+    try:
+        os.kill(pid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def mark_app_processes() -> None:
+    """
+    Mark the processes the app starts from now on as its own, so `sweep_orphans` can find them after a
+    crash. Run before starting any browsers.
+    """
+    name, _, value = APP_PROCESS_MARKER.decode().partition("=")
+    os.environ[name] = value
+
+
+def started_by_app(pid: int) -> bool:
+    """
+    Check if a process was started by the app, see `mark_app_processes`.
+
+    :param pid: Process ID
+    :return: If the process inherited the app's marker
+    """
+    try:
+        with open(f"/proc/{pid}/environ", "rb") as environ_file:
+            return APP_PROCESS_MARKER in environ_file.read().split(b"\0")
+    except OSError:
+        return False
+
+
+def sweep_orphans() -> int:
+    """
+    Kill browser, display and VNC processes left by a previous run of the app that crashed.
+
+    Only processes started by the app, owned by this user and reparented to init are killed, so the
+    user's own browsers and X server, and browsers belonging to other running workers, are left alone.
+    Run before starting any browsers.
+
+    :return: Number of processes killed
+    """
+    uid = os.getuid()
+    own_pid = os.getpid()
+    killed = 0
+    for process in read_processes().values():
+        if (process.uid == uid and process.ppid == 1 and process.pid != own_pid
+                and process.name in BROWSER_PROCESS_NAMES and started_by_app(process.pid)):
+            if kill_process(process.pid, signal.SIGTERM):
+                log.info(f"Killed orphaned '{process.name}' process {process.pid}")
+                killed += 1
+    return killed
+
+
+log = getLogger(__name__)
@@ -0,0 +1,154 @@
+from nodriver import cdp
+import os
+from typing import Optional
+
+DEFAULT_HEADLESS_PROFILE = "lite"
+# Analytics and ad hosts that crawls never need, in Network.setBlockedURLs wildcard syntax
+TRACKER_URL_PATTERNS = [
+    "*://*.doubleclick.net/*",
+    "*://*.google-analytics.com/*",
+    "*://*.googlesyndication.com/*",
+    "*://*.googletagmanager.com/*",
+    "*://*.googletagservices.com/*",
+    "*://*.hotjar.com/*",
+    "*://*.scorecardresearch.com/*",
+    "*://connect.facebook.net/*",
+    "*://*.quantserve.com/*",
+    "*://*.adnxs.com/*"
+]
+LITE_BLOCKED_TYPES = [
+    cdp.network.ResourceType.IMAGE,
+    cdp.network.ResourceType.MEDIA,
+    cdp.network.ResourceType.FONT,
+    cdp.network.ResourceType.STYLESHEET,
+    cdp.network.ResourceType.TEXT_TRACK,
+    cdp.network.ResourceType.MANIFEST,
+    cdp.network.ResourceType.PING,
+    cdp.network.ResourceType.CSP_VIOLATION_REPORT
+]
+# Navigation is checked separately and can't be blocked by type
+UNBLOCKABLE_TYPES = {cdp.network.ResourceType.DOCUMENT}
+
+
+class ResourceProfile:
+    """
+    Resources a browser doesn't load, for crawls that only need the DOM and the URLs in it.
+
+    Resource types are blocked through Fetch interception before any bytes are transferred, URL
+    patterns are blocked by the browser itself, and scripts can be disabled entirely.
+    """
+    name = None
+    blocked_types = frozenset()
+    blocked_urls = []
+    javascript = True
+
+    def __init__(self, name: str, blocked_types: list[cdp.network.ResourceType] = [], blocked_urls: list[str] = [],
+                 javascript: bool = True):
+        """
+        :param name: Profile name
+        :param blocked_types: Resource types to fail
+        :param blocked_urls: URL patterns to fail, `*` is a wildcard
+        :param javascript: If scripts should run
+        """
+        self.name = name
+        self.blocked_types = frozenset(blocked_types) - UNBLOCKABLE_TYPES
+        self.blocked_urls = list(blocked_urls)
+        self.javascript = javascript
+
+    @property
+    def blocks_anything(self) -> bool:
+        return bool(self.blocked_types or self.blocked_urls or not self.javascript)
+
+    def browser_args(self) -> list[str]:
+        """
+        Get browser arguments that stop blocked resources from being requested at all.
+
+        :return: Browser arguments
+        """
+        browser_args = []
+        if cdp.network.ResourceType.IMAGE in self.blocked_types:
+            browser_args.append("--blink-settings=imagesEnabled=false")
+        if cdp.network.ResourceType.MEDIA in self.blocked_types:
+            browser_args.append("--autoplay-policy=user-gesture-required")
+        return browser_args
+
+    async def apply(self, tab) -> None:
+        """
+        Block URL patterns and scripts in a tab, resource types are handled by request interception.
+
+        :param tab: nodriver Tab
+        """
+        if self.blocked_urls:
+            await tab.send(cdp.network.enable())
+            await tab.send(cdp.network.set_blocked_ur_ls(self.blocked_urls))
+        if not self.javascript:
+            await tab.send(cdp.emulation.set_script_execution_disabled(True))
+
+
+RESOURCE_PROFILES = {
+    "full": ResourceProfile("full"),
+    "lite": ResourceProfile("lite", LITE_BLOCKED_TYPES, TRACKER_URL_PATTERNS),
+    "static": ResourceProfile("static", LITE_BLOCKED_TYPES + [cdp.network.ResourceType.SCRIPT], TRACKER_URL_PATTERNS,
+                              javascript=False)
+}
+
+
+def parse_resource_types(value: str) -> list[cdp.network.ResourceType]:
+    """
+    Parse a comma separated list of CDP resource types, like `image,media,font`.
+
+    :param value: Resource type names, case insensitive
+    :raises ValueError: If a resource type is unknown
+    :return: Resource types
+    """
+    resource_types = {resource_type.value.lower(): resource_type for resource_type in cdp.network.ResourceType}
+    parsed_types = []
+    for type_name in value.split(","):
+        type_name = type_name.strip().lower()
+        if not type_name:
+            continue
+        if type_name not in resource_types:
+            raise ValueError(f"Unknown resource type '{type_name}'")
+        parsed_types.append(resource_types[type_name])
+    return parsed_types
+
+
+def get_resource_profile(name: str, blocked_types: Optional[str] = None, blocked_urls: Optional[str] = None,
+                         javascript: Optional[bool] = None) -> ResourceProfile:
+    """
+    Get a built-in profile, optionally customized.
+
+    :param name: Profile name, one of `full`, `lite` or `static`
+    :param blocked_types: Comma separated resource types replacing the profile's
+    :param blocked_urls: Comma separated URL patterns blocked in addition to the profile's
+    :param javascript: Override for if scripts should run
+    :raises ValueError: If the profile or a resource type is unknown
+    :return: Resource profile
+    """
+    profile = RESOURCE_PROFILES.get(name)
+    if not profile:
+        raise ValueError(f"Unknown resource profile '{name}'")
+    if blocked_types is None and not blocked_urls and javascript is None:
+        return profile
+    return ResourceProfile(
+        name,
+        parse_resource_types(blocked_types) if blocked_types is not None else profile.blocked_types,
+        profile.blocked_urls + [url.strip() for url in (blocked_urls or "").split(",") if url.strip()],
+        profile.javascript if javascript is None else javascript
+    )
+
+
+def headless_profile_from_env() -> ResourceProfile:
+    """
+    Get the resource profile for headless browsers from the BROWSER_HEADLESS_* environment variables.
+
+    :raises ValueError: If the configured profile or a resource type is unknown
+    :return: Resource profile
+    """
+    javascript = os.environ.get("BROWSER_HEADLESS_JAVASCRIPT", "").strip().lower()
+    return get_resource_profile(
+        os.environ.get("BROWSER_HEADLESS_PROFILE", DEFAULT_HEADLESS_PROFILE),
+        os.environ.get("BROWSER_HEADLESS_BLOCKED_TYPES") or None,
+        os.environ.get("BROWSER_HEADLESS_BLOCKED_URLS"),
+        (javascript == "true") if javascript else None
+    )
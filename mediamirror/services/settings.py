@@ -0,0 +1,208 @@
+import asyncio
+import json
+from logging import getLogger
+from sqlalchemy import (
+    func,
+    select
+)
+from sqlalchemy.dialects.postgresql import insert
+from typing import (
+    Callable,
+    Optional
+)
+from uuid import uuid4
+
+from mediamirror.models.settings import Setting
+import mediamirror.services.database_manager as database_manager
+
+SETTINGS_CHANNEL = "mediamirror_settings"
+LISTENER_RECONNECT_DELAY = 5
+
+
+class SettingsService:
+    """
+    In-memory cache of the settings table, grouped by component.
+
+    All rows are loaded with a single query, writes are batched into one upsert per component, and
+    other workers are told to reload changed components through Postgres `LISTEN/NOTIFY`.
+    """
+
+    def __init__(self):
+        self.origin = uuid4().hex
+        self._cache = {}
+        self._subscribers = {}
+        self._listener_task = None
+        self._reload_tasks = set()
+
+    async def load(self) -> None:
+        """
+        Load every setting into the cache.
+        """
+        async with database_manager.get_db_session() as db_session:
+            try:
+                settings = (await db_session.scalars(select(Setting))).all()
+            except Exception:
+                # Settings table may not exist before the first schema update
+                log.warning("Could not load settings from the database", exc_info=True)
+                return
+        cache = {}
+        for setting in settings:
+            cache.setdefault(setting.component, {})[setting.key] = setting.value
+        changed_components = set(cache) | set(self._cache)
+        previous_cache = self._cache
+        self._cache = cache
+        for component in changed_components:
+            self._notify_subscribers(component, previous_cache.get(component, {}), cache.get(component, {}))
+
+    def get(self, component: str, key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Get a cached setting value.
+
+        :param component: Setting component
+        :param key: Setting key
+        :param default: Value if the setting doesn't exist
+        :return: Setting value
+        """
+        return self._cache.get(component, {}).get(key, default)
+
+    def get_component(self, component: str) -> dict[str, str]:
+        """
+        Get all cached settings for a component.
+
+        :param component: Setting component
+        :return: Mapping of key to value
+        """
+        return dict(self._cache.get(component, {}))
+
+    async def set_many(self, component: str, values: dict[str, str]) -> dict[str, str]:
+        """
+        Upsert settings for a component in one statement, skipping values that haven't changed.
+
+        :param component: Setting component
+        :param values: Mapping of key to value
+        :return: Settings that were changed
+        """
+        cached = self._cache.get(component, {})
+        changed = {key: value for key, value in values.items() if cached.get(key) != value}
+        if not changed:
+            return {}
+        async with database_manager.get_db_session() as db_session:
+            try:
+                statement = insert(Setting).values([
+                    {"component": component, "key": key, "value": value} for key, value in changed.items()
+                ])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[Setting.component, Setting.key],
+                    set_={"value": statement.excluded.value}
+                )
+                await db_session.execute(statement)
+                # Delivered to listeners when the transaction commits
+                payload = json.dumps({"origin": self.origin, "component": component})
+                await db_session.execute(select(func.pg_notify(SETTINGS_CHANNEL, payload)))
+                await db_session.commit()
+            except Exception:
+                await db_session.rollback()
+                raise
+        previous = dict(cached)
+        self._cache.setdefault(component, {}).update(changed)
+        self._notify_subscribers(component, previous, self._cache[component])
+        return changed
+
+    def subscribe(self, component: str, callback: Callable[[dict[str, Optional[str]]], None]) -> None:
+        """
+        Call a function whenever settings for a component change, in this worker or another.
+
+        :param component: Setting component
+        :param callback: Called with a mapping of changed keys to their new value, or None if removed
+        """
+        self._subscribers.setdefault(component, []).append(callback)
+
+    def _notify_subscribers(self, component: str, previous: dict[str, str], current: dict[str, str]) -> None:
+        changed = {
+            key: current.get(key) for key in set(previous) | set(current)
+            if previous.get(key) != current.get(key)
+        }
+        if not changed:
+            return
+        for callback in self._subscribers.get(component, []):
+            try:
+                callback(changed)
+            except Exception:
+                log.exception(f"Failed to apply changed '{component}' settings")
+
+    async def reload_component(self, component: str) -> None:
+        """
+        Reload a component's settings after another worker changed them.
+
+        :param component: Setting component
+        """
+        async with database_manager.get_db_session() as db_session:
+            try:
+                settings = (await db_session.scalars(select(Setting).filter_by(component=component))).all()
+            except Exception:
+                log.exception(f"Failed to reload '{component}' settings")
+                return
+        previous = self._cache.get(component, {})
+        current = {setting.key: setting.value for setting in settings}
+        self._cache[component] = current
+        self._notify_subscribers(component, previous, current)
+
+    def start_listener(self) -> None:
+        """
+        Start listening for settings changes made by other workers.
+        """
+        if not self._listener_task:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        """
+        Stop listening for settings changes.
+        """
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    async def _listen(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                async with database_manager.engine.connect() as db_connection:
+                    raw_connection = await db_connection.get_raw_connection()
+                    listen_connection = raw_connection.driver_connection
+                    terminated = asyncio.Event()
+                    listen_connection.add_termination_listener(lambda _: terminated.set())
+                    await listen_connection.add_listener(SETTINGS_CHANNEL, self._on_notification)
+                    try:
+                        if connected_before:
+                            # Changes may have been missed while disconnected
+                            await self.load()
+                        connected_before = True
+                        await terminated.wait()
+                    finally:
+                        # Connection goes back to the pool
+                        if not listen_connection.is_closed():
+                            await listen_connection.remove_listener(SETTINGS_CHANNEL, self._on_notification)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Settings listener connection failed")
+            await asyncio.sleep(LISTENER_RECONNECT_DELAY)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            notification = json.loads(payload)
+        except json.JSONDecodeError:
+            return
+        if notification.get("origin") == self.origin or not notification.get("component"):
+            return
+        reload_task = asyncio.create_task(self.reload_component(notification["component"]))
+        self._reload_tasks.add(reload_task)
+        reload_task.add_done_callback(self._reload_tasks.discard)
+
+
+settings_service = None
+log = getLogger(__name__)
@@ -0,0 +1,238 @@
+import asyncio
+from collections import (
+    deque,
+    OrderedDict
+)
+from itertools import count
+import logging
+from logging import (
+    getLogger,
+    Logger
+)
+import os
+import random
+import re
+import time
+from typing import Optional
+
+DEFAULT_BUFFER_LINES = 1000
+DEFAULT_SAMPLE_RATE = 0.01
+BUFFER_LINES = int(os.environ.get("LOGS_SUBPROCESS_BUFFER_LINES", DEFAULT_BUFFER_LINES))
+SAMPLE_RATE = float(os.environ.get("LOGS_SUBPROCESS_SAMPLE_RATE", DEFAULT_SAMPLE_RATE))
+STREAM_LIMIT = 65536
+MAX_EXITED_PROCESSES = 20
+TERMINATE_TIMEOUT = 5
+LINE_LEVEL_PATTERN = re.compile(r"\b(CRITICAL|FATAL|ERROR|WARN|WARNING)\b", re.IGNORECASE)
+LINE_LEVELS = {
+    "critical": logging.CRITICAL,
+    "fatal": logging.CRITICAL,
+    "error": logging.ERROR,
+    "warn": logging.WARNING,
+    "warning": logging.WARNING
+}
+
+
+class OutputBuffer:
+    """
+    Bounded buffer of the most recent output lines from a process.
+    """
+    __slots__ = ["lines", "line_count"]
+
+    def __init__(self, max_lines: int = DEFAULT_BUFFER_LINES):
+        """
+        :param max_lines: Lines kept before the oldest are discarded
+        """
+        self.lines = deque(maxlen=max_lines)
+        self.line_count = 0
+
+    def append(self, stream: str, line: str) -> None:
+        """
+        Add an output line.
+
+        :param stream: Name of the stream the line was read from
+        :param line: Output line
+        """
+        self.lines.append((time.time(), stream, line))
+        self.line_count += 1
+
+    @property
+    def dropped(self) -> int:
+        return self.line_count - len(self.lines)
+
+
+class ManagedProcess:
+    """
+    Helper process started with `start_process`, with its output captured into a ring buffer.
+
+    Output lines are only forwarded to the log if they look like warnings or errors, or are sampled.
+    """
+    id = None
+    name = None
+    args = []
+    process = None
+    started = None
+
+    def __init__(self, process_id: int, name: str, args: list[str], process: asyncio.subprocess.Process,
+                 logger: Logger, buffer_lines: int = BUFFER_LINES, sample_rate: float = SAMPLE_RATE):
+        """
+        :param process_id: Registry ID
+        :param name: Display name
+        :param args: Program and arguments
+        :param process: Running process
+        :param logger: Logger to forward output to
+        :param buffer_lines: Output lines kept per process
+        :param sample_rate: Fraction of other output lines forwarded at DEBUG
+        """
+        self.id = process_id
+        self.name = name
+        self.args = args
+        self.process = process
+        self.started = time.time()
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.output = OutputBuffer(buffer_lines)
+        self._capture_tasks = [
+            asyncio.create_task(self._capture(process.stdout, "stdout")),
+            asyncio.create_task(self._capture(process.stderr, "stderr"))
+        ]
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
+
+    async def _capture(self, stream: asyncio.StreamReader, stream_name: str) -> None:
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Line exceeded the stream limit and was discarded
+                self.output.append(stream_name, "[line too long]")
+                continue
+            if not line:
+                break
+            text = line.decode(errors="replace").rstrip("\r\n")
+            self.output.append(stream_name, text)
+            level = line_level(text)
+            if level is None:
+                if not self.sample_rate or random.random() >= self.sample_rate:
+                    continue
+                level = logging.DEBUG
+            self.logger.log(level, f"[{self.name}] {text}")
+
+    async def terminate(self, timeout: float = TERMINATE_TIMEOUT) -> None:
+        """
+        Stop the process, killing it if it doesn't exit in time, and finish reading its output.
+
+        :param timeout: Seconds to wait after terminating before killing
+        """
+        if self.process.returncode is None:
+            try:
+                self.process.terminate()
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except ProcessLookupError:
+                pass
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        # Child processes holding the pipes open would otherwise keep these waiting
+        _, pending = await asyncio.wait(self._capture_tasks, timeout=timeout)
+        for capture_task in pending:
+            capture_task.cancel()
+
+    def info(self) -> dict:
+        """
+        Describe the process.
+
+        :return: Process details
+        """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "args": self.args,
+            "pid": self.pid,
+            "started": self.started,
+            "returncode": self.returncode,
+            "line_count": self.output.line_count,
+            "dropped": self.output.dropped
+        }
+
+    def recent_output(self, limit: Optional[int] = None) -> list[dict]:
+        """
+        Get the buffered output lines, oldest first.
+
+        :param limit: Only return this many of the newest lines
+        :return: Output lines
+        """
+        lines = list(self.output.lines)
+        if limit is not None:
+            lines = lines[-limit:] if limit > 0 else []
+        return [{"time": line_time, "stream": stream, "line": line} for line_time, stream, line in lines]
+
+
+async def start_process(name: str, args: list[str], logger: Logger, buffer_lines: int = BUFFER_LINES,
+                        sample_rate: float = SAMPLE_RATE) -> ManagedProcess:
+    """
+    Start a helper process and capture its output.
+
+    :param name: Display name
+    :param args: Program and arguments
+    :param logger: Logger to forward output to
+    :param buffer_lines: Output lines kept
+    :param sample_rate: Fraction of ordinary output lines forwarded at DEBUG
+    :return: Managed process
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, limit=STREAM_LIMIT
+    )
+    managed_process = ManagedProcess(next(_process_ids), name, args, process, logger, buffer_lines, sample_rate)
+    _processes[managed_process.id] = managed_process
+    _prune_exited()
+    log.debug(f"Started '{name}' process with PID {process.pid}")
+    return managed_process
+
+
+def _prune_exited() -> None:
+    exited = [process_id for process_id, process in _processes.items() if process.returncode is not None]
+    for process_id in exited[:max(len(exited) - MAX_EXITED_PROCESSES, 0)]:
+        del _processes[process_id]
+
+
+def line_level(line: str) -> Optional[int]:
+    """
+    Guess the level of an output line from the words in it.
+
+    :param line: Output line
+    :return: WARNING or above, or None for ordinary output
+    """
+    match = LINE_LEVEL_PATTERN.search(line)
+    if match:
+        return LINE_LEVELS[match.group(1).lower()]
+    return None
+
+
+def list_processes() -> list[ManagedProcess]:
+    """
+    Get running processes and the most recently exited ones.
+
+    :return: Managed processes, oldest first
+    """
+    return list(_processes.values())
+
+
+def get_process(process_id: int) -> Optional[ManagedProcess]:
+    """
+    Get a managed process by ID.
+
+    :param process_id: Registry ID
+    :return: Managed process, if it is still tracked
+    """
+    return _processes.get(process_id)
+
+
+_processes = OrderedDict()
+_process_ids = count(1)
+log = getLogger(__name__)
@@ -0,0 +1,62 @@
+import asyncio
+from logging import getLogger
+import socket
+
+PROXY_CHUNK_SIZE = 65536
+VNC_HOST = "127.0.0.1"
+# Bytes buffered towards the VNC server before client reads pause
+WRITE_BUFFER_HIGH = 262144
+
+
+async def proxy_vnc(websocket, vnc_port: int) -> None:
+    """
+    Bridge an accepted websocket to a local VNC server until either side closes.
+
+    Messages and socket reads are forwarded as-is without re-buffering. Each direction waits for the
+    other side to accept data before reading more, so a slow client or server applies backpressure
+    instead of data queueing in memory.
+
+    :param websocket: Accepted Quart websocket
+    :param vnc_port: Local VNC server port
+    """
+    reader, writer = await asyncio.open_connection(VNC_HOST, vnc_port, limit=PROXY_CHUNK_SIZE)
+    vnc_socket = writer.get_extra_info("socket")
+    if vnc_socket is not None:
+        # Input events are small and latency sensitive
+        vnc_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH)
+
+    async def client_to_vnc() -> None:
+        while True:
+            data = await websocket.receive()
+            if isinstance(data, str):
+                # noVNC only sends binary frames
+                continue
+            writer.write(data)
+            await writer.drain()
+
+    async def vnc_to_client() -> None:
+        while True:
+            data = await reader.read(PROXY_CHUNK_SIZE)
+            if not data:
+                break
+            await websocket.send(data)
+
+    tasks = [asyncio.create_task(client_to_vnc()), asyncio.create_task(vnc_to_client())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception():
+                log.debug(f"VNC proxy for port {vnc_port} closed: {task.exception()!r}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+log = getLogger(__name__)
@@ -0,0 +1,367 @@
+import asyncio
+import fcntl
+from logging import getLogger
+import os
+import socket
+import tempfile
+import time
+from typing import Optional
+
+from mediamirror.services.browser import (
+    BrowserLease,
+    BrowserPool
+)
+
+DEFAULT_VNC_PORT_RANGE = "5900-5999"
+DEFAULT_SESSION_MEMORY_MIB = 768
+DEFAULT_SESSION_CPUS = 0.5
+DEFAULT_IDLE_TIMEOUT = 300
+REAP_INTERVAL = 30
+
+
+class VncSessionLimitException(Exception):
+    pass
+
+
+class VncUnavailableException(Exception):
+    pass
+
+
+class PortAllocator:
+    """
+    Hands out unused ports from a range.
+    """
+
+    def __init__(self, ports: range):
+        """
+        :param ports: Ports that may be allocated
+        """
+        self.ports = ports
+        self._allocated = set()
+
+    @property
+    def available(self) -> int:
+        return len(self.ports) - len(self._allocated)
+
+    def allocate(self) -> int:
+        """
+        Reserve a port that nothing else is listening on.
+
+        :raises VncSessionLimitException: If every port in the range is taken
+        :return: Port number
+        """
+        for port in self.ports:
+            if port not in self._allocated and port_is_free(port):
+                self._allocated.add(port)
+                return port
+        raise VncSessionLimitException(f"No free ports in {self.ports.start}-{self.ports.stop - 1}.")
+
+    def release(self, port: int) -> None:
+        """
+        Return a port to the range.
+
+        :param port: Port number
+        """
+        self._allocated.discard(port)
+
+
+class VncSession:
+    """
+    A leased browser with its own VNC server port.
+    """
+    user_id = None
+    lease = None
+    vnc_port = None
+    created = None
+    clients = 0
+    last_active = None
+
+    def __init__(self, user_id: str, lease: BrowserLease, vnc_port: int):
+        self.user_id = user_id
+        self.lease = lease
+        self.vnc_port = vnc_port
+        self.created = time.time()
+        self.clients = 0
+        self.last_active = time.monotonic()
+
+    @property
+    def web_browser(self):
+        return self.lease.web_browser
+
+    def connect(self) -> None:
+        """
+        Record a VNC client connecting.
+        """
+        self.clients += 1
+        self.last_active = time.monotonic()
+        self.lease.renew()
+
+    def disconnect(self) -> None:
+        """
+        Record a VNC client disconnecting.
+        """
+        self.clients = max(self.clients - 1, 0)
+        self.last_active = time.monotonic()
+
+    def idle_for(self) -> float:
+        """
+        Get how long the session has had no clients connected.
+
+        :return: Seconds idle, `0` while a client is connected
+        """
+        if self.clients:
+            return 0
+        return time.monotonic() - self.last_active
+
+
+class VncSessionRegistry:
+    """
+    Tracks one VNC session per user, allocating each a VNC server port from a configured range.
+
+    The number of sessions is capped by `max_sessions`, which defaults to what the host's CPUs and
+    memory can run, and new sessions are refused while available memory is too low. Sessions
+    with no VNC client connected for `idle_timeout` are closed.
+
+    Sessions, ports and browsers are tracked in memory, so VNC needs the app to run a single worker.
+    Only one registry per port range can be started on a host.
+    """
+    max_sessions = 0
+    idle_timeout = DEFAULT_IDLE_TIMEOUT
+
+    def __init__(self, browser_pool: BrowserPool, vnc_ports: range, max_sessions: int = 0,
+                 session_memory_mib: int = DEFAULT_SESSION_MEMORY_MIB,
+                 session_cpus: float = DEFAULT_SESSION_CPUS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        """
+        :param browser_pool: Pool to lease browsers from
+        :param vnc_ports: Local ports for VNC servers
+        :param max_sessions: Most sessions at once, `0` = based on CPUs and memory
+        :param session_memory_mib: Memory estimated for each session
+        :param session_cpus: CPUs estimated for each session
+        :param idle_timeout: Seconds a session can go without a client before it is closed, `0` = never
+        """
+        self.browser_pool = browser_pool
+        self.vnc_ports = PortAllocator(vnc_ports)
+        self.session_memory_mib = session_memory_mib
+        self.max_sessions = max_sessions or auto_session_limit(session_memory_mib, session_cpus)
+        self.max_sessions = min(self.max_sessions, len(vnc_ports))
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = asyncio.Lock()
+        self._reap_task = None
+        self._host_lock = None
+
+    def start(self) -> None:
+        """
+        Claim the port range for this process and start closing idle sessions in the background.
+
+        :raises VncUnavailableException: If another process, such as another worker, already claimed the port range
+        """
+        if not self._host_lock:
+            self._host_lock = claim_port_range(self.vnc_ports.ports)
+        if self.idle_timeout and not self._reap_task:
+            self._reap_task = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            try:
+                for session in self.sessions():
+                    if session.clients:
+                        # Keep the browser while someone is using it
+                        session.lease.renew()
+                    elif session.idle_for() >= self.idle_timeout:
+                        log.info(f"Closing VNC session for user '{session.user_id}' after "
+                                 f"{session.idle_for():.0f}s without a client")
+                        await self.close(session.user_id)
+            except Exception:
+                log.exception("Failed to close idle VNC sessions")
+
+    def _prune(self) -> None:
+        for user_id, session in list(self._sessions.items()):
+            # Lease may have expired and the browser been recycled
+            if not self.browser_pool.get_lease(session.lease.id):
+                self._forget(user_id)
+
+    def _forget(self, user_id: str) -> Optional[VncSession]:
+        session = self._sessions.pop(user_id, None)
+        if session:
+            self.vnc_ports.release(session.vnc_port)
+        return session
+
+    def get(self, user_id: str) -> Optional[VncSession]:
+        """
+        Get a user's active session.
+
+        :param user_id: User ID
+        :return: Session, if the user has one
+        """
+        self._prune()
+        return self._sessions.get(user_id)
+
+    def sessions(self) -> list[VncSession]:
+        """
+        Get every active session.
+
+        :return: Sessions
+        """
+        self._prune()
+        return list(self._sessions.values())
+
+    async def open(self, user_id: str) -> VncSession:
+        """
+        Get a user's session, or lease a browser and start VNC for a new one.
+
+        :param user_id: User ID
+        :raises VncSessionLimitException: If the session cap or available memory doesn't allow another session
+        :raises BrowserUnavailableException: If no browser became available in time
+        :return: Session
+        """
+        async with self._lock:
+            self._prune()
+            session = self._sessions.get(user_id)
+            if session:
+                session.lease.renew()
+                return session
+            if len(self._sessions) >= self.max_sessions:
+                raise VncSessionLimitException(f"All {self.max_sessions} VNC sessions are in use.")
+            memory_mib = available_memory_mib()
+            if memory_mib is not None and memory_mib < self.session_memory_mib:
+                raise VncSessionLimitException(f"Only {memory_mib} MiB of memory available for a new VNC session.")
+            vnc_port = self.vnc_ports.allocate()
+            try:
+                lease = await self.browser_pool.lease(user_id)
+            except Exception:
+                self.vnc_ports.release(vnc_port)
+                raise
+            try:
+                await lease.web_browser.start_vnc(vnc_port)
+            except Exception:
+                await self.browser_pool.release(lease.id)
+                self.vnc_ports.release(vnc_port)
+                raise
+            session = VncSession(user_id, lease, vnc_port)
+            self._sessions[user_id] = session
+            log.info(f"Opened VNC session for user '{user_id}' on VNC port {vnc_port}")
+            return session
+
+    async def close(self, user_id: str) -> bool:
+        """
+        Close a user's session and return its browser to the pool.
+
+        :param user_id: User ID
+        :return: If the user had a session
+        """
+        async with self._lock:
+            session = self._forget(user_id)
+        if not session:
+            return False
+        await self.browser_pool.release(session.lease.id)
+        log.info(f"Closed VNC session for user '{user_id}'")
+        return True
+
+    async def close_all(self) -> None:
+        """
+        Stop closing idle sessions and close every session.
+        """
+        if self._reap_task:
+            self._reap_task.cancel()
+            try:
+                await self._reap_task
+            except asyncio.CancelledError:
+                pass
+            self._reap_task = None
+        for user_id in list(self._sessions):
+            await self.close(user_id)
+        if self._host_lock:
+            self._host_lock.close()
+            self._host_lock = None
+
+
+def parse_port_range(value: str) -> range:
+    """
+    Parse a port or an inclusive port range like `5900-5999`.
+
+    :param value: Port range
+    :raises ValueError: If the range is invalid
+    :return: Ports in the range
+    """
+    start, _, end = str(value).strip().partition("-")
+    first = int(start)
+    last = int(end) if end else first
+    if not 0 < first <= last < 65536:
+        raise ValueError(f"Invalid port range '{value}'")
+    return range(first, last + 1)
+
+
+def claim_port_range(ports: range):
+    """
+    Lock a VNC port range for this process until the returned file is closed.
+
+    :param ports: VNC port range
+    :raises VncUnavailableException: If another process holds the lock
+    :return: Open lock file
+    """
+    lock_path = os.path.join(tempfile.gettempdir(), f"mediamirror-vnc-{ports.start}-{ports.stop - 1}.lock")
+    lock_file = open(lock_path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise VncUnavailableException(
+            f"VNC ports {ports.start}-{ports.stop - 1} are in use by another worker, VNC needs a single worker.")
+    return lock_file
+
+
+def port_is_free(port: int) -> bool:
+    """
+    Check that nothing is listening on a local port.
+
+    :param port: Port number
+    :return: If the port can be bound
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as test_socket:
+        try:
+            test_socket.bind(("", port))
+            return True
+        except OSError:
+            return False
+
+
+def available_memory_mib() -> Optional[int]:
+    """
+    Get the memory available for new processes.
+
+    :return: Available MiB, or None if it can't be determined
+    """
+    try:
+        with open("/proc/meminfo", "r") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def auto_session_limit(session_memory_mib: int = DEFAULT_SESSION_MEMORY_MIB,
+                       session_cpus: float = DEFAULT_SESSION_CPUS) -> int:
+    """
+    Estimate how many sessions the host can run from its CPUs and total memory.
+
+    :param session_memory_mib: Memory estimated for each session
+    :param session_cpus: CPUs estimated for each session
+    :return: Session limit, at least 1
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    limit = int(cpus / session_cpus) if session_cpus > 0 else cpus
+    try:
+        total_memory_mib = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 1048576
+        if session_memory_mib > 0:
+            limit = min(limit, total_memory_mib // session_memory_mib)
+    except (ValueError, OSError):
+        pass
+    return max(limit, 1)
+
+
+vnc_registry = None
+log = getLogger(__name__)
@@ -1,54 +1,123 @@
 from quart import (
+    abort,
     Blueprint,
+    jsonify,
     request,
     Response,
-    session
+    send_from_directory,
+    session,
+    websocket
 )
 from logging import getLogger
+import os
 
 from mediamirror.views import permissions_required
-from mediamirror.services.browser import (
-    make_browser
-)
+from mediamirror.services.body_capture import body_capture_from_env
+from mediamirror.services.browser import BrowserUnavailableException
+from mediamirror.services.media_capture import media_capture_from_env
+from mediamirror.services.vnc_proxy import proxy_vnc
+import mediamirror.services.vnc_sessions as vnc_sessions
+from mediamirror.services.vnc_sessions import VncSessionLimitException
 
+NOVNC_INSTALL_DIR = os.environ.get("NOVNC_INSTALL_DIR", "/home/mediamirror/.local/novnc")
+MAX_MEDIA_RESULTS = 500
 
 vnc_routes = Blueprint("vnc_pages", __name__, url_prefix="/vnc")
-web_browser = None
 
 
 @vnc_routes.route("/iframe", methods=["POST"])
 @permissions_required(["vnc"])
 async def browser_frame() -> Response:
     """
-    Create a VNC-driven browser and return an iframe embedding URL.
+    Open a VNC-driven browser session and return an iframe embedding URL.
     """
-    log.debug(f"VNC browser requested by user '{session["user_id"]}'")
-    global web_browser
-    if web_browser:
-        return "VNC currently in use, cannot create another browser."
-    web_browser = True
+    user_id = str(session["user_id"])
+    log.debug(f"VNC browser requested by user '{user_id}'")
     data = await request.get_json()
-    log.debug(f"Creating VNC browser with data: {data}")
+    log.debug(f"Opening VNC session with data: {data}")
     domain_whitelist = data.get("domain_whitelist", [])
     initial_page = data.get("initial_page_url", "")
+    if not vnc_sessions.vnc_registry:
+        return "VNC is not available, it needs the app to run a single worker."
     try:
-        web_browser = await make_browser(data.get("browser_width", 1366), data.get("browser_height", 768), True)
+        vnc_session = await vnc_sessions.vnc_registry.open(user_id)
+        web_browser = vnc_session.web_browser
         if len(domain_whitelist) > 0:
-            web_browser.limit_domains(domain_whitelist)
+            await web_browser.limit_domains(domain_whitelist)
+        if data.get("capture_media", False) and not web_browser.media_capture:
+            await web_browser.start_media_capture(media_capture_from_env())
+        if data.get("capture_bodies", False) and not web_browser.body_capture:
+            await web_browser.start_body_capture(body_capture_from_env())
         if initial_page:
             await web_browser.browser.get(initial_page)
-        log.debug(f"Created VNC browser for user '{session["user_id"]}'")
+        log.debug(f"Opened VNC session for user '{user_id}'")
         return f"""<iframe class="remote-frame" src="{web_browser.get_iframe_url()}"></iframe>"""
+    except (BrowserUnavailableException, VncSessionLimitException) as e:
+        log.warning(f"Could not open VNC session for user '{user_id}': {e}")
+        return "VNC currently in use, cannot create another browser."
     except Exception:
         log.exception("Error creating VNC browser")
         return "An error was encountered while trying to create the browser, check the logs for more details."
 
 
+@vnc_routes.route("/client/<path:file_path>")
+@permissions_required(["vnc"])
+async def vnc_client(file_path: str) -> Response:
+    """
+    Serve the noVNC client files.
+    """
+    return await send_from_directory(NOVNC_INSTALL_DIR, file_path)
+
+
+@vnc_routes.websocket("/websockify")
+@permissions_required(["vnc"])
+async def vnc_websocket() -> None:
+    """
+    Bridge the noVNC client to the user's VNC server.
+    """
+    user_id = str(session["user_id"])
+    if not vnc_sessions.vnc_registry:
+        abort(503, description="VNC is not available")
+    vnc_session = vnc_sessions.vnc_registry.get(user_id)
+    if not vnc_session:
+        abort(404, description="No VNC session")
+    subprotocol = "binary" if "binary" in websocket.requested_subprotocols else None
+    await websocket.accept(subprotocol=subprotocol)
+    vnc_session.connect()
+    log.debug(f"VNC client connected for user '{user_id}'")
+    try:
+        await proxy_vnc(websocket, vnc_session.vnc_port)
+    finally:
+        vnc_session.disconnect()
+        log.debug(f"VNC client disconnected for user '{user_id}'")
+
+
+@vnc_routes.route("/media")
+@permissions_required(["vnc"])
+async def captured_media() -> Response:
+    """
+    Take the media responses and saved bodies captured in the user's VNC session since the last request.
+    """
+    if not vnc_sessions.vnc_registry:
+        return jsonify({"error": "VNC is not available"}), 503
+    vnc_session = vnc_sessions.vnc_registry.get(str(session["user_id"]))
+    if not vnc_session or not (vnc_session.web_browser.media_capture or vnc_session.web_browser.body_capture):
+        return jsonify({"error": "Media capture is not running"}), 404
+    media_capture = vnc_session.web_browser.media_capture
+    body_capture = vnc_session.web_browser.body_capture
+    return jsonify({
+        "media": [media_response.to_dict() for media_response in media_capture.drain(MAX_MEDIA_RESULTS)]
+        if media_capture else [],
+        "bodies": [captured_body.to_dict() for captured_body in body_capture.drain(MAX_MEDIA_RESULTS)]
+        if body_capture else [],
+        "dropped": (media_capture.dropped if media_capture else 0) + (body_capture.dropped if body_capture else 0)
+    })
+
+
 @vnc_routes.route("/close")
 @permissions_required(["vnc"])
 async def close_browser() -> None:
-    global web_browser
-    web_browser.close()
-    web_browser = None
+    if vnc_sessions.vnc_registry:
+        await vnc_sessions.vnc_registry.close(str(session["user_id"]))
 
 log = getLogger("mediamirror.vnc")
@@ -0,0 +1,49 @@
+"""add_log_records
+
+Revision ID: 4e1f9b2a7d3c
+Revises: c7643d5cea11
+Create Date: 2026-10-18 14:02:51.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '4e1f9b2a7d3c'
+down_revision: Union[str, None] = 'c7643d5cea11'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Partitioned tables can't be created with op.create_table, daily partitions are created as records arrive
+    op.execute("""
+        CREATE TABLE log_records (
+            id BIGSERIAL NOT NULL,
+            created TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            levelname VARCHAR(20) NOT NULL,
+            levelno SMALLINT NOT NULL,
+            pathname TEXT,
+            module VARCHAR(255),
+            lineno INTEGER,
+            func_name VARCHAR(255),
+            relative_created DOUBLE PRECISION,
+            thread BIGINT,
+            thread_name VARCHAR(255),
+            process_name VARCHAR(255),
+            process INTEGER,
+            message TEXT,
+            exc_text TEXT,
+            stack_info TEXT,
+            PRIMARY KEY (created, id)
+        ) PARTITION BY RANGE (created)
+    """)
+    op.create_index('ix_log_records_levelno_created', 'log_records', ['levelno', 'created'])
+    op.create_index('ix_log_records_name_created', 'log_records', ['name', 'created'])
+
+
+def downgrade():
+    # Drops every partition along with the parent table
+    op.drop_table('log_records')
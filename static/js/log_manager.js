@@ -39,7 +39,27 @@ const logFileHtml = `
     </table>
     <div class="scroll-shadow shadow-bottom-gradient"></div>
 </div>
+<div id="logDetail" class="hidden">
+    <div class="log-detail-head">
+        <span id="logDetailTitle"></span>
+        <button class="circle-icon-btn color-hoverable" title="Close log entry" onclick="closeLogDetail()">
+            <i class="fas fa-times"></i>
+        </button>
+    </div>
+    <div class="log-message-wrapper">
+        <div class="line-number-display"></div>
+        <div class="log-message-display"></div>
+    </div>
+</div>
 `;
+// Rows have a fixed height so any line's position can be calculated without rendering it
+const LOG_ROW_HEIGHT = 28;
+const LOG_PAGE_SIZE = 200;
+const LOG_MAX_PAGES = 10;
+const LOG_OVERSCAN_ROWS = 20;
+// Browsers cap element heights, larger logs scroll proportionally instead
+const LOG_MAX_SCROLL_HEIGHT = 10000000;
+let logView = null;
 
 const rowResizeObserver = new ResizeObserver((entries) => {
     entries.forEach((entry) => {
@@ -75,6 +95,8 @@ function loadContent() {
 }
 
 function displayLogsDir() {
+    logView = null;
+    $(window).off("resize.logView");
     $("#adminDisplay").html(logsDirHtml);
     const logsUrl = new URL("/api/manage/logs", window.location.origin);
     fetch(logsUrl)
@@ -187,7 +209,22 @@ function generateLogSearchResultsHTML(logTree, filterValue, parentPath = "") {
 function displayLogFile(path) {
     $("#adminDisplay").html(logFileHtml);
     const logTableBody = $("#logTableBody");
+    logView = {
+        path: path,
+        query: new URLSearchParams(),
+        total: null,
+        pages: new Map(),
+        pending: new Set(),
+        generation: 0,
+        renderQueued: false,
+        selectedLine: null
+    };
     startScrollShadows(logTableBody);
+    logTableBody.on("scroll", queueLogRender);
+    logTableBody.on("click", "tr.log-row", function () {
+        displayLogDetail($(this).data("line"));
+    });
+    $(window).off("resize.logView").on("resize.logView", queueLogRender);
     $("#logSearch").on("input", function () {
         clearTimeout(inputTimeout);
         inputTimeout = setTimeout(() => {
@@ -196,201 +233,211 @@ function displayLogFile(path) {
     });
     createMultiselect("levelFilter", "Level", false, "filterLogs", ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]);
     createMultiselect("componentFilter", "Component", false, "filterLogs", []);
-    const logsUrl = new URL(`/api/manage/logs/${path}`, window.location.origin);
-    fetch(logsUrl)
+    fetchLogPage(0);
+}
+
+function fetchLogPage(page) {
+    const view = logView;
+    if (view.pages.has(page) || view.pending.has(page)) {
+        return;
+    }
+    view.pending.add(page);
+    const generation = view.generation;
+    const linesUrl = new URL(`/api/manage/logs/${view.path}/lines`, window.location.origin);
+    linesUrl.search = view.query.toString();
+    linesUrl.searchParams.set("start", page * LOG_PAGE_SIZE);
+    linesUrl.searchParams.set("end", (page + 1) * LOG_PAGE_SIZE);
+    fetch(linesUrl)
         .then(async (response) => {
-            function appendLogRow(logEntry) {
-                if (!response.body) {
-                    logTableBody.append(`<tr style="background-color: #8B0000"><td class="log-display" colspan="3">Did not receive data, log may be empty.</td></tr>`);
-                    updateLogTableBorders();
-                    updateScrollShadows(logTableBody);
-                    return;
-                } else if ("error" in logEntry) {
-                    logTableBody.append(`<tr style="background-color: #8B0000"><td class="log-display" colspan="3">Error: ${logEntry.error}</td></tr>`);
-                    updateLogTableBorders();
-                    updateScrollShadows(logTableBody);
-                    return;
-                }
-                addMultiselectOptions("componentFilter", "filterLogs", [logEntry.name]);
-                const levelClass = `log-level-${logEntry.levelname.toLowerCase()}`;
-                const truncatedMessage = logEntry.message.length > 100
-                    ? logEntry.message.substring(0, 100) + "..."
-                    : logEntry.message;
-                const messageLines = logEntry.message.split(/\r\n|\r|\n/g);
-                const messageLineCount = messageLines.length;
-                const rowId = crypto.randomUUID();
-                let rowHtml = `
-                <tr id="row-${rowId}" data-level="${logEntry.levelname}" data-component="${logEntry.name}" class="log-row ${levelClass}">
-                    <td class="log-display log-time">${logEntry.asctime}</td>
-                    <td class="log-display log-component">${logEntry.name}</td>
-                    <td class="log-display log-message-trunc">${truncatedMessage}</td>
-                </tr>
-                <tr class="log-full-message collapsed">
-                    <td colspan="3">
-                        <div class="log-message-wrapper">
-                            <div class="line-number-display" style="max-width: ${messageLineCount.toString().length}.5rem"></div>
-                            <div class="log-message-display" style="width: calc(100% - ${messageLineCount.toString().length / 2}rem)"></div>
-                        </div>
-                    </td>
-                </tr>
-                `;
-                logTableBody.append(rowHtml);
-                const fullMessageRow = $(`#row-${rowId}`).next();
-                const lineDisplay = fullMessageRow.find(".line-number-display");
-                const messageDisplay = fullMessageRow.find(".log-message-display");
-                for (var n = 0; n < messageLineCount; n++) {
-                    let messageLineNumber = $(`<div class="log-num-row" data-row-num="${n}">${n + 1}</div>`);
-                    let messageHtml = $(`<div class="log-line-row" data-row-num="${n}">${textToHtml(messageLines[n])}</div>`);
-                    lineDisplay.append(messageLineNumber);
-                    messageDisplay.append(messageHtml);
-                    rowResizeObserver.observe(messageHtml[0]);
-                }
-                $(document).on("click", `#row-${rowId}`, function () {
-                    let row = $(this);
-                    let fullMessageRow = row.next(".log-full-message");
-                    let fullMessageHeight = fullMessageRow.height();
-                    fullMessageRow.removeClass("last");
-                    let rowBottom = row.offset().top + row.height();
-                    let middleOfTableBody = $("#logTableHead").offset().top + $("#logTableHead").height() + (logTableBody.height() / 2);
-                    let scrollOffset = logTableBody.scrollTop() + rowBottom - middleOfTableBody;
-                    if (fullMessageRow.hasClass("collapsed")) {
-                        fullMessageRow.removeClass("collapsed");
-                        logTableBody.animate({
-                            scrollTop: scrollOffset
-                        }, 350, () => {
-                            row.trigger("focus");
-                            updateScrollShadows(logTableBody);
-                        });
-                    } else {
-                        fullMessageRow.addClass("collapsed");
-                        logTableBody.animate({
-                            scrollTop: logTableBody.scrollTop() - fullMessageHeight + 2
-                        }, 350, () => {
-                            updateScrollShadows(logTableBody);
-                        });
-                    }
-                    updateLogTableBorders();
-                });
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || response.statusText);
             }
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let buffer = "";
-            function processChunk({ done, value }) {
-                if (done) {
-                    updateLogTableBorders();
-                    updateScrollShadows(logTableBody);
-                    return;
-                };
-                buffer += decoder.decode(value, { stream: true });
-                let lines = buffer.split("\n");
-                buffer = lines.pop();
-                for (let line of lines) {
-                    if (line.trim() === "") continue;
-                    try {
-                        let logEntry = JSON.parse(line);
-                        appendLogRow(logEntry);
-                    } catch (e) {
-                        console.error("Error parsing log entry:", e);
-                    }
-                }
-                return reader.read().then(processChunk);
+            return data;
+        })
+        .then((data) => {
+            if (view !== logView || generation !== view.generation) {
+                return;
             }
-            const result = await reader.read();
-            return processChunk(result);
+            view.pending.delete(page);
+            view.total = data.total;
+            view.pages.set(page, data.records);
+            // Only a few pages are kept, so memory use doesn't grow with the log size
+            while (view.pages.size > LOG_MAX_PAGES) {
+                view.pages.delete(view.pages.keys().next().value);
+            }
+            const components = new Set(data.records.filter((record) => record.name).map((record) => record.name));
+            addMultiselectOptions("componentFilter", "filterLogs", [...components]);
+            queueLogRender();
         })
         .catch((error) => {
+            if (view !== logView || generation !== view.generation) {
+                return;
+            }
+            view.pending.delete(page);
             console.error("Error fetching log entries:", error);
-            logTableBody.append(`<tr style="background-color: #8B0000"><td colspan='3'>Encountered error while fetching log data.</td></tr>`);
-            updateLogTableBorders();
-            updateScrollShadows(logTableBody);
+            displayLogTableMessage(`Error: ${error.message}`);
         });
 }
 
-function updateLogTableBorders() {
-    const headRow = $("#logTableHead tr");
-    headRow.css({
-        "border-bottom-left-radius": "",
-        "border-bottom-right-radius": ""
-    });
-    headRow.find("th").css({
-        "border-bottom-left-radius": "",
-        "border-bottom-right-radius": ""
-    });
-    $("#logTableBody tr").css({
-        "border-bottom-left-radius": "",
-        "border-bottom-right-radius": "",
-    });
-    $("#logTableBody tr td").css({
-        "border-bottom-left-radius": "",
-        "border-bottom-right-radius": "",
-        "border-bottom": "1px solid var(--main-background)"
+function queueLogRender() {
+    if (!logView || logView.renderQueued) {
+        return;
+    }
+    logView.renderQueued = true;
+    requestAnimationFrame(() => {
+        logView.renderQueued = false;
+        renderLogWindow();
     });
-    $("tr.log-full-message").removeClass("last");
+}
 
-    const lastVisibleRow = $("#logTableBody tr").not(".collapsed").not(".log-hidden").last();
-    if (lastVisibleRow.length > 0) {
-        const potentialLogMessage = lastVisibleRow.next("tr.log-full-message");
-        if (potentialLogMessage.length > 0) {
-            potentialLogMessage.addClass("last");
-            potentialLogMessage.css({
-                "border-bottom-left-radius": "",
-                "border-bottom-right-radius": ""
-            });
-            potentialLogMessage.find("td").css("border-bottom", "");
-            potentialLogMessage.find("td:first-of-type").css("border-bottom-left-radius", "");
-            potentialLogMessage.find("td:last-of-type").css("border-bottom-right-radius", "");
+function renderLogWindow() {
+    const view = logView;
+    const logTableBody = $("#logTableBody");
+    if (view.total === null) {
+        return;
+    } else if (view.total === 0) {
+        const filtered = view.query.toString().length > 0;
+        displayLogTableMessage(filtered ? "No log entries match the filters." : "Did not receive data, log may be empty.");
+        return;
+    }
+    const viewHeight = logTableBody.innerHeight();
+    const contentHeight = view.total * LOG_ROW_HEIGHT;
+    const scrollHeight = Math.min(contentHeight, LOG_MAX_SCROLL_HEIGHT);
+    const scrollTop = Math.min(logTableBody.scrollTop(), Math.max(scrollHeight - viewHeight, 0));
+    const scale = scrollHeight > viewHeight ? (contentHeight - viewHeight) / (scrollHeight - viewHeight) : 1;
+    const contentTop = scrollTop * scale;
+    const firstLine = Math.max(Math.floor(contentTop / LOG_ROW_HEIGHT) - LOG_OVERSCAN_ROWS, 0);
+    const lastLine = Math.min(Math.ceil((contentTop + viewHeight) / LOG_ROW_HEIGHT) + LOG_OVERSCAN_ROWS, view.total);
+    const topSpace = Math.max(scrollTop - (contentTop - firstLine * LOG_ROW_HEIGHT), 0);
+    const bottomSpace = Math.max(scrollHeight - topSpace - (lastLine - firstLine) * LOG_ROW_HEIGHT, 0);
+    let rowsHtml = topSpace > 0 ? `<tr class="log-spacer" style="height: ${topSpace}px"><td colspan="3"></td></tr>` : "";
+    for (let line = firstLine; line < lastLine; line++) {
+        const page = Math.floor(line / LOG_PAGE_SIZE);
+        const records = view.pages.get(page);
+        if (records && line - page * LOG_PAGE_SIZE >= records.length) {
+            // Page was read before the active log grew
+            view.pages.delete(page);
         }
-        lastVisibleRow.css({
-            "border-bottom-left-radius": "var(--corner-rounding)",
-            "border-bottom-right-radius": "var(--corner-rounding)"
-        });
-        lastVisibleRow.find("td").css("border-bottom", "0.2rem solid var(--main-background)");
-        lastVisibleRow.find("td:first-of-type").css("border-bottom-left-radius", "var(--corner-rounding)");
-        lastVisibleRow.find("td:last-of-type").css("border-bottom-right-radius", "var(--corner-rounding)");
-    } else {
-        headRow.css({
-            "border-bottom-left-radius": "var(--corner-rounding)",
-            "border-bottom-right-radius": "var(--corner-rounding)"
-        });
-        headRow.find("th:first-of-type").css("border-bottom-left-radius", "var(--corner-rounding)");
-        headRow.find("th:last-of-type").css("border-bottom-right-radius", "var(--corner-rounding)");
+        const record = view.pages.has(page) ? records[line - page * LOG_PAGE_SIZE] : undefined;
+        if (record === undefined) {
+            fetchLogPage(page);
+            rowsHtml += `<tr class="log-row log-loading" style="height: ${LOG_ROW_HEIGHT}px"><td class="log-display" colspan="3">Loading...</td></tr>`;
+        } else {
+            rowsHtml += logRowHtml(line, record);
+        }
+    }
+    if (bottomSpace > 0) {
+        rowsHtml += `<tr class="log-spacer" style="height: ${bottomSpace}px"><td colspan="3"></td></tr>`;
     }
+    logTableBody.html(rowsHtml);
+    updateLogTableBorders();
+    updateScrollShadows(logTableBody);
 }
 
-function displayLogFilters() {
-    $("#logFilterPanel").toggleClass("collapsed");
+function logRowHtml(line, logEntry) {
+    if ("error" in logEntry) {
+        return `
+        <tr class="log-row" data-line="${line}" style="height: ${LOG_ROW_HEIGHT}px; background-color: #8B0000">
+            <td class="log-display" colspan="3">Error: ${logEntry.error}</td>
+        </tr>
+        `;
+    }
+    const levelClass = `log-level-${logEntry.levelname.toLowerCase()}`;
+    const truncatedMessage = logEntry.message.length > 200
+        ? logEntry.message.substring(0, 200) + "..."
+        : logEntry.message;
+    return `
+    <tr class="log-row ${levelClass}${line === logView.selectedLine ? ` selected` : ``}" data-line="${line}" style="height: ${LOG_ROW_HEIGHT}px">
+        <td class="log-display log-time">${logEntry.asctime}</td>
+        <td class="log-display log-component">${textToHtml(logEntry.name)}</td>
+        <td class="log-display log-message-trunc">${textToHtml(truncatedMessage.split(/\r\n|\r|\n/g)[0])}</td>
+    </tr>
+    `;
 }
 
-function filterLogs() {
-    const logTableBody = $("#logTableBody");
-    $(".show-shadow").removeClass("show-shadow");
-    logTableBody.find("tr").removeClass("log-hidden");
-    const selectFilterActive = multiselectFilter("#levelFilter", "level") | multiselectFilter("#componentFilter", "component");
-    selectFilterActive ? $("#logFilterBtn").addClass("active") : $("#logFilterBtn").removeClass("active");
-    const filter = $("#logSearch").val().trim().toLowerCase();
-    if (filter.length > 0) {
-        logTableBody.find("tr.log-full-message").not("log-hidden").each(function () {
-            if (!$(this).text().toLowerCase().includes(filter)) {
-                $(this).addClass("collapsed log-hidden");
-                $(this).prev("tr.log-row").addClass("log-hidden");
-            }
-        });
-    }
+function displayLogTableMessage(message) {
+    $("#logTableBody").html(`<tr style="background-color: #8B0000"><td class="log-display" colspan="3">${message}</td></tr>`);
     updateLogTableBorders();
-    updateScrollShadows(logTableBody);
+    updateScrollShadows($("#logTableBody"));
 }
 
-function multiselectFilter(id, datakey) {
-    let filterActive = false;
-    const selectedValues = $(id).data("selected");
-    if (selectedValues.length > 0) {
-        filterActive = true;
-        $("#logTableBody").find("tr.log-row").each(function () {
-            if (!selectedValues.includes($(this).data(datakey))) {
-                $(this).addClass("log-hidden");
-                $(this).next("tr.log-full-message").addClass("collapsed log-hidden");
-            }
-        });
+function displayLogDetail(line) {
+    const page = Math.floor(line / LOG_PAGE_SIZE);
+    const records = logView.pages.get(page);
+    const logEntry = records ? records[line - page * LOG_PAGE_SIZE] : undefined;
+    if (logEntry === undefined || "error" in logEntry) {
+        return;
+    }
+    logView.selectedLine = line;
+    $("#logTableBody tr.log-row").removeClass("selected");
+    $(`#logTableBody tr.log-row[data-line="${line}"]`).addClass("selected");
+    const fullMessage = logEntry.exc_text
+        ? `${logEntry.message}\n\n${logEntry.exc_text}`
+        : logEntry.message;
+    const messageLines = fullMessage.split(/\r\n|\r|\n/g);
+    const messageLineCount = messageLines.length;
+    const logDetail = $("#logDetail");
+    const lineDisplay = logDetail.find(".line-number-display");
+    const messageDisplay = logDetail.find(".log-message-display");
+    rowResizeObserver.disconnect();
+    lineDisplay.empty().css("max-width", `${messageLineCount.toString().length}.5rem`);
+    messageDisplay.empty().css("width", `calc(100% - ${messageLineCount.toString().length / 2}rem)`);
+    $("#logDetailTitle").text(`${logEntry.asctime} (${logEntry.levelname}) ${logEntry.name}`);
+    for (var n = 0; n < messageLineCount; n++) {
+        let messageLineNumber = $(`<div class="log-num-row" data-row-num="${n}">${n + 1}</div>`);
+        let messageHtml = $(`<div class="log-line-row" data-row-num="${n}">${textToHtml(messageLines[n])}</div>`);
+        lineDisplay.append(messageLineNumber);
+        messageDisplay.append(messageHtml);
+        rowResizeObserver.observe(messageHtml[0]);
+    }
+    logDetail.removeClass("hidden");
+    $("#logList").addClass("with-detail");
+    queueLogRender();
+}
+
+function closeLogDetail() {
+    rowResizeObserver.disconnect();
+    logView.selectedLine = null;
+    $("#logTableBody tr.log-row").removeClass("selected");
+    $("#logDetail").addClass("hidden");
+    $("#logList").removeClass("with-detail");
+    queueLogRender();
+}
+
+function updateLogTableBorders() {
+    const rounding = $("#logTableBody tr").not(".log-spacer").length > 0 ? "" : "var(--corner-rounding)";
+    const headRow = $("#logTableHead tr");
+    headRow.css({
+        "border-bottom-left-radius": rounding,
+        "border-bottom-right-radius": rounding
+    });
+    headRow.find("th:first-of-type").css("border-bottom-left-radius", rounding);
+    headRow.find("th:last-of-type").css("border-bottom-right-radius", rounding);
+}
+
+function displayLogFilters() {
+    $("#logFilterPanel").toggleClass("collapsed");
+}
+
+function filterLogs() {
+    const query = new URLSearchParams();
+    const levels = $("#levelFilter").data("selected");
+    const components = $("#componentFilter").data("selected");
+    levels.forEach((level) => query.append("level", level));
+    components.forEach((component) => query.append("component", component));
+    const search = $("#logSearch").val().trim();
+    if (search.length > 0) {
+        query.set("search", search);
     }
-    return filterActive;
+    levels.length > 0 || components.length > 0 ? $("#logFilterBtn").addClass("active") : $("#logFilterBtn").removeClass("active");
+    // Line numbers refer to the filtered lines, so cached pages no longer apply
+    logView.query = query;
+    logView.generation++;
+    logView.total = null;
+    logView.pages.clear();
+    logView.pending.clear();
+    closeLogDetail();
+    $("#logTableBody").scrollTop(0);
+    fetchLogPage(0);
 }
\ No newline at end of file